@@ -0,0 +1,298 @@
+# Benchmark dos endpoints da API sobre datasets OHLC sintéticos, via TestClient
+# (sem servidor): upload, data-info, EDA, pré-processamento com cada
+# fill_na_method (sem e com o resultado em cache), treino com cada model_type e
+# download. Cada execução é
+# acrescentada a um histórico JSON; com --baseline, tempos acima da tolerância
+# são marcados como regressão (código de saída 1).
+#
+# Uso: python benchmarks/bench_pipeline.py --sizes 10000x5,100000x50
+#      python benchmarks/bench_pipeline.py --preset full --save-baseline
+#      python benchmarks/bench_pipeline.py --baseline benchmarks/baseline.json --tolerance 0.2
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import warnings
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+
+from metrics import current_rss
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Tamanhos (linhas x colunas) de cada preset
+PRESETS = {
+    "quick": [(10_000, 5), (100_000, 20)],
+    "default": [(10_000, 5), (100_000, 50), (1_000_000, 20)],
+    "full": [(10_000, 5), (100_000, 50), (1_000_000, 50), (1_000_000, 500), (10_000_000, 5)],
+}
+FILL_NA_METHODS = ["mean", "median", "mode", "value", "drop"]
+MODEL_TYPES = ["regression", "classification", "random_forest", "sgd_regression", "sgd_classification"]
+OHLC_COLUMNS = ["open", "high", "low", "close", "volume"]
+
+
+# Candles sintéticos (passeio aleatório) com colunas extras f0, f1, ... até
+# completar cols. As 10 primeiras linhas não têm ausentes (vão no preview do upload).
+def make_ohlc_dataset(rows, cols, na_fraction=0.01, seed=42):
+    rng = np.random.default_rng(seed)
+    close = 100 + np.cumsum(rng.standard_normal(rows)) * 0.5
+    close = np.abs(close) + 1
+    spread = np.abs(rng.standard_normal(rows))
+    df = pd.DataFrame({
+        "date": pd.date_range("2000-01-01", periods=rows, freq="min").strftime("%Y-%m-%d %H:%M:%S"),
+        "open": close + rng.standard_normal(rows) * 0.1,
+        "high": close + spread,
+        "low": close - spread,
+        "close": close,
+        "volume": rng.integers(100, 100_000, rows),
+    })
+    extra = max(cols - len(OHLC_COLUMNS), 0)
+    if extra:
+        data = rng.standard_normal((rows, extra))
+        missing = rng.random((rows, extra)) < na_fraction
+        missing[:10] = False
+        data[missing] = np.nan
+        df = pd.concat([df, pd.DataFrame(data, columns=[f"f{i}" for i in range(extra)])], axis=1)
+    return df
+
+
+# Pico de RSS (acima do valor inicial) durante um trecho, amostrado em segundo plano
+class PeakMemory:
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.peak = 0
+
+    def __enter__(self):
+        self._start = current_rss()
+        self._peak_rss = self._start
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self._peak_rss = max(self._peak_rss, current_rss())
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self._peak_rss, current_rss()) - self._start
+
+
+class Runner:
+    def __init__(self, client, repeat):
+        self.client = client
+        self.repeat = repeat
+        self.results = []
+
+    # Executa request() repeat vezes e guarda o melhor tempo e o maior pico de
+    # memória. setup() roda antes de cada repetição, fora da medição.
+    def measure(self, dataset, endpoint, rows, request, nbytes=None, repeat=None, setup=None):
+        timings, peaks = [], []
+        for _ in range(repeat or self.repeat):
+            if setup is not None:
+                setup()
+            with PeakMemory() as memory:
+                start = time.perf_counter()
+                response = request()
+                elapsed = time.perf_counter() - start
+            if response.status_code >= 400:
+                raise RuntimeError(f"{endpoint}: {response.status_code} {response.text[:200]}")
+            timings.append(elapsed)
+            peaks.append(memory.peak)
+        seconds = min(timings)
+        result = {
+            "dataset": dataset,
+            "endpoint": endpoint,
+            "seconds": seconds,
+            "rows_per_second": rows / seconds if seconds else None,
+            "peak_memory_mb": max(peaks) / 1e6,
+        }
+        if nbytes is not None:
+            result["mb_per_second"] = nbytes / 1e6 / seconds if seconds else None
+        self.results.append(result)
+        print(f"  {endpoint:<32} {seconds:>9.3f}s {result['rows_per_second'] or 0:>14,.0f} linhas/s "
+              f"{result['peak_memory_mb']:>9.1f} MB")
+        return response
+
+
+def bench_dataset(runner, rows, cols, args, processed_cache):
+    client = runner.client
+    dataset = f"{rows}x{cols}"
+    df = make_ohlc_dataset(rows, cols)
+    csv = df.to_csv(index=False).encode()
+    del df
+    print(f"\nDataset {dataset} ({len(csv) / 1e6:.1f} MB de CSV)")
+
+    # Upload: o primeiro é a leitura do CSV; os seguintes vêm do cache em disco (mesmo hash)
+    upload = runner.measure(
+        dataset, "upload (leitura)", rows,
+        lambda: client.post("/upload-csv/", files={"file": ("bench.csv", csv, "text/csv")}),
+        nbytes=len(csv), repeat=1,
+    )
+    runner.measure(
+        dataset, "upload (cache)", rows,
+        lambda: client.post("/upload-csv/", files={"file": ("bench.csv", csv, "text/csv")}),
+        nbytes=len(csv),
+    )
+    dataset_id = upload.json()["dataset_id"]
+
+    runner.measure(dataset, "data-info", rows, lambda: client.get("/data-info/", params={"dataset_id": dataset_id}))
+    runner.measure(
+        dataset, "generate-eda (data)", rows,
+        lambda: client.get("/generate-eda/", params={"dataset_id": dataset_id, "format": "data"}),
+    )
+    if cols <= args.eda_png_max_cols:
+        runner.measure(
+            dataset, "generate-eda (png)", rows,
+            lambda: client.get("/generate-eda/", params={"dataset_id": dataset_id}),
+        )
+
+    # Pré-processamento: cada repetição sem o resultado memorizado (cache limpo
+    # antes, fora da medição) e, em separado, voltando às mesmas opções
+    for method in args.fill_na_methods:
+        options = {"fill_na_method": method, "fill_na_value": 0.0, "remove_outliers": False}
+        runner.measure(
+            dataset, f"preprocess ({method})", rows,
+            lambda: client.post("/preprocess/", params={"dataset_id": dataset_id}, json=options),
+            setup=processed_cache.clear,
+        )
+        runner.measure(
+            dataset, f"preprocess ({method}, cache)", rows,
+            lambda: client.post("/preprocess/", params={"dataset_id": dataset_id}, json=options),
+        )
+
+    # Treino e download sobre o resultado do pré-processamento com a média
+    client.post("/preprocess/", params={"dataset_id": dataset_id}, json={"fill_na_method": "mean"})
+    features = [col for col in client.get("/data-info/", params={"dataset_id": dataset_id}).json()["numeric_columns"]
+                if col != "close"]
+    for model_type in args.model_types:
+        target = "target_close" if model_type in ("regression", "sgd_regression") else "target_class"
+        request = {"model_type": model_type, "target_column": target, "feature_columns": features}
+        runner.measure(
+            dataset, f"predict ({model_type})", rows,
+            lambda: client.post("/predict/", params={"dataset_id": dataset_id, "predictions_limit": 100},
+                                json=request),
+        )
+
+    for fmt in ("csv", "parquet"):
+        runner.measure(
+            dataset, f"download ({fmt})", rows,
+            lambda: client.get("/download-results/", params={"dataset_id": dataset_id, "format": fmt}),
+        )
+    client.delete(f"/datasets/{dataset_id}")
+
+
+# Compara com a baseline: mesmo dataset e endpoint, tempo acima de (1 + tolerance)
+# e pelo menos min_delta segundos mais lento (evita ruído em medições de milissegundos)
+def find_regressions(results, baseline, tolerance, min_delta=0.01):
+    reference = {(r["dataset"], r["endpoint"]): r["seconds"] for r in baseline["results"]}
+    regressions = []
+    for result in results:
+        before = reference.get((result["dataset"], result["endpoint"]))
+        if before and result["seconds"] > before * (1 + tolerance) and result["seconds"] - before >= min_delta:
+            regressions.append({**result, "baseline_seconds": before, "ratio": result["seconds"] / before})
+    return regressions
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BENCHMARKS_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_sizes(value):
+    sizes = []
+    for size in value.split(","):
+        rows, _, cols = size.lower().partition("x")
+        sizes.append((int(rows), int(cols)))
+    return sizes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark dos endpoints da API")
+    parser.add_argument("--preset", choices=list(PRESETS), default="default")
+    parser.add_argument("--sizes", type=parse_sizes, help="ex.: 10000x5,100000x50 (substitui o preset)")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--fill-na-methods", type=lambda v: v.split(","), default=FILL_NA_METHODS)
+    parser.add_argument("--model-types", type=lambda v: v.split(","), default=MODEL_TYPES)
+    parser.add_argument("--eda-png-max-cols", type=int, default=20,
+                        help="gera a EDA com imagens só até esse número de colunas")
+    parser.add_argument("--history", default=os.path.join(BENCHMARKS_DIR, "history.json"))
+    parser.add_argument("--baseline", default=os.path.join(BENCHMARKS_DIR, "baseline.json"))
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--min-delta", type=float, default=0.01)
+    args = parser.parse_args()
+
+    # Cache e modelos num diretório temporário; sem pré-aquecimento concorrendo com as medições
+    workdir = tempfile.mkdtemp(prefix="bench_pipeline_")
+    os.environ["DATA_CACHE_DIR"] = os.path.join(workdir, "cache")
+    os.environ["PREWARM"] = "0"
+    # Métricas indefinidas em folds com uma só classe etc. não interessam aqui
+    warnings.simplefilter("ignore")
+
+    from fastapi.testclient import TestClient
+    import main as api
+
+    api.MODELS_DIR = os.path.join(workdir, "models")
+    os.makedirs(api.MODELS_DIR, exist_ok=True)
+
+    with TestClient(api.app) as client:
+        runner = Runner(client, args.repeat)
+        for rows, cols in args.sizes or PRESETS[args.preset]:
+            bench_dataset(runner, rows, cols, args, api.processed_cache)
+
+    run = {
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "results": runner.results,
+    }
+
+    history = []
+    if os.path.exists(args.history):
+        with open(args.history) as f:
+            history = json.load(f)
+    history.append(run)
+    with open(args.history, "w") as f:
+        json.dump(history, f, indent=2)
+    print(f"\nHistórico: {args.history} ({len(history)} execuções)")
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(run, f, indent=2)
+        print(f"Baseline salva em {args.baseline}")
+        return
+
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = find_regressions(runner.results, baseline, args.tolerance, args.min_delta)
+        print(f"Baseline: {baseline['timestamp']} ({baseline.get('commit')})")
+        for r in regressions:
+            print(f"  REGRESSÃO {r['dataset']} {r['endpoint']}: "
+                  f"{r['baseline_seconds']:.3f}s -> {r['seconds']:.3f}s ({r['ratio']:.2f}x)")
+        if regressions:
+            sys.exit(1)
+        print("  Nenhuma regressão acima da tolerância")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+# Benchmark do pré-processamento: implementação original (coluna a coluna)
+# contra o motor vetorizado de preprocessing.run_preprocessing.
+#
+# Uso: python benchmarks/bench_preprocessing.py --rows 1000000 --cols 50
+import argparse
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+
+from preprocessing import run_preprocessing
+
+
+# Implementação original de /preprocess/ (antes do motor vetorizado), para comparação
+def legacy_preprocessing(current_data, options):
+    df = current_data.copy()
+
+    if options.drop_columns:
+        existing_cols = [col for col in options.drop_columns if col in df.columns]
+        df = df.drop(columns=existing_cols)
+
+    if options.fill_na_method == "mean":
+        for col in df.select_dtypes(include=[np.number]).columns:
+            df[col] = df[col].fillna(df[col].mean())
+    elif options.fill_na_method == "median":
+        for col in df.select_dtypes(include=[np.number]).columns:
+            df[col] = df[col].fillna(df[col].median())
+    elif options.fill_na_method == "mode":
+        for col in df.columns:
+            df[col] = df[col].fillna(df[col].mode()[0] if not df[col].mode().empty else None)
+    elif options.fill_na_method == "value" and options.fill_na_value is not None:
+        df = df.fillna(options.fill_na_value)
+    elif options.fill_na_method == "drop":
+        df = df.dropna()
+
+    if options.remove_outliers:
+        for col in df.select_dtypes(include=[np.number]).columns:
+            Q1 = df[col].quantile(0.25)
+            Q3 = df[col].quantile(0.75)
+            IQR = Q3 - Q1
+            lower_bound = Q1 - options.outlier_threshold * IQR
+            upper_bound = Q3 + options.outlier_threshold * IQR
+            df = df[(df[col] >= lower_bound) & (df[col] <= upper_bound)]
+
+    if "close" in df.columns:
+        df["target_class"] = (df["close"].shift(-1) > df["close"]).astype(int)
+        df["target_close"] = df["close"].shift(-1)
+        df = df.dropna(subset=["target_class", "target_close"])
+
+    return df
+
+
+def make_dataset(rows, cols, na_fraction=0.01, seed=42):
+    rng = np.random.default_rng(seed)
+    data = rng.standard_normal((rows, cols))
+    data[rng.random((rows, cols)) < na_fraction] = np.nan
+    df = pd.DataFrame(data, columns=[f"f{i}" for i in range(cols - 1)] + ["close"])
+    df["close"] = 100 + np.nan_to_num(df["close"]).cumsum()
+    return df
+
+
+def make_options(fill_na_method, remove_outliers):
+    return SimpleNamespace(
+        drop_columns=[],
+        fill_na_method=fill_na_method,
+        fill_na_value=0.0,
+        normalize=False,
+        remove_outliers=remove_outliers,
+        outlier_threshold=1.5,
+        indicators=[],
+    )
+
+
+def best_of(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do pré-processamento")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--cols", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    df = make_dataset(args.rows, args.cols)
+    print(f"Dataset: {args.rows} linhas x {args.cols} colunas "
+          f"({df.memory_usage(deep=True).sum() / 1e6:.0f} MB)")
+    print(f"{'método':<8} {'outliers':<9} {'original (s)':>13} {'vetorizado (s)':>15} {'speedup':>8}")
+
+    for method in ["mean", "median", "mode", "value", "drop"]:
+        for remove_outliers in [False, True]:
+            options = make_options(method, remove_outliers)
+            legacy = best_of(lambda: legacy_preprocessing(df, options), args.repeat)
+            vectorized = best_of(lambda: run_preprocessing(df, options), args.repeat)
+            print(f"{method:<8} {str(remove_outliers):<9} {legacy:>13.3f} {vectorized:>15.3f} "
+                  f"{legacy / vectorized:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
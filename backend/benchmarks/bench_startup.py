@@ -0,0 +1,99 @@
+# Benchmark da inicialização: tempo de "import main" (via python -X importtime),
+# módulos mais caros, módulos pesados carregados já na importação e, opcionalmente,
+# o tempo até o servidor (uvicorn) responder à primeira requisição.
+#
+# Uso: python benchmarks/bench_startup.py --top 15 --port 8765
+import argparse
+import os
+import re
+import subprocess
+import sys
+import time
+import urllib.request
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Módulos pesados que, se carregados já no import, entram no aviso. O pyarrow é
+# importado pelo próprio pandas (2.2+) quando instalado, então costuma aparecer.
+HEAVY_MODULES = ["matplotlib", "seaborn", "sklearn", "scipy", "joblib", "pyarrow"]
+
+IMPORT_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+# Executa "import main" num processo novo e devolve [(módulo, self_us, cumulative_us)]
+def import_times():
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=BACKEND_DIR,
+        capture_output=True,
+        text=True,
+        env={**os.environ, "PREWARM": "0"},
+    )
+    if result.returncode != 0:
+        sys.exit(result.stderr)
+    times = []
+    for line in result.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match:
+            times.append((match.group(4), int(match.group(1)), int(match.group(2))))
+    return times
+
+
+# Inicia o uvicorn e mede o tempo até o GET / responder
+def time_to_healthy(port, timeout=60.0):
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR,
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=1):
+                    return time.perf_counter() - start
+            except OSError:
+                if server.poll() is not None:
+                    sys.exit("O servidor terminou antes de responder")
+                time.sleep(0.05)
+        return None
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--skip-server", action="store_true")
+    args = parser.parse_args()
+
+    times = import_times()
+    total = sum(self_us for _, self_us, _ in times)
+    print(f"import main: {total / 1e6:.3f}s ({len(times)} módulos)")
+
+    print(f"\nTop {args.top} por tempo acumulado:")
+    for name, _, cumulative in sorted(times, key=lambda t: -t[2])[:args.top]:
+        print(f"  {cumulative / 1e3:9.1f} ms  {name}")
+
+    print(f"\nTop {args.top} por tempo próprio:")
+    for name, self_us, _ in sorted(times, key=lambda t: -t[1])[:args.top]:
+        print(f"  {self_us / 1e3:9.1f} ms  {name}")
+
+    loaded = {name.split(".")[0] for name, _, _ in times}
+    eager = [module for module in HEAVY_MODULES if module in loaded]
+    if eager:
+        print(f"\nATENÇÃO: módulos pesados carregados no import: {', '.join(eager)}")
+    else:
+        print(f"\nNenhum módulo pesado carregado no import ({', '.join(HEAVY_MODULES)})")
+
+    if not args.skip_server:
+        elapsed = time_to_healthy(args.port)
+        if elapsed is None:
+            print("\nServidor não respondeu dentro do tempo limite")
+        else:
+            print(f"\nTempo até o servidor responder: {elapsed:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+import warnings
+
+import numpy as np
+
+
+# Correlação de Pearson para muitas colunas: uma passagem de padronização
+# (média e desvio em float64) e depois produtos de matrizes em float32 (BLAS).
+# Sem valores ausentes é um único Z^T Z; com ausentes, quatro produtos com a
+# máscara de valores válidos dão o mesmo resultado par a par do DataFrame.corr().
+# sample_rows > 0 usa uma amostra das linhas (modo aproximado, bem mais rápido).
+def correlation_matrix(arr, sample_rows=None, seed=0):
+    n_rows = len(arr)
+    if sample_rows and n_rows > sample_rows:
+        rows = np.sort(np.random.default_rng(seed).choice(n_rows, sample_rows, replace=False))
+        arr = arr[rows]
+        n_rows = sample_rows
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        mean = np.nanmean(arr, axis=0)
+        std = np.nanstd(arr, axis=0)
+    constant = ~(std > 0)
+    z = ((arr - mean) / np.where(constant, 1.0, std)).astype(np.float32)
+    valid = ~np.isnan(z)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        if valid.all():
+            corr = (z.T @ z).astype(np.float64) / n_rows
+        else:
+            mask = valid.astype(np.float32)
+            z0 = np.where(valid, z, np.float32(0))
+            pairs = (mask.T @ mask).astype(np.float64)         # linhas válidas em i e j
+            sums = (z0.T @ mask).astype(np.float64)            # soma de z_i nessas linhas
+            squares = ((z0 * z0).T @ mask).astype(np.float64)  # soma de z_i^2 nessas linhas
+            products = (z0.T @ z0).astype(np.float64)
+            cov = products - sums * sums.T / pairs
+            var = squares - sums ** 2 / pairs
+            corr = cov / np.sqrt(var * var.T)
+            corr[pairs < 2] = np.nan
+
+    corr[constant, :] = np.nan
+    corr[:, constant] = np.nan
+    np.clip(corr, -1.0, 1.0, out=corr)
+    np.fill_diagonal(corr, np.where(constant, np.nan, 1.0))
+    return corr, n_rows
+
+
+# Os k pares de colunas com maior |correlação|
+def top_pairs(corr, columns, k=20):
+    upper_i, upper_j = np.triu_indices(len(columns), 1)
+    values = corr[upper_i, upper_j]
+    strength = np.nan_to_num(np.abs(values), nan=-1.0)
+    k = min(k, len(values))
+    if k == 0:
+        return []
+    best = np.argpartition(-strength, k - 1)[:k]
+    best = best[np.argsort(-strength[best], kind="stable")]
+    return [
+        {"a": columns[upper_i[b]], "b": columns[upper_j[b]], "correlation": round(float(values[b]), 6)}
+        for b in best if not np.isnan(values[b])
+    ]
+
+
+# Ordem das colunas por agrupamento hierárquico (distância 1 - |r|): colunas
+# correlacionadas ficam vizinhas, formando blocos legíveis no heatmap
+def cluster_order(corr):
+    if len(corr) < 3:
+        return list(range(len(corr)))
+    from scipy.cluster.hierarchy import leaves_list, linkage
+    from scipy.spatial.distance import squareform
+
+    distance = 1.0 - np.nan_to_num(np.abs(corr), nan=0.0)
+    np.fill_diagonal(distance, 0.0)
+    distance = np.clip((distance + distance.T) / 2, 0.0, None)
+    return leaves_list(linkage(squareform(distance, checks=False), method="average")).tolist()
+
+
+# Resultado da correlação para o /generate-eda/?format=data. A matriz completa
+# só vai junto até max_matrix_columns colunas; acima disso, pares mais
+# correlacionados e a ordem agrupada.
+def correlation_result(corr, columns, rows_used, sampled=False, top_k=20, max_matrix_columns=100):
+    order = cluster_order(corr)
+    result = {
+        "correlation": {
+            "rows_used": int(rows_used),
+            "sampled": sampled,
+            "order": [columns[i] for i in order],
+            "top_pairs": top_pairs(corr, columns, top_k),
+        }
+    }
+    if len(columns) <= max_matrix_columns:
+        result["correlation_matrix"] = {
+            "columns": list(columns),
+            "values": [[None if np.isnan(v) else round(float(v), 6) for v in row] for row in corr],
+        }
+    return result
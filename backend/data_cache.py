@@ -0,0 +1,103 @@
+import json
+import os
+import uuid
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+
+_ARROW_STRINGS = {pa.string(): pd.StringDtype("pyarrow"), pa.large_string(): pd.StringDtype("pyarrow")}
+
+
+# Cache em disco de DataFrames no formato Arrow IPC (Feather v2), indexado por hash.
+# Os arquivos não são comprimidos para que a leitura possa usar memory-map.
+class DataCache:
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        self.sessions_dir = os.path.join(cache_dir, "sessions")
+        os.makedirs(self.sessions_dir, exist_ok=True)
+        os.makedirs(os.path.join(cache_dir, "chunked"), exist_ok=True)
+        os.makedirs(os.path.join(cache_dir, "profiles"), exist_ok=True)
+
+    def has(self, key):
+        return os.path.exists(self._frame_path(key))
+
+    def save(self, key, df):
+        path = self._frame_path(key)
+        # Escrever em arquivo temporário e renomear: outros workers nunca leem um arquivo parcial
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        feather.write_feather(df, tmp_path, compression="uncompressed")
+        os.replace(tmp_path, path)
+
+    def load(self, key):
+        path = self._frame_path(key)
+        if not os.path.exists(path):
+            return None
+        table = feather.read_table(path, memory_map=True)
+        # Strings continuam no Arrow (sem o mapeamento voltariam como objetos Python).
+        # split_blocks evita consolidar as colunas num bloco novo: numéricas sem
+        # nulos ficam apontando para o arquivo mapeado, sem cópia.
+        return table.to_pandas(types_mapper=_ARROW_STRINGS.get, split_blocks=True, self_destruct=False)
+
+    # Manifestos de sessão: ligam o ID da sessão aos hashes dos seus DataFrames
+    def save_manifest(self, dataset_id, manifest):
+        path = self._manifest_path(dataset_id)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, path)
+
+    def load_manifest(self, dataset_id):
+        path = self._manifest_path(dataset_id)
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return json.load(f)
+
+    def delete_manifest(self, dataset_id):
+        path = self._manifest_path(dataset_id)
+        if os.path.exists(path):
+            os.remove(path)
+
+    # Perfis de dataset (ver dataset_profile.DatasetProfile), pelo hash do conteúdo
+    def has_profile(self, key):
+        return os.path.exists(self._profile_path(key))
+
+    def save_profile(self, key, profile):
+        path = self._profile_path(key)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(profile, f)
+        os.replace(tmp_path, path)
+
+    def load_profile(self, key):
+        path = self._profile_path(key)
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return json.load(f)
+
+    # Diretório de um dataset out-of-core (blocos Arrow IPC, ver out_of_core.ChunkedDataset)
+    def chunked_path(self, key):
+        _check_key(key)
+        return os.path.join(self.cache_dir, "chunked", key)
+
+    # Funções auxiliares
+    def _frame_path(self, key):
+        _check_key(key)
+        return os.path.join(self.cache_dir, f"{key}.arrow")
+
+    def _profile_path(self, key):
+        _check_key(key)
+        return os.path.join(self.cache_dir, "profiles", f"{key}.json")
+
+    def _manifest_path(self, dataset_id):
+        _check_key(dataset_id)
+        return os.path.join(self.sessions_dir, f"{dataset_id}.json")
+
+
+def _check_key(key):
+    # Chaves são sempre hexadecimais (hashes e uuid4); evita caminhos arbitrários
+    if not key or not all(c in "0123456789abcdef" for c in key):
+        raise KeyError(key)
@@ -0,0 +1,298 @@
+import base64
+
+import numpy as np
+import pandas as pd
+
+
+# Precisão do HyperLogLog (2^12 registradores, erro padrão ~1,6%)
+HLL_PRECISION = 12
+# Compressão do t-digest (no máximo ~TDIGEST_DELTA centroides por coluna)
+TDIGEST_DELTA = 200
+# Quantis devolvidos pelo /data-info/
+PROFILE_QUANTILES = [0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99]
+
+
+# Contagem aproximada de valores distintos. Os registradores de dois sketches
+# se combinam com o máximo elemento a elemento, então blocos e linhas novas
+# podem ser somados sem reler os dados.
+class HyperLogLog:
+    def __init__(self, registers=None):
+        if registers is None:
+            registers = np.zeros(1 << HLL_PRECISION, dtype=np.uint8)
+        self.registers = registers
+
+    @classmethod
+    def from_hashes(cls, hashes):
+        sketch = cls()
+        if len(hashes):
+            index = (hashes >> np.uint64(64 - HLL_PRECISION)).astype(np.intp)
+            # Posição do primeiro bit 1 nos 32 bits seguintes (frexp dá o bit_length exato)
+            rest = (hashes >> np.uint64(32 - HLL_PRECISION)) & np.uint64(0xFFFFFFFF)
+            _, bit_length = np.frexp(rest.astype(np.float64))
+            np.maximum.at(sketch.registers, index, (33 - bit_length).astype(np.uint8))
+        return sketch
+
+    def merge(self, other):
+        return HyperLogLog(np.maximum(self.registers, other.registers))
+
+    def estimate(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.exp2(-self.registers.astype(np.float64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        # Correção para cardinalidades pequenas (linear counting)
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * np.log(m / zeros)
+        return int(round(estimate))
+
+    def to_dict(self):
+        return base64.b64encode(self.registers.tobytes()).decode()
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(np.frombuffer(base64.b64decode(data), dtype=np.uint8).copy())
+
+
+# Quantis aproximados (t-digest com escala k1). A compressão é vetorizada:
+# os pontos ordenados são agrupados pela faixa inteira de k(q), o que deixa
+# centroides pequenos nas caudas e grandes no meio da distribuição.
+class TDigest:
+    def __init__(self, means=None, weights=None, min_value=np.nan, max_value=np.nan):
+        self.means = np.empty(0) if means is None else np.asarray(means, dtype=np.float64)
+        self.weights = np.empty(0) if weights is None else np.asarray(weights, dtype=np.float64)
+        self.min_value = min_value
+        self.max_value = max_value
+
+    @classmethod
+    def from_values(cls, values):
+        values = np.asarray(values, dtype=np.float64)
+        if not len(values):
+            return cls()
+        return cls._compress(values, np.ones(len(values)), values.min(), values.max())
+
+    def merge(self, other):
+        if not len(other.means):
+            return self
+        if not len(self.means):
+            return other
+        return TDigest._compress(
+            np.concatenate([self.means, other.means]),
+            np.concatenate([self.weights, other.weights]),
+            min(self.min_value, other.min_value),
+            max(self.max_value, other.max_value),
+        )
+
+    @classmethod
+    def _compress(cls, means, weights, min_value, max_value):
+        order = np.argsort(means, kind="stable")
+        means, weights = means[order], weights[order]
+        cumulative = np.cumsum(weights)
+        q = (cumulative - weights / 2) / cumulative[-1]
+        k = np.floor(TDIGEST_DELTA * (np.arcsin(2 * q - 1) / np.pi + 0.5))
+        starts = np.concatenate([[0], np.flatnonzero(np.diff(k)) + 1])
+        group_weights = np.add.reduceat(weights, starts)
+        group_means = np.add.reduceat(means * weights, starts) / group_weights
+        return cls(group_means, group_weights, float(min_value), float(max_value))
+
+    def quantile(self, q):
+        if not len(self.means):
+            return np.nan
+        total = self.weights.sum()
+        centers = np.cumsum(self.weights) - self.weights / 2
+        return float(np.interp(
+            q * total,
+            np.concatenate([[0.0], centers, [total]]),
+            np.concatenate([[self.min_value], self.means, [self.max_value]]),
+        ))
+
+    def to_dict(self):
+        return {
+            "means": self.means.tolist(),
+            "weights": self.weights.tolist(),
+            "min": self.min_value,
+            "max": self.max_value,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["means"], data["weights"], data["min"], data["max"])
+
+
+# Estatísticas de uma coluna: contagens, momentos (média e soma dos quadrados
+# dos desvios, combinados pela fórmula de Chan) e os sketches acima
+class ColumnProfile:
+    def __init__(self, dtype, count=0, missing=0, numeric=False, min_value=np.nan, max_value=np.nan,
+                 mean=np.nan, m2=0.0, distinct=None, digest=None):
+        self.dtype = dtype
+        self.count = count
+        self.missing = missing
+        self.numeric = numeric
+        self.min_value = min_value
+        self.max_value = max_value
+        self.mean = mean
+        self.m2 = m2
+        self.distinct = distinct or HyperLogLog()
+        self.digest = digest
+
+    @classmethod
+    def from_series(cls, series):
+        numeric = _is_numeric(series.dtype)
+        valid = series.dropna()
+        profile = cls(str(series.dtype), count=len(valid), missing=len(series) - len(valid), numeric=numeric)
+
+        if numeric:
+            # Numéricas são hasheadas como float64: o mesmo valor conta uma vez
+            # mesmo que o dtype mude entre blocos (ex.: int8 -> int16 no append)
+            values = valid.to_numpy(dtype=np.float64)
+            profile.distinct = HyperLogLog.from_hashes(pd.util.hash_array(values))
+            profile.digest = TDigest.from_values(values)
+            if len(values):
+                profile.min_value = float(values.min())
+                profile.max_value = float(values.max())
+                profile.mean = float(values.mean())
+                profile.m2 = float(np.sum((values - profile.mean) ** 2))
+        else:
+            profile.distinct = HyperLogLog.from_hashes(pd.util.hash_pandas_object(valid, index=False).to_numpy())
+        return profile
+
+    # other descreve linhas posteriores: o dtype final é o dele
+    def merge(self, other):
+        numeric = self.numeric and other.numeric
+        merged = ColumnProfile(
+            other.dtype,
+            count=self.count + other.count,
+            missing=self.missing + other.missing,
+            numeric=numeric,
+            distinct=self.distinct.merge(other.distinct),
+        )
+        if numeric:
+            merged.digest = self.digest.merge(other.digest)
+            merged.min_value = float(np.fmin(self.min_value, other.min_value))
+            merged.max_value = float(np.fmax(self.max_value, other.max_value))
+            if not self.count or not other.count:
+                source = self if self.count else other
+                merged.mean, merged.m2 = source.mean, source.m2
+            else:
+                delta = other.mean - self.mean
+                merged.mean = self.mean + delta * other.count / merged.count
+                merged.m2 = self.m2 + other.m2 + delta ** 2 * self.count * other.count / merged.count
+        return merged
+
+    def summary(self):
+        summary = {
+            "dtype": self.dtype,
+            "count": self.count,
+            "missing": self.missing,
+            "distinct": self.distinct.estimate() if self.count else 0,
+        }
+        if self.numeric:
+            summary.update({
+                "min": self.min_value,
+                "max": self.max_value,
+                "mean": self.mean,
+                "std": float(np.sqrt(self.m2 / (self.count - 1))) if self.count > 1 else np.nan,
+                "quantiles": {str(q): self.digest.quantile(q) for q in PROFILE_QUANTILES},
+            })
+        return _json_safe(summary)
+
+    def to_dict(self):
+        return {
+            "dtype": self.dtype,
+            "count": self.count,
+            "missing": self.missing,
+            "numeric": self.numeric,
+            "min": self.min_value,
+            "max": self.max_value,
+            "mean": self.mean,
+            "m2": self.m2,
+            "distinct": self.distinct.to_dict(),
+            "digest": self.digest.to_dict() if self.digest is not None else None,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            data["dtype"],
+            count=data["count"],
+            missing=data["missing"],
+            numeric=data["numeric"],
+            min_value=data["min"],
+            max_value=data["max"],
+            mean=data["mean"],
+            m2=data["m2"],
+            distinct=HyperLogLog.from_dict(data["distinct"]),
+            digest=TDigest.from_dict(data["digest"]) if data["digest"] is not None else None,
+        )
+
+
+# Perfil do dataset usado pelo /data-info/: calculado uma vez no upload, guardado
+# junto com o dataset (cache em disco) e estendido com merge() quando linhas são
+# acrescentadas, sem passar de novo pelos dados antigos.
+class DatasetProfile:
+    def __init__(self, n_rows=0, columns=None, memory=None):
+        self.n_rows = n_rows
+        self.columns = columns or {}
+        # Relatório de memória (ingest.memory_report) dos dados em memória
+        self.memory = memory
+
+    @classmethod
+    def from_frame(cls, df):
+        return cls(len(df), {col: ColumnProfile.from_series(df[col]) for col in df.columns})
+
+    # Dataset lido em blocos (modo out-of-core): um perfil por bloco, combinados
+    @classmethod
+    def from_chunks(cls, chunks):
+        profile = None
+        for chunk in chunks:
+            chunk_profile = cls.from_frame(chunk)
+            profile = chunk_profile if profile is None else profile.merge(chunk_profile)
+        return profile if profile is not None else cls()
+
+    def merge(self, other):
+        columns = {}
+        for col, column in other.columns.items():
+            columns[col] = self.columns[col].merge(column) if col in self.columns else column
+        return DatasetProfile(self.n_rows + other.n_rows, columns)
+
+    # Mesmo formato do /data-info/ original, mais as estatísticas por coluna
+    def info(self):
+        return {
+            "shape": [self.n_rows, len(self.columns)],
+            "columns": list(self.columns),
+            "dtypes": {col: column.dtype for col, column in self.columns.items()},
+            "missing_values": {col: column.missing for col, column in self.columns.items()},
+            "numeric_columns": [col for col, column in self.columns.items() if column.numeric],
+            "categorical_columns": [
+                col for col, column in self.columns.items() if column.dtype in ("object", "category", "string")
+            ],
+            "profile": {col: column.summary() for col, column in self.columns.items()},
+            "memory": self.memory,
+        }
+
+    def to_dict(self):
+        return {
+            "n_rows": self.n_rows,
+            "columns": [[col, column.to_dict()] for col, column in self.columns.items()],
+            "memory": self.memory,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            data["n_rows"],
+            {col: ColumnProfile.from_dict(column) for col, column in data["columns"]},
+            data.get("memory"),
+        )
+
+
+# Mesmo critério de select_dtypes(include=[np.number]) (bool não conta como numérico)
+def _is_numeric(dtype):
+    return pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype)
+
+
+def _json_safe(value):
+    if isinstance(value, dict):
+        return {k: _json_safe(v) for k, v in value.items()}
+    if isinstance(value, float) and not np.isfinite(value):
+        return None
+    return value
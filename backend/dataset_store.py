@@ -0,0 +1,221 @@
+import threading
+import uuid
+from collections import OrderedDict
+
+from dataset_profile import DatasetProfile
+from ingest import unshared_memory
+from out_of_core import ChunkedDataset
+
+
+# Sessão de um dataset carregado: dados originais e dados pré-processados
+class DatasetSession:
+    def __init__(self, dataset_id, current_data, processed_data=None,
+                 content_hash=None, processed_key=None, pipeline_id=None,
+                 indicator_state=None, current_chunks=None, processed_chunks=None, profile=None):
+        self.dataset_id = dataset_id
+        self.current_data = current_data
+        self.processed_data = processed_data
+        # Chaves no cache em disco (hash do conteúdo e do resultado do pré-processamento)
+        self.content_hash = content_hash
+        self.processed_key = processed_key
+        # Pipeline ajustado que gerou processed_data (reaplicado em /append-rows/)
+        self.pipeline_id = pipeline_id
+        # Estado dos indicadores técnicos ao fim de processed_data (continuado no append)
+        self.indicator_state = indicator_state
+        # Modo out-of-core: dados em blocos no disco (ChunkedDataset) em vez de DataFrames
+        self.current_chunks = current_chunks
+        self.processed_chunks = processed_chunks
+        # Perfil de current_data (DatasetProfile), servido pelo /data-info/
+        self.profile = profile
+
+    @property
+    def out_of_core(self):
+        return self.current_chunks is not None
+
+    # Colunas de processed_data que são as mesmas de current_data contam uma vez só
+    def memory_usage(self):
+        total = 0
+        if self.current_data is not None:
+            total += int(self.current_data.memory_usage(index=True, deep=True).sum())
+        if self.processed_data is not None:
+            total += unshared_memory(self.processed_data, self.current_data)
+        return total
+
+    def manifest(self):
+        return {
+            "content_hash": self.content_hash,
+            "processed_key": self.processed_key,
+            "pipeline_id": self.pipeline_id,
+            "indicator_state": self.indicator_state,
+            "out_of_core": self.out_of_core,
+        }
+
+
+# Armazena os datasets por ID, com limite de memória (LRU). Com um DataCache,
+# os DataFrames são persistidos em disco e recarregados após despejo ou reinício.
+# on_release(df) é chamado quando um DataFrame original deixa de estar em memória
+# no store (despejo, remoção ou substituição) e nenhuma outra sessão o usa.
+class DatasetStore:
+    def __init__(self, max_bytes, cache=None, on_release=None):
+        self.max_bytes = max_bytes
+        self.cache = cache
+        self.on_release = on_release
+        self._sessions = OrderedDict()
+        self._sizes = {}
+        # DataFrame original guardado com cada sessão (a sessão pode ter
+        # current_data trocado antes de voltar ao put, ex.: /append-rows/)
+        self._frames = {}
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    def create(self, current_data, content_hash=None, current_chunks=None, profile=None):
+        session = DatasetSession(uuid.uuid4().hex, current_data, content_hash=content_hash,
+                                 current_chunks=current_chunks, profile=profile)
+        self.put(session)
+        return session
+
+    def put(self, session):
+        if self.cache is not None:
+            self._persist(session)
+
+        # Recalcular o tamanho fora do lock (memory_usage(deep=True) pode ser lento)
+        size = session.memory_usage()
+        with self._lock:
+            released = self._discard(session.dataset_id)
+            self._sessions[session.dataset_id] = session
+            self._sizes[session.dataset_id] = size
+            self._frames[session.dataset_id] = session.current_data
+            self._total_bytes += size
+            released += self._evict()
+            released = self._unreferenced(released)
+        self._release(released)
+
+    def get(self, dataset_id):
+        with self._lock:
+            session = self._sessions.get(dataset_id)
+            if session is not None:
+                self._sessions.move_to_end(dataset_id)
+                return session
+
+        # Não está em memória: tentar recuperar do cache em disco
+        session = self._load_persisted(dataset_id)
+        if session is not None:
+            self.put(session)
+        return session
+
+    def delete(self, dataset_id):
+        with self._lock:
+            released = self._unreferenced(self._discard(dataset_id))
+        self._release(released)
+        if self.cache is not None:
+            try:
+                self.cache.delete_manifest(dataset_id)
+            except KeyError:
+                pass
+
+    def stats(self):
+        with self._lock:
+            return {
+                "datasets_in_memory": len(self._sessions),
+                "memory_bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+    # Funções auxiliares (_discard, _evict e _unreferenced são chamadas com o
+    # lock adquirido; as duas primeiras retornam os DataFrames originais soltos)
+    def _discard(self, dataset_id):
+        if dataset_id not in self._sessions:
+            return []
+        del self._sessions[dataset_id]
+        self._total_bytes -= self._sizes.pop(dataset_id)
+        return [self._frames.pop(dataset_id)]
+
+    def _evict(self):
+        # Sempre manter ao menos o dataset mais recente, mesmo que exceda o limite.
+        # Os DataFrames já estão no cache em disco (se houver), basta soltar a memória.
+        released = []
+        while self._total_bytes > self.max_bytes and len(self._sessions) > 1:
+            dataset_id, _ = self._sessions.popitem(last=False)
+            self._total_bytes -= self._sizes.pop(dataset_id)
+            released.append(self._frames.pop(dataset_id))
+        return released
+
+    def _unreferenced(self, frames):
+        resident = {id(df) for df in self._frames.values()}
+        unique = {id(df): df for df in frames if df is not None}
+        return [df for key, df in unique.items() if key not in resident]
+
+    def _release(self, frames):
+        if self.on_release is not None:
+            for df in frames:
+                self.on_release(df)
+
+    def _persist(self, session):
+        if (session.current_data is not None and session.content_hash
+                and not self.cache.has(session.content_hash)):
+            self.cache.save(session.content_hash, session.current_data)
+        if (session.processed_data is not None and session.processed_key
+                and not self.cache.has(session.processed_key)):
+            self.cache.save(session.processed_key, session.processed_data)
+        if (session.profile is not None and session.content_hash
+                and not self.cache.has_profile(session.content_hash)):
+            self.cache.save_profile(session.content_hash, session.profile.to_dict())
+        if session.content_hash:
+            self.cache.save_manifest(session.dataset_id, session.manifest())
+
+    def _load_persisted(self, dataset_id):
+        if self.cache is None:
+            return None
+        try:
+            manifest = self.cache.load_manifest(dataset_id)
+        except KeyError:
+            return None
+        if manifest is None:
+            return None
+
+        # Out-of-core: os blocos já estão no disco, basta reabri-los
+        if manifest.get("out_of_core"):
+            return self._load_chunked(dataset_id, manifest)
+
+        current_data = self.cache.load(manifest["content_hash"])
+        if current_data is None:
+            return None
+        processed_data = None
+        if manifest.get("processed_key"):
+            processed_data = self.cache.load(manifest["processed_key"])
+
+        return DatasetSession(
+            dataset_id,
+            current_data,
+            processed_data,
+            content_hash=manifest["content_hash"],
+            processed_key=manifest.get("processed_key") if processed_data is not None else None,
+            pipeline_id=manifest.get("pipeline_id") if processed_data is not None else None,
+            indicator_state=manifest.get("indicator_state") if processed_data is not None else None,
+            profile=self._load_profile(manifest["content_hash"]),
+        )
+
+    def _load_chunked(self, dataset_id, manifest):
+        current_path = self.cache.chunked_path(manifest["content_hash"])
+        if not ChunkedDataset.exists(current_path):
+            return None
+        processed_chunks = None
+        if manifest.get("processed_key"):
+            processed_path = self.cache.chunked_path(manifest["processed_key"])
+            if ChunkedDataset.exists(processed_path):
+                processed_chunks = ChunkedDataset(processed_path)
+
+        return DatasetSession(
+            dataset_id,
+            None,
+            content_hash=manifest["content_hash"],
+            processed_key=manifest.get("processed_key") if processed_chunks is not None else None,
+            pipeline_id=manifest.get("pipeline_id") if processed_chunks is not None else None,
+            current_chunks=ChunkedDataset(current_path),
+            processed_chunks=processed_chunks,
+            profile=self._load_profile(manifest["content_hash"]),
+        )
+
+    def _load_profile(self, content_hash):
+        profile = self.cache.load_profile(content_hash)
+        return DatasetProfile.from_dict(profile) if profile is not None else None
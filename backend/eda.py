@@ -0,0 +1,259 @@
+import asyncio
+import base64
+import io
+import multiprocessing
+import os
+import threading
+import warnings
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from correlation import cluster_order, correlation_matrix, correlation_result
+from metrics import collect_stages, record_stages, stage, timed_call
+
+
+# Tipos de gráfico gerados por coluna numérica e o gráfico único de correlação
+COLUMN_CHARTS = ("histogram", "boxplot")
+CORRELATION_CHART = "correlation_matrix"
+# Acima deste número de colunas o heatmap não escreve os valores nas células
+CORRELATION_ANNOT_MAX_COLUMNS = 20
+
+
+# Função auxiliar para gerar gráficos como base64
+def plot_to_base64(fig):
+    import matplotlib.pyplot as plt
+
+    buf = io.BytesIO()
+    with stage("plot_render"):
+        fig.savefig(buf, format='png', bbox_inches='tight')
+    buf.seek(0)
+    with stage("base64_encode"):
+        img_str = base64.b64encode(buf.read()).decode('utf-8')
+    buf.close()
+    plt.close(fig)
+    return img_str
+
+
+# Desenha um único gráfico. Executada nos processos do pool (backend Agg, sem janela).
+def render_chart(chart_type, column, values, labels=None):
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    with stage("plot_build"):
+        if chart_type == "histogram":
+            fig, ax = plt.subplots(figsize=(10, 4))
+            sns.histplot(values, ax=ax)
+            ax.set_title(f'Distribuição de {column}')
+
+        elif chart_type == "boxplot":
+            fig, ax = plt.subplots(figsize=(10, 4))
+            sns.boxplot(x=values, ax=ax)
+            ax.set_title(f'Boxplot de {column}')
+
+        elif chart_type == CORRELATION_CHART:
+            import pandas as pd
+
+            # Colunas já vêm na ordem agrupada; com muitas colunas, sem anotações
+            # e com rótulos espaçados automaticamente
+            size = min(10 + len(labels) // 10, 30)
+            fig, ax = plt.subplots(figsize=(size, size * 0.8))
+            corr_matrix = pd.DataFrame(values, index=labels, columns=labels)
+            annot = len(labels) <= CORRELATION_ANNOT_MAX_COLUMNS
+            sns.heatmap(corr_matrix, annot=annot, fmt=".2f", cmap='coolwarm', vmin=-1, vmax=1, ax=ax)
+            ax.set_title('Matriz de Correlação')
+
+        else:
+            raise ValueError(f"Tipo de gráfico não suportado: {chart_type}")
+
+    return plot_to_base64(fig)
+
+
+# render_chart nos processos do pool: devolve também as etapas medidas, que o
+# processo principal registra na requisição (ver metrics.collect_stages)
+def render_chart_timed(chart_type, column, values, labels=None):
+    with collect_stages() as stages:
+        image = render_chart(chart_type, column, values, labels)
+    return image, stages
+
+
+# Importações dos workers do pool, feitas antes do primeiro gráfico (EDARenderer.warm_up)
+def warm_up_worker():
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot  # noqa: F401
+    import seaborn  # noqa: F401
+
+
+# Resumo numérico da EDA (sem imagens): o frontend desenha os gráficos.
+# Quantis, histogramas e contagem de outliers de todas as colunas são
+# calculados de uma vez sobre a matriz numérica.
+def compute_eda_data(df, bins=30, whisker=1.5, correlation_sample_rows=None,
+                     correlation_top_k=20, correlation_max_columns=100):
+    numeric_cols = [
+        col for col in df.select_dtypes(include=[np.number]).columns
+        if df[col].notna().any()
+    ]
+    if not numeric_cols:
+        return {"format": "data", "histograms": {}, "boxplots": {}}
+
+    arr = df[numeric_cols].to_numpy(dtype=np.float64)
+    valid = ~np.isnan(arr)
+    n_cols = arr.shape[1]
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        mins, q1, median, q3, maxs = np.nanquantile(arr, [0, 0.25, 0.5, 0.75, 1], axis=0)
+
+        # 1. Histogramas: índice do bin de cada valor e uma única contagem para todas as colunas
+        span = np.where(maxs > mins, maxs - mins, 1.0)
+        bin_idx = np.clip(np.floor((arr - mins) / span * bins), 0, bins - 1)
+        flat_idx = (bin_idx + np.arange(n_cols) * bins)[valid].astype(np.int64)
+        counts = np.bincount(flat_idx, minlength=n_cols * bins).reshape(n_cols, bins)
+        edges = mins[:, None] + span[:, None] * np.linspace(0, 1, bins + 1)
+
+        # 2. Boxplots: cinco números, extremos dos bigodes e contagem de outliers
+        iqr = q3 - q1
+        lower, upper = q1 - whisker * iqr, q3 + whisker * iqr
+        inside = valid & (arr >= lower) & (arr <= upper)
+        whisker_low = np.nanmin(np.where(inside, arr, np.nan), axis=0)
+        whisker_high = np.nanmax(np.where(inside, arr, np.nan), axis=0)
+        outliers = (valid & ~inside).sum(axis=0)
+
+    histograms = {}
+    boxplots = {}
+    for i, col in enumerate(numeric_cols):
+        histograms[col] = {
+            "counts": counts[i].tolist(),
+            "edges": edges[i].tolist(),
+        }
+        boxplots[col] = {
+            "min": float(mins[i]),
+            "q1": float(q1[i]),
+            "median": float(median[i]),
+            "q3": float(q3[i]),
+            "max": float(maxs[i]),
+            "whisker_low": float(whisker_low[i]),
+            "whisker_high": float(whisker_high[i]),
+            "outliers": int(outliers[i]),
+        }
+
+    result = {"format": "data", "histograms": histograms, "boxplots": boxplots}
+
+    # 3. Correlação (ver correlation.py): matriz, pares mais correlacionados e
+    # ordem agrupada das colunas (NaN vira null no JSON)
+    if n_cols > 1:
+        with stage("correlation"):
+            corr, rows_used = correlation_matrix(arr, correlation_sample_rows)
+            result.update(correlation_result(
+                corr, numeric_cols, rows_used, sampled=rows_used < len(arr),
+                top_k=correlation_top_k, max_matrix_columns=correlation_max_columns,
+            ))
+
+    return result
+
+
+# Matriz de correlação reordenada pelo agrupamento hierárquico (para o heatmap)
+def _clustered_correlation(df, sample_rows=None):
+    corr, _ = correlation_matrix(df.to_numpy(dtype=np.float64, na_value=np.nan), sample_rows)
+    order = cluster_order(corr)
+    return corr[np.ix_(order, order)], order
+
+
+# Renderização paralela dos gráficos EDA, com cache por (hash do dataset, coluna, tipo)
+class EDARenderer:
+    def __init__(self, max_workers=None, cache_size=1024):
+        self.max_workers = max_workers
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def executor(self):
+        # Pool criado sob demanda; 'spawn' evita fork de um processo com threads ativas
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._executor
+
+    # Sobe os processos do pool e importa matplotlib/seaborn em cada um
+    def warm_up(self):
+        executor = self.executor()
+        workers = self.max_workers or os.cpu_count() or 1
+        futures = [executor.submit(warm_up_worker) for _ in range(workers)]
+        for future in futures:
+            future.result()
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    # Gera (tipo, coluna, imagem) à medida que cada gráfico fica pronto
+    async def render(self, dataset_hash, df, correlation_sample_rows=None):
+        numeric_cols = df.select_dtypes(include=[np.number]).columns.tolist()
+
+        jobs = []
+        for col in numeric_cols:
+            for chart_type in COLUMN_CHARTS:
+                jobs.append((chart_type, col))
+        if len(numeric_cols) > 1:
+            jobs.append((CORRELATION_CHART, None))
+
+        loop = asyncio.get_running_loop()
+        pending = {}
+        try:
+            for chart_type, col in jobs:
+                key = (dataset_hash, col, chart_type)
+                if chart_type == CORRELATION_CHART:
+                    # O heatmap depende da amostra usada na correlação
+                    key += (correlation_sample_rows,)
+                image = self._cache_get(key)
+                if image is not None:
+                    yield chart_type, col, image
+                    continue
+
+                if chart_type == CORRELATION_CHART:
+                    corr, order = await asyncio.to_thread(
+                        timed_call, "correlation", _clustered_correlation, df[numeric_cols], correlation_sample_rows
+                    )
+                    args = (chart_type, None, corr, [numeric_cols[i] for i in order])
+                else:
+                    args = (chart_type, col, df[col].dropna().to_numpy())
+                future = loop.run_in_executor(self.executor(), render_chart_timed, *args)
+                pending[future] = key
+
+            while pending:
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    key = pending.pop(future)
+                    image, stages = future.result()
+                    record_stages(stages)
+                    self._cache_put(key, image)
+                    yield key[2], key[1], image
+        finally:
+            # Cliente desconectou ou houve erro: cancelar o que ainda não começou
+            for future in pending:
+                future.cancel()
+
+    # Funções auxiliares do cache LRU
+    def _cache_get(self, key):
+        with self._lock:
+            image = self._cache.get(key)
+            if image is not None:
+                self._cache.move_to_end(key)
+            return image
+
+    def _cache_put(self, key, image):
+        with self._lock:
+            self._cache[key] = image
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
@@ -0,0 +1,103 @@
+import zlib
+
+import pandas as pd
+
+
+# Colunas do arquivo de resultados: dados originais mais as colunas processadas
+# (prefixo processed_) quando os dois DataFrames têm as mesmas linhas. As Series
+# são apenas referenciadas; nada é copiado até a escrita de cada bloco.
+def result_columns(current_data, processed_data):
+    columns = {col: current_data[col] for col in current_data.columns}
+    if len(processed_data) == len(current_data):
+        for col in processed_data.columns:
+            if col not in current_data.columns or not processed_data[col].equals(current_data[col]):
+                columns[f"processed_{col}"] = processed_data[col]
+    return columns
+
+
+def _chunks(columns, chunk_rows):
+    n_rows = len(next(iter(columns.values()))) if columns else 0
+    for start in range(0, n_rows, chunk_rows):
+        yield pd.DataFrame(
+            {name: _slice(series, start, start + chunk_rows) for name, series in columns.items()},
+            copy=False,
+        )
+
+
+# Fatia sem índice (os índices das duas fontes podem diferir); categorias são mantidas
+def _slice(series, start, stop):
+    values = series.iloc[start:stop]
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return values.array
+    return values.to_numpy()
+
+
+# CSV em blocos de linhas: cada bloco é formatado e enviado antes do próximo,
+# então a memória usada não depende do tamanho do dataset
+def iter_csv(columns, chunk_rows=50_000):
+    yield pd.DataFrame(columns=list(columns)).to_csv(index=False).encode()
+    yield from iter_csv_frames(_chunks(columns, chunk_rows))
+
+
+# Mesmo formato a partir de blocos já prontos (ex.: datasets out-of-core em disco);
+# o cabeçalho sai do primeiro bloco
+def iter_csv_frames(frames, header=False):
+    for chunk in frames:
+        yield chunk.to_csv(index=False, header=header).encode()
+        header = False
+
+
+# Compressão gzip incremental de um iterador de bytes
+def iter_gzip(chunks, level=6):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits=31: formato gzip
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+# Parquet com um row group por bloco; os bytes de cada row group são enviados
+# assim que escritos (o rodapé com os metadados vai no final)
+def iter_parquet(columns, chunk_rows=50_000):
+    return iter_parquet_frames(_chunks(columns, chunk_rows))
+
+
+def iter_parquet_frames(frames):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    sink = _BytesSink()
+    writer = None
+    for chunk in frames:
+        if writer is None:
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            writer = pq.ParquetWriter(sink, table.schema)
+        else:
+            table = pa.Table.from_pandas(chunk, schema=writer.schema, preserve_index=False)
+        writer.write_table(table)
+        yield sink.drain()
+    if writer is not None:
+        writer.close()
+    yield sink.drain()
+
+
+class _BytesSink:
+    def __init__(self):
+        self._parts = []
+        self.closed = False
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b"".join(self._parts)
+        self._parts = []
+        return data
@@ -0,0 +1,213 @@
+import numpy as np
+import pandas as pd
+
+
+# Indicadores técnicos para dados OHLC, calculados com kernels vetorizados do
+# NumPy (somas acumuladas para janelas e filtro IIR para médias exponenciais).
+# Cada indicador é uma string "nome" ou "nome_parametros":
+#   sma_20, ema_12, rsi_14, macd (ou macd_12_26_9), bbands_20, atr_14, return_1
+# Todos continuam a partir de um estado (últimos valores e médias), o que permite
+# calcular só as linhas novas quando o dataset cresce.
+INDICATOR_DEFAULTS = {
+    "sma": [20],
+    "ema": [20],
+    "rsi": [14],
+    "macd": [12, 26, 9],
+    "bbands": [20],
+    "atr": [14],
+    "return": [1],
+}
+
+# Desvios-padrão das bandas de Bollinger
+BBANDS_STD = 2.0
+
+
+def parse_indicator(spec):
+    name, *params = spec.split("_")
+    if name not in INDICATOR_DEFAULTS:
+        raise ValueError(f"Indicador não suportado: {spec}")
+    defaults = INDICATOR_DEFAULTS[name]
+    try:
+        values = [int(p) for p in params] if params else list(defaults)
+    except ValueError:
+        raise ValueError(f"Parâmetros inválidos para o indicador: {spec}")
+    if len(values) != len(defaults) or any(v < 1 for v in values):
+        raise ValueError(f"Parâmetros inválidos para o indicador: {spec}")
+    return name, values
+
+
+# Linhas de histórico (close/high/low) que o estado precisa guardar
+def history_size(specs):
+    size = 1
+    for spec in specs:
+        name, values = parse_indicator(spec)
+        if name in ("sma", "bbands"):
+            size = max(size, values[0] - 1)
+        elif name == "return":
+            size = max(size, values[0])
+    return size
+
+
+# Acrescenta as colunas dos indicadores a df, continuando de state (None = início
+# da série). Retorna o DataFrame e o estado após a linha until - 1 (padrão: última
+# linha), para que a próxima chamada continue exatamente dali.
+def add_indicators(df, specs, state=None, until=None):
+    until = len(df) if until is None else until
+    head, head_state = compute_indicators(df.iloc[:until], specs, state)
+    tail, _ = compute_indicators(df.iloc[until:], specs, head_state)
+
+    columns = {name: np.concatenate([head[name], tail[name]]) for name in head}
+    # Colunas existentes compartilhadas com df, sem cópia (assign copiaria o DataFrame inteiro)
+    out = pd.DataFrame({**{col: df[col] for col in df.columns}, **columns}, index=df.index, copy=False)
+    return out, head_state
+
+
+def compute_indicators(df, specs, state=None):
+    state = state or {}
+    history = state.get("history", {})
+    hist_size = history_size(specs)
+
+    close = _column(df, "close")
+    prev_close = np.asarray(history.get("close", []), dtype=np.float64)
+    needs_range = any(parse_indicator(spec)[0] == "atr" for spec in specs)
+    if needs_range:
+        high, low = _column(df, "high"), _column(df, "low")
+
+    columns = {}
+    new_state = {}
+    for spec in specs:
+        name, values = parse_indicator(spec)
+
+        if name == "sma":
+            columns[spec] = _rolling_mean(prev_close, close, values[0])
+
+        elif name == "ema":
+            columns[spec] = _ema(close, 2.0 / (values[0] + 1), state.get(spec))
+            new_state[spec] = _last(columns[spec], state.get(spec))
+
+        elif name == "rsi":
+            gain, loss = _gain_loss(prev_close, close)
+            prev_gain, prev_loss = state.get(spec, (None, None))
+            avg_gain = _ema(gain, 1.0 / values[0], prev_gain)
+            avg_loss = _ema(loss, 1.0 / values[0], prev_loss)
+            total = avg_gain + avg_loss
+            rsi = np.full(len(close), 50.0)
+            np.divide(100.0 * avg_gain, total, out=rsi, where=total > 0)
+            rsi[np.isnan(total)] = np.nan
+            columns[spec] = rsi
+            new_state[spec] = [_last(avg_gain, prev_gain), _last(avg_loss, prev_loss)]
+
+        elif name == "macd":
+            fast, slow, signal = values
+            prev_fast, prev_slow, prev_signal = state.get(spec, (None, None, None))
+            ema_fast = _ema(close, 2.0 / (fast + 1), prev_fast)
+            ema_slow = _ema(close, 2.0 / (slow + 1), prev_slow)
+            macd = ema_fast - ema_slow
+            macd_signal = _ema(macd, 2.0 / (signal + 1), prev_signal)
+            columns[spec] = macd
+            columns[f"{spec}_signal"] = macd_signal
+            columns[f"{spec}_hist"] = macd - macd_signal
+            new_state[spec] = [
+                _last(ema_fast, prev_fast), _last(ema_slow, prev_slow), _last(macd_signal, prev_signal)
+            ]
+
+        elif name == "bbands":
+            window = values[0]
+            middle = _rolling_mean(prev_close, close, window)
+            std = _rolling_std(prev_close, close, window)
+            columns[f"{spec}_upper"] = middle + BBANDS_STD * std
+            columns[f"{spec}_middle"] = middle
+            columns[f"{spec}_lower"] = middle - BBANDS_STD * std
+
+        elif name == "atr":
+            # Fechamento anterior (sem histórico, a primeira linha usa só high - low)
+            prev_last = prev_close[-1:] if len(prev_close) else np.array([np.nan])
+            previous = np.concatenate([prev_last, close])[:len(close)]
+            true_range = np.fmax(high - low, np.fmax(np.abs(high - previous), np.abs(low - previous)))
+            columns[spec] = _ema(true_range, 1.0 / values[0], state.get(spec))
+            new_state[spec] = _last(columns[spec], state.get(spec))
+
+        elif name == "return":
+            lag = values[0]
+            extended = np.concatenate([prev_close, close])
+            shifted = np.full(len(extended), np.nan)
+            shifted[lag:] = extended[:-lag]
+            columns[spec] = (extended / shifted - 1.0)[len(prev_close):]
+
+    # Histórico para as janelas da próxima chamada
+    new_state["history"] = {"close": _tail(prev_close, close, hist_size)}
+    if needs_range:
+        new_state["history"]["high"] = _tail(history.get("high", []), high, hist_size)
+        new_state["history"]["low"] = _tail(history.get("low", []), low, hist_size)
+    return columns, new_state
+
+
+# Colunas geradas por uma lista de indicadores (na ordem em que são adicionadas)
+def indicator_columns(specs):
+    columns = []
+    for spec in specs:
+        name, _ = parse_indicator(spec)
+        if name == "macd":
+            columns += [spec, f"{spec}_signal", f"{spec}_hist"]
+        elif name == "bbands":
+            columns += [f"{spec}_upper", f"{spec}_middle", f"{spec}_lower"]
+        else:
+            columns.append(spec)
+    return columns
+
+
+# Kernels
+def _column(df, name):
+    if name not in df.columns:
+        raise ValueError(f"Coluna '{name}' necessária para os indicadores técnicos")
+    values = df[name].to_numpy(dtype=np.float64, na_value=np.nan)
+    if np.isnan(values).any():
+        raise ValueError(f"A coluna '{name}' tem valores ausentes; trate-os antes dos indicadores")
+    return values
+
+
+# Média exponencial y[t] = a*x[t] + (1-a)*y[t-1] com filtro IIR (scipy.signal.lfilter).
+# Sem estado anterior, a série começa no primeiro valor válido (como ewm(adjust=False)).
+def _ema(x, alpha, prev=None):
+    from scipy.signal import lfilter
+
+    out = np.full(len(x), np.nan)
+    valid = ~np.isnan(x)
+    start = int(np.argmax(valid)) if valid.any() else len(x)
+    if start == len(x):
+        return out
+    values = x[start:]
+    if prev is None:
+        prev = values[0]
+    out[start:], _ = lfilter([alpha], [1.0, alpha - 1.0], values, zi=[(1.0 - alpha) * prev])
+    return out
+
+
+def _rolling_mean(history, x, window):
+    extended = np.concatenate([history[-(window - 1):] if window > 1 else history[:0], x])
+    out = np.full(len(extended), np.nan)
+    if len(extended) >= window:
+        cumsum = np.concatenate([[0.0], np.cumsum(extended)])
+        out[window - 1:] = (cumsum[window:] - cumsum[:-window]) / window
+    return out[len(extended) - len(x):]
+
+
+def _rolling_std(history, x, window):
+    # Desvio populacional em janela deslizante (kernel online do pandas, estável numericamente)
+    extended = np.concatenate([history[-(window - 1):] if window > 1 else history[:0], x])
+    std = pd.Series(extended).rolling(window).std(ddof=0).to_numpy()
+    return std[len(extended) - len(x):]
+
+
+def _gain_loss(history, x):
+    extended = np.concatenate([history[-1:], x])
+    delta = np.diff(extended, prepend=np.nan)[len(extended) - len(x):]
+    return np.clip(delta, 0, None), np.clip(-delta, 0, None)
+
+
+def _last(values, previous):
+    return float(values[-1]) if len(values) and not np.isnan(values[-1]) else previous
+
+
+def _tail(history, x, size):
+    return np.concatenate([np.asarray(history, dtype=np.float64), x])[-size:].tolist()
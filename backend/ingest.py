@@ -0,0 +1,237 @@
+import hashlib
+import re
+import sys
+import warnings
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+
+# Leitura do CSV em blocos, sem carregar o arquivo inteiro em memória.
+# Os tipos das colunas são inferidos de uma amostra inicial: colunas de texto
+# são lidas direto como 'category' e as numéricas são compactadas a cada bloco.
+def read_csv_chunked(fileobj, chunk_rows=100_000, sample_rows=10_000,
+                     downcast_floats=False, preview_rows=10, encoding="utf-8"):
+    preview = None
+    pieces = None
+    for chunk in iter_csv_chunks(fileobj, chunk_rows, sample_rows, downcast_floats, encoding):
+        if preview is None:
+            preview = chunk.head(preview_rows).astype(object)
+            pieces = {col: [] for col in chunk.columns}
+        for col in chunk.columns:
+            pieces[col].append(chunk[col])
+        del chunk
+
+    if preview is None:
+        raise ValueError("Arquivo CSV vazio")
+
+    # Montar o DataFrame final coluna a coluna
+    data = {}
+    for col in list(pieces):
+        data[col] = _concat_pieces(pieces.pop(col))
+    df = pd.DataFrame(data, copy=False)
+
+    return df, preview
+
+
+# Blocos do CSV já com os tipos compactos (usado também pelo modo out-of-core,
+# que grava cada bloco em disco em vez de juntá-los)
+def iter_csv_chunks(fileobj, chunk_rows=100_000, sample_rows=10_000,
+                    downcast_floats=False, encoding="utf-8"):
+    # 1. Inferir tipos a partir de uma amostra
+    sample = pd.read_csv(fileobj, nrows=sample_rows, encoding=encoding)
+    category_cols = [col for col in sample.columns if sample[col].dtype == object]
+    fileobj.seek(0)
+    del sample
+
+    # 2. Ler os blocos já com os tipos compactos
+    reader = pd.read_csv(
+        fileobj,
+        chunksize=chunk_rows,
+        encoding=encoding,
+        dtype={col: "category" for col in category_cols},
+    )
+    for chunk in reader:
+        yield pd.DataFrame(
+            {col: _compact_series(chunk[col], downcast_floats) for col in chunk.columns},
+            copy=False,
+        )
+
+
+# Hash do conteúdo do arquivo, lido em blocos (usado como chave do cache em disco)
+def hash_file(fileobj, block_size=1 << 20):
+    digest = hashlib.sha256()
+    for block in iter(lambda: fileobj.read(block_size), b""):
+        digest.update(block)
+    fileobj.seek(0)
+    return digest.hexdigest()
+
+
+# Acrescenta linhas novas ao final de um DataFrame já carregado, mantendo os
+# mesmos tipos compactos da leitura (categorias unidas, floats no tipo original
+# quando os valores novos cabem nele sem perda; senão a coluna vai para float64)
+def append_rows(df, new_rows):
+    data = {}
+    for col in df.columns:
+        old, new = df[col], new_rows[col]
+        if isinstance(old.dtype, pd.CategoricalDtype):
+            new = new.astype(str).where(new.notna()).astype("category")
+        elif pd.api.types.is_datetime64_any_dtype(old.dtype):
+            new = _parse_dates(new.astype(str).where(new.notna()))
+            if new is None:
+                raise ValueError(f"Datas inválidas na coluna {col}")
+        elif isinstance(old.dtype, pd.StringDtype):
+            new = new.astype(old.dtype)
+        elif pd.api.types.is_numeric_dtype(old.dtype):
+            new = pd.to_numeric(new, errors="coerce")
+            if pd.api.types.is_float_dtype(old.dtype):
+                cast = new.astype(old.dtype)
+                if np.array_equal(cast.to_numpy(np.float64), new.to_numpy(np.float64), equal_nan=True):
+                    new = cast
+                else:
+                    old, new = old.astype(np.float64), new.astype(np.float64)
+        data[col] = _concat_pieces([old, new])
+    return pd.DataFrame(data, copy=False)
+
+
+# Otimização de memória depois da leitura: inteiros no menor tipo, floats em
+# float32 quando não há perda (ou sempre, com downcast_floats), datas ISO 8601
+# em datetime64, textos com poucos valores distintos em 'category' e os demais
+# em strings do Arrow (em vez de objetos Python, ~50 bytes a mais por valor).
+def optimize_dtypes(df, downcast_floats=False, category_max_ratio=0.5, arrow_strings=True):
+    data = {}
+    for col in df.columns:
+        data[col] = _optimize_series(df[col], downcast_floats, category_max_ratio, arrow_strings)
+    return pd.DataFrame(data, copy=False)
+
+
+# Memória usada pelos dados e estimativa do que o pd.read_csv padrão usaria
+# (int64/float64 e um objeto str por célula de texto), por coluna
+def memory_report(df):
+    columns = {}
+    for col in df.columns:
+        series = df[col]
+        columns[col] = {
+            "dtype": str(series.dtype),
+            "bytes": int(series.memory_usage(index=False, deep=True)),
+            "read_csv_bytes": _read_csv_bytes(series),
+        }
+    after = sum(c["bytes"] for c in columns.values())
+    before = sum(c["read_csv_bytes"] for c in columns.values())
+    return {
+        "bytes": after,
+        "read_csv_bytes": before,
+        "reduction": round(1 - after / before, 4) if before else 0.0,
+        "columns": columns,
+    }
+
+
+# Bytes de df que não são compartilhados com base: colunas que apontam para os
+# mesmos dados de base (ex.: não alteradas pelo pré-processamento) não contam
+def unshared_memory(df, base=None):
+    total = 0 if base is not None and df.index is base.index else int(df.index.memory_usage(deep=True))
+    for col in df.columns:
+        series = df[col]
+        if base is not None and col in base.columns and _shares_data(series, base[col]):
+            continue
+        total += int(series.memory_usage(index=False, deep=True))
+    return total
+
+
+def _shares_data(a, b):
+    if isinstance(a.dtype, np.dtype) and isinstance(b.dtype, np.dtype):
+        return np.may_share_memory(a.to_numpy(), b.to_numpy())
+    if isinstance(a.dtype, pd.CategoricalDtype) and isinstance(b.dtype, pd.CategoricalDtype):
+        return np.may_share_memory(a.array.codes, b.array.codes)
+    return a.array is b.array
+
+
+# Funções auxiliares para compactação dos blocos
+def _compact_series(series, downcast_floats):
+    if pd.api.types.is_float_dtype(series.dtype) and downcast_floats:
+        return series.astype(np.float32)
+    return series
+
+
+def _concat_pieces(pieces):
+    if all(isinstance(p.dtype, pd.CategoricalDtype) for p in pieces):
+        merged = pd.Series(union_categoricals(pieces), name=pieces[0].name)
+    else:
+        merged = pd.concat(pieces, ignore_index=True)
+        # Blocos com tipos diferentes (ex.: texto em uma coluna numérica)
+        if merged.dtype == object:
+            merged = merged.astype(str).where(merged.notna())
+
+    # Inteiros: reduzir para o menor tipo que comporta o intervalo observado
+    if pd.api.types.is_integer_dtype(merged.dtype):
+        merged = pd.to_numeric(merged, downcast="integer")
+    return merged.reset_index(drop=True)
+
+
+def _optimize_series(series, downcast_floats, category_max_ratio, arrow_strings):
+    if pd.api.types.is_integer_dtype(series.dtype):
+        return pd.to_numeric(series, downcast="integer")
+
+    if pd.api.types.is_float_dtype(series.dtype) and series.dtype != np.float32:
+        values = series.to_numpy()
+        as_float32 = values.astype(np.float32)
+        if downcast_floats or np.array_equal(as_float32, values, equal_nan=True):
+            return pd.Series(as_float32, name=series.name)
+        return series
+
+    if series.dtype == object or isinstance(series.dtype, pd.CategoricalDtype):
+        # Valores distintos (as categorias, se já houver) decidem o tipo final
+        categorical = series if isinstance(series.dtype, pd.CategoricalDtype) else series.astype("category")
+        categories = categorical.cat.categories
+        if len(categories) and _DATE_PATTERN.match(str(categories[0])):
+            dates = _parse_dates(pd.Series(categories.astype(str)))
+            if dates is not None:
+                codes = categorical.cat.codes.to_numpy()
+                values = dates.to_numpy()[codes]
+                values[codes == -1] = np.datetime64("NaT")
+                return pd.Series(values, name=series.name)
+        if arrow_strings and len(categories) > category_max_ratio * max(len(series), 1):
+            return series.astype(pd.StringDtype("pyarrow"))
+        return categorical
+
+    return series
+
+
+_DATE_PATTERN = re.compile(r"^\d{4}-\d{2}-\d{2}")
+
+
+# Datas ISO 8601 (com ou sem hora); None se algum valor não for data ou se os
+# fusos forem misturados
+def _parse_dates(values):
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            dates = pd.to_datetime(values, format="ISO8601", errors="coerce")
+    except (ValueError, TypeError):
+        return None
+    if not pd.api.types.is_datetime64_any_dtype(dates.dtype) or dates.isna().sum() != values.isna().sum():
+        return None
+    return dates
+
+
+def _read_csv_bytes(series):
+    n_rows = len(series)
+    if pd.api.types.is_numeric_dtype(series.dtype) and not pd.api.types.is_bool_dtype(series.dtype):
+        return 8 * n_rows
+    if pd.api.types.is_bool_dtype(series.dtype):
+        return n_rows
+    # Texto (e datas, lidas como texto): ponteiro por linha mais um str por valor
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        sizes = np.array([sys.getsizeof(str(c)) for c in series.cat.categories], dtype=np.int64)
+        codes = series.cat.codes.to_numpy()
+        counts = np.bincount(codes[codes >= 0], minlength=len(sizes))
+        return int(8 * n_rows + counts @ sizes)
+    valid = series.dropna()
+    if pd.api.types.is_datetime64_any_dtype(series.dtype):
+        text_len = 10 if (valid.dt.normalize() == valid).all() else 19
+        return int(8 * n_rows + len(valid) * sys.getsizeof("x" * text_len))
+    if isinstance(series.dtype, pd.StringDtype):
+        lengths = valid.str.len().to_numpy(dtype=np.int64)
+        return int(8 * n_rows + len(valid) * sys.getsizeof("") + lengths.sum())
+    return int(series.memory_usage(index=False, deep=True))
@@ -0,0 +1,155 @@
+import json
+import multiprocessing
+import os
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from training import TrainingCancelled, run_training
+
+
+# Estado dos jobs de treino em arquivos JSON (um por job), legível por qualquer
+# processo: o worker grava o progresso e a API apenas lê.
+class JobStore:
+    def __init__(self, jobs_dir):
+        self.jobs_dir = jobs_dir
+        os.makedirs(self.jobs_dir, exist_ok=True)
+
+    def create(self, job_id, info):
+        job = {
+            "job_id": job_id,
+            "status": "queued",
+            "created_at": pd.Timestamp.now().isoformat(),
+            "progress": {"fold": 0, "n_folds": None},
+            "folds": [],
+            "result": None,
+            "error": None,
+        }
+        job.update(info)
+        self._write(job_id, job)
+        return job
+
+    def load(self, job_id):
+        path = self._path(job_id)
+        if path is None or not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return json.load(f)
+
+    def update(self, job_id, **fields):
+        job = self.load(job_id)
+        job.update(fields)
+        self._write(job_id, job)
+        return job
+
+    # Cancelamento: arquivo-sinal verificado pelo worker entre os folds
+    def request_cancel(self, job_id):
+        open(self._path(job_id) + ".cancel", "w").close()
+
+    def cancel_requested(self, job_id):
+        return os.path.exists(self._path(job_id) + ".cancel")
+
+    def _path(self, job_id):
+        if not job_id or not all(c in "0123456789abcdef" for c in job_id):
+            return None
+        return os.path.join(self.jobs_dir, f"{job_id}.json")
+
+    def _write(self, job_id, job):
+        path = self._path(job_id)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(job, f)
+        os.replace(tmp_path, path)
+
+
+# Executado no processo do pool: roda a tarefa (treino ou busca de
+# hiperparâmetros) e registra o progresso de cada fold
+def _run_job(jobs_dir, job_id, task, task_kwargs):
+    store = JobStore(jobs_dir)
+    if store.cancel_requested(job_id):
+        store.update(job_id, status="cancelled")
+        return
+
+    store.update(job_id, status="running", started_at=pd.Timestamp.now().isoformat())
+    folds = []
+
+    def progress(fold, n_folds, metrics):
+        # Com folds em paralelo a ordem de conclusão pode variar
+        folds.append(metrics)
+        store.update(job_id, progress={"fold": fold, "n_folds": n_folds}, folds=folds)
+        if store.cancel_requested(job_id):
+            raise TrainingCancelled()
+
+    try:
+        result = task(progress=progress, **task_kwargs)
+        store.update(job_id, status="completed", result=result,
+                     finished_at=pd.Timestamp.now().isoformat())
+    except TrainingCancelled:
+        store.update(job_id, status="cancelled", finished_at=pd.Timestamp.now().isoformat())
+    except Exception as e:
+        store.update(job_id, status="failed", error=str(e),
+                     finished_at=pd.Timestamp.now().isoformat())
+
+
+# Fila de treinos em segundo plano sobre um pool de processos. A tarefa deve ser
+# uma função de módulo (enviada ao processo por pickle) que aceite progress=.
+class JobQueue:
+    def __init__(self, jobs_dir, max_workers=None):
+        self.store = JobStore(jobs_dir)
+        self.max_workers = max_workers
+        self._futures = {}
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def executor(self):
+        # 'spawn': o processo da API tem threads ativas, fork não é seguro
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._executor
+
+    def submit(self, info, task=run_training, **task_kwargs):
+        job_id = uuid.uuid4().hex
+        job = self.store.create(job_id, info)
+        future = self.executor().submit(_run_job, self.store.jobs_dir, job_id, task, task_kwargs)
+        with self._lock:
+            self._futures[job_id] = future
+        future.add_done_callback(lambda f: self._finished(job_id, f))
+        return job
+
+    def status(self, job_id):
+        return self.store.load(job_id)
+
+    def cancel(self, job_id):
+        job = self.store.load(job_id)
+        if job is None:
+            return None
+        if job["status"] in ("completed", "failed", "cancelled"):
+            return job
+
+        self.store.request_cancel(job_id)
+        with self._lock:
+            future = self._futures.get(job_id)
+        # Ainda na fila: cancela direto; em execução, o worker para no próximo fold
+        if future is not None and future.cancel():
+            return self.store.update(job_id, status="cancelled")
+        job["cancel_requested"] = True
+        return job
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def _finished(self, job_id, future):
+        with self._lock:
+            self._futures.pop(job_id, None)
+        # Falha fora do treino (ex.: processo do pool encerrado abruptamente)
+        if not future.cancelled() and future.exception() is not None:
+            self.store.update(job_id, status="failed", error=str(future.exception()))
@@ -1,24 +1,43 @@
 import os
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import FastAPI, UploadFile, File, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import Response, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 import pandas as pd
 import numpy as np
 from pydantic import BaseModel
 from typing import List, Dict, Any, Optional
-import joblib
 import io
-import matplotlib.pyplot as plt
-import seaborn as sns
-import base64
-from sklearn.preprocessing import StandardScaler
 import json
+import hashlib
+import importlib
+import threading
+from data_cache import DataCache
+from eda import EDARenderer, compute_eda_data
+from export import iter_csv, iter_csv_frames, iter_gzip, iter_parquet, iter_parquet_frames, result_columns
+from dataset_store import DatasetStore
+from ingest import append_rows, hash_file, iter_csv_chunks, memory_report, optimize_dtypes, read_csv_chunked
+from model_store import ModelCache, load_bundle, load_predictions
+from jobs import JobQueue
+from out_of_core import ChunkedDataset, chunked_eda_data, run_chunked_preprocessing, run_chunked_training, sample_rows
+from dataset_profile import DatasetProfile
+from rows import RowIndexCache, arrow_ipc, columnar_json, parse_filter
+from preprocessing import (
+    PreprocessingPipeline, ProcessedCache, canonical_options, extend_processed, run_preprocessing
+)
+from training import MODEL_TYPES, run_training, update_model
+from tuning import successive_halving
+from metrics import MetricsMiddleware, MetricsRegistry, timed_call
+from serialization import FastJSONResponse, negotiated_response
 
 # Inicializar a aplicação FastAPI
 app = FastAPI(
     title="ML Data App API",
     description="API para processamento de dados, EDA e previsões com modelos de machine learning",
-    version="1.0.0"
+    version="1.0.0",
+    # JSON com orjson (NaN como null, numpy direto); upload, preprocess, predict e
+    # predictions também respondem em Arrow IPC ou MessagePack conforme o Accept
+    default_response_class=FastJSONResponse,
 )
 
 # Configurar CORS para permitir requisições do frontend
@@ -28,19 +47,96 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Total-Count", "X-Offset", "Server-Timing"],
+)
+
+# Métricas por rota e por etapa (Prometheus em /metrics). METRICS_DEBUG_HEADER=1
+# envia Server-Timing em todas as respostas (senão só com X-Debug-Timing: 1);
+# METRICS_TRACEMALLOC=1 mede o pico de alocações (tem custo em todas as alocações).
+metrics_registry = MetricsRegistry()
+app.add_middleware(
+    MetricsMiddleware,
+    registry=metrics_registry,
+    debug_header=os.environ.get("METRICS_DEBUG_HEADER", "0") == "1",
+    trace_memory=os.environ.get("METRICS_TRACEMALLOC", "0") == "1",
 )
 
 # Diretório para salvar modelos pré-treinados
 MODELS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "models")
 os.makedirs(MODELS_DIR, exist_ok=True)
 
-# Variáveis globais
-current_data = None
-processed_data = None
-scaler_global = None  # <- NOVO: para manter o scaler aplicado
+# Cache em disco (Arrow IPC) dos datasets carregados e processados, ao lado de MODELS_DIR
+CACHE_DIR = os.environ.get(
+    "DATA_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache")
+)
+data_cache = DataCache(CACHE_DIR) if CACHE_DIR else None
+
+# Armazenamento dos datasets por sessão (limite de memória com LRU)
+DATASET_STORE_MAX_BYTES = int(os.environ.get("DATASET_STORE_MAX_MB", 1024)) * 1024 * 1024
+dataset_store = DatasetStore(DATASET_STORE_MAX_BYTES, cache=data_cache)
+
+# Renderização dos gráficos EDA em um pool de processos (EDA_WORKERS=0 usa todos os núcleos)
+EDA_WORKERS = int(os.environ.get("EDA_WORKERS", 0)) or None
+eda_renderer = EDARenderer(max_workers=EDA_WORKERS)
+
+@app.on_event("shutdown")
+def shutdown_eda_renderer():
+    eda_renderer.shutdown()
+
+# Pré-aquecimento: sklearn, scipy e o pool de gráficos são carregados em segundo
+# plano PREWARM_DELAY segundos depois da inicialização, com o servidor já
+# respondendo. Assim nem o start nem a primeira chamada de treino/EDA pagam as
+# importações. PREWARM=0 desativa. O pool de gráficos sobe um processo por worker
+# (todos os núcleos com EDA_WORKERS=0, em cada worker do uvicorn), então só é
+# pré-aquecido com PREWARM_EDA=1.
+PREWARM = os.environ.get("PREWARM", "1") == "1"
+PREWARM_EDA = os.environ.get("PREWARM_EDA", "0") == "1"
+PREWARM_DELAY = float(os.environ.get("PREWARM_DELAY", 1.0))
+PREWARM_MODULES = [
+    "joblib",
+    "sklearn.linear_model",
+    "sklearn.ensemble",
+    "sklearn.preprocessing",
+    "sklearn.model_selection",
+    "sklearn.metrics",
+    "scipy.signal",
+    "scipy.cluster.hierarchy",
+]
+
+def prewarm():
+    for module in PREWARM_MODULES:
+        importlib.import_module(module)
+    if PREWARM_EDA:
+        eda_renderer.warm_up()
+
+@app.on_event("startup")
+def start_prewarm():
+    if PREWARM:
+        timer = threading.Timer(PREWARM_DELAY, prewarm)
+        timer.daemon = True
+        timer.start()
+
+# Leitura de CSV em blocos (linhas por bloco e compactação de floats para float32)
+CSV_CHUNK_ROWS = int(os.environ.get("CSV_CHUNK_ROWS", 100_000))
+CSV_DOWNCAST_FLOATS = os.environ.get("CSV_DOWNCAST_FLOATS", "0") == "1"
+# Otimização de tipos após a leitura: texto vira 'category' se tiver no máximo
+# CATEGORY_MAX_RATIO valores distintos por linha; acima disso, strings do Arrow
+CATEGORY_MAX_RATIO = float(os.environ.get("CATEGORY_MAX_RATIO", 0.5))
+ARROW_STRINGS = os.environ.get("ARROW_STRINGS", "1") == "1"
+
+# Modo out-of-core: CSVs a partir deste tamanho ficam em disco em blocos Arrow e
+# são processados em streaming (requer o cache em disco). EDA_SAMPLE_ROWS limita a
+# amostra usada nos quartis e nos gráficos desses datasets.
+OUT_OF_CORE_MIN_BYTES = int(os.environ.get("OUT_OF_CORE_MIN_MB", 1024)) * 1024 * 1024
+EDA_SAMPLE_ROWS = int(os.environ.get("EDA_SAMPLE_ROWS", 200_000))
+
+# Linhas por bloco nos arquivos do /download-results/
+DOWNLOAD_CHUNK_ROWS = int(os.environ.get("DOWNLOAD_CHUNK_ROWS", 50_000))
 
 # Modelos de dados para as requisições e respostas
 class DataPreview(BaseModel):
+    dataset_id: str
     columns: List[str]
     data: List[List[Any]]
     shape: List[int]
@@ -52,218 +148,620 @@ class PreprocessingOptions(BaseModel):
     normalize: bool = True
     remove_outliers: bool = False
     outlier_threshold: float = 1.5  # Para o método IQR
+    indicators: List[str] = []  # Indicadores técnicos, ex.: ["sma_20", "ema_12", "rsi_14", "macd", "bbands_20", "atr_14", "return_1"]
+
+class TransformRequest(BaseModel):
+    pipeline_id: str
+    columns: List[str]
+    data: List[List[Any]]
+
+class AppendRowsRequest(BaseModel):
+    columns: List[str]
+    data: List[List[Any]]
+    model_filename: Optional[str] = None  # modelo a atualizar incrementalmente com as novas linhas
 
 class PredictionRequest(BaseModel):
     model_type: str  # 'regression', 'classification', 'random_forest'
     target_column: str
     feature_columns: List[str]
+    params: Optional[Dict[str, Any]] = None  # hiperparâmetros do modelo (ex.: best_params do /tune/)
+
+class TuneRequest(BaseModel):
+    model_type: str
+    target_column: str
+    feature_columns: List[str]
+    param_grid: Optional[Dict[str, List[Any]]] = None  # padrão: DEFAULT_PARAM_GRIDS do tipo
+    factor: int = 3
+    n_splits: int = 5
+
+class ScoreRequest(BaseModel):
+    model_filename: str
+    columns: List[str]
+    data: List[List[Any]]
+    pipeline_id: Optional[str] = None  # aplica o pipeline de pré-processamento antes de prever
 
 class PredictionResult(BaseModel):
     predictions: List[float]
     metrics: Dict[str, float]
     model_info: Dict[str, Any]
 
+# Função auxiliar para obter a sessão do dataset informado
+def get_session(dataset_id: str):
+    session = dataset_store.get(dataset_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Nenhum dado foi carregado")
+    return session
+
+# Perfil do dataset: lido do cache em disco ou calculado em uma passagem pelos dados
+def build_profile(content_hash, current_data=None, chunks=None):
+    if data_cache is not None and content_hash:
+        stored = data_cache.load_profile(content_hash)
+        if stored is not None:
+            return DatasetProfile.from_dict(stored)
+    if chunks is not None:
+        profile = DatasetProfile.from_chunks(chunks.iter_chunks())
+        # Tipos de todos os blocos juntos (o perfil mesclado fica com os do último)
+        for col, column in profile.columns.items():
+            column.dtype = chunks.dtypes.get(col, column.dtype)
+        return profile
+    profile = DatasetProfile.from_frame(current_data)
+    profile.memory = memory_report(current_data)
+    return profile
+
+# ETag de respostas que só dependem do conteúdo do dataset
+def etag_matches(request: Request, etag):
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    return header.strip() == "*" or etag in [tag.strip().removeprefix("W/") for tag in header.split(",")]
+
+# Rotas que dependem do dataset inteiro em memória
+def require_in_memory(session):
+    if session.out_of_core:
+        raise HTTPException(status_code=400, detail="Operação não disponível para datasets no modo out-of-core")
+
+# Modelos já carregados do disco, servidos pelo /score/ (LRU)
+MODEL_CACHE_SIZE = int(os.environ.get("MODEL_CACHE_SIZE", 16))
+model_cache = ModelCache(MODELS_DIR, max_models=MODEL_CACHE_SIZE)
+
+# Fila de treinos em segundo plano (estado dos jobs persistido em MODELS_DIR/jobs)
+TRAINING_WORKERS = int(os.environ.get("TRAINING_WORKERS", 2))
+job_queue = JobQueue(os.path.join(MODELS_DIR, "jobs"), max_workers=TRAINING_WORKERS)
+
+# Paralelismo do treino: folds em paralelo, n_jobs do estimador e limite total de threads
+TRAINING_FOLD_JOBS = int(os.environ.get("TRAINING_FOLD_JOBS", 5))
+TRAINING_ESTIMATOR_JOBS = int(os.environ.get("TRAINING_ESTIMATOR_JOBS", 1))
+TRAINING_MAX_THREADS = int(os.environ.get("TRAINING_MAX_THREADS", 0)) or None
+TRAINING_PARALLEL_MIN_ROWS = int(os.environ.get("TRAINING_PARALLEL_MIN_ROWS", 10_000))
+
+# Treinos síncronos (/predict/ e /tune/ sem background) simultâneos; os demais esperam a vez
+TRAINING_SYNC_SLOTS = max(1, int(os.environ.get("TRAINING_SYNC_SLOTS", 1)))
+sync_training_slots = threading.BoundedSemaphore(TRAINING_SYNC_SLOTS)
+
+# TRAINING_MAX_THREADS vale para o processo todo: cada treino que pode rodar ao
+# mesmo tempo (jobs em segundo plano + síncronos) recebe uma fatia fixa
+TRAINING_THREADS_PER_SLOT = max(
+    1, (TRAINING_MAX_THREADS or os.cpu_count() or 1) // (TRAINING_WORKERS + TRAINING_SYNC_SLOTS)
+)
+
+
+# Executa um treino síncrono numa das vagas de TRAINING_SYNC_SLOTS (na threadpool)
+def run_in_training_slot(func, **kwargs):
+    with sync_training_slots:
+        return func(**kwargs)
+
+# Previsões out-of-fold devolvidas direto no /predict/ (o restante é paginado em /predictions/)
+PREDICTIONS_PAGE_SIZE = int(os.environ.get("PREDICTIONS_PAGE_SIZE", 1000))
+
+@app.on_event("shutdown")
+def shutdown_job_queue():
+    job_queue.shutdown()
+
+# Atualização incremental: janela de linhas recentes para as árvores novas de um
+# random forest e quantas árvores são acrescentadas a cada atualização
+INCREMENTAL_WINDOW = int(os.environ.get("INCREMENTAL_WINDOW", 5000))
+FOREST_UPDATE_TREES = int(os.environ.get("FOREST_UPDATE_TREES", 10))
+
+# Correlação da EDA: amostra de linhas para o modo aproximado (0 = todas as
+# linhas), pares mais correlacionados devolvidos e limite de colunas para a
+# matriz completa ir no JSON
+CORRELATION_SAMPLE_ROWS = int(os.environ.get("CORRELATION_SAMPLE_ROWS", 0))
+CORRELATION_TOP_K = int(os.environ.get("CORRELATION_TOP_K", 20))
+CORRELATION_MAX_COLUMNS = int(os.environ.get("CORRELATION_MAX_COLUMNS", 100))
+
+# Navegação pelas linhas (/rows/): tamanho máximo da página e memória dos
+# índices de ordenação/filtro mantidos entre páginas
+ROWS_MAX_LIMIT = int(os.environ.get("ROWS_MAX_LIMIT", 10_000))
+row_index_cache = RowIndexCache(max_bytes=int(os.environ.get("ROW_INDEX_CACHE_MB", 256)) * 1024 * 1024)
+
+# Resultados de folds avaliados pelo /tune/ (reaproveitados entre buscas)
+TUNING_CACHE_DIR = os.path.join(MODELS_DIR, "tuning")
+
+# Resultados do /preprocess/ por dataset + opções (alternar entre combinações
+# de opções já usadas não recalcula), limitados pela memória própria de cada um
+processed_cache = ProcessedCache(max_bytes=int(os.environ.get("PROCESSED_CACHE_MB", 512)) * 1024 * 1024)
+# Original despejado ou removido do store: os resultados derivados dele passam a contar inteiros
+dataset_store.on_release = processed_cache.release_base
+
+# Pipelines de pré-processamento já carregados do disco (por ID)
+pipeline_cache = {}
+
+def get_pipeline(pipeline_id: str):
+    pipeline = pipeline_cache.get(pipeline_id)
+    if pipeline is None:
+        try:
+            pipeline = PreprocessingPipeline.load(MODELS_DIR, pipeline_id)
+        except KeyError:
+            pipeline = None
+        if pipeline is None:
+            raise HTTPException(status_code=404, detail="Pipeline de pré-processamento não encontrado")
+        pipeline_cache[pipeline_id] = pipeline
+    return pipeline
+
 # Rota para verificar se a API está funcionando
 @app.get("/")
 async def root():
     return {"message": "ML Data App API está funcionando!"}
 
+# Rota para as métricas no formato texto do Prometheus
+@app.get("/metrics")
+async def get_metrics():
+    return Response(metrics_registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+# Executa func numa thread do pool, cronometrada como a etapa name
+async def run_stage(name, func, *args, **kwargs):
+    return await run_in_threadpool(timed_call, name, func, *args, **kwargs)
+
 # Rota para upload de arquivo CSV
 @app.post("/upload-csv/")
-async def upload_csv(file: UploadFile = File(...)):
-    global current_data
-
+async def upload_csv(request: Request, file: UploadFile = File(...)):
     if not file.filename.endswith('.csv'):
         raise HTTPException(status_code=400, detail="Apenas arquivos CSV são aceitos")
 
     try:
-        contents = await file.read()
-        buffer = io.StringIO(contents.decode('utf-8'))
-        current_data = pd.read_csv(buffer)
+        # Arquivo idêntico já processado antes: carregar do cache sem reler o CSV
+        content_hash = await run_stage("hash", hash_file, file.file)
+
+        # Arquivos grandes: modo out-of-core (blocos em disco, nada carregado inteiro)
+        file.file.seek(0, os.SEEK_END)
+        file_size = file.file.tell()
+        file.file.seek(0)
+        if data_cache is not None and file_size >= OUT_OF_CORE_MIN_BYTES:
+            chunks_path = data_cache.chunked_path(content_hash)
+            if not ChunkedDataset.exists(chunks_path):
+                await run_stage(
+                    "parse",
+                    ChunkedDataset.write,
+                    chunks_path,
+                    iter_csv_chunks(file.file, CSV_CHUNK_ROWS, downcast_floats=CSV_DOWNCAST_FLOATS),
+                )
+            chunks = ChunkedDataset(chunks_path)
+            profile = await run_stage("profile", build_profile, content_hash, chunks=chunks)
+            session = await run_stage("store", dataset_store.create, None, content_hash, chunks, profile)
+            head = chunks.head(10)
+            return negotiated_response(request, {
+                "dataset_id": session.dataset_id,
+                "columns": chunks.columns,
+                "data": head.astype(object).values.tolist(),
+                "shape": chunks.shape,
+                "out_of_core": True
+            }, head, ("columns", "data"))
+
+        current_data = None
+        if data_cache is not None:
+            current_data = await run_stage("cache_load", data_cache.load, content_hash)
+
+        if current_data is not None:
+            head = current_data.head(10).astype(object)
+        else:
+            # Ler o arquivo em blocos direto do upload (fora do event loop)
+            current_data, head = await run_stage(
+                "parse",
+                read_csv_chunked,
+                file.file,
+                chunk_rows=CSV_CHUNK_ROWS,
+                downcast_floats=CSV_DOWNCAST_FLOATS,
+            )
+            current_data = await run_stage(
+                "optimize_dtypes",
+                optimize_dtypes,
+                current_data,
+                downcast_floats=CSV_DOWNCAST_FLOATS,
+                category_max_ratio=CATEGORY_MAX_RATIO,
+                arrow_strings=ARROW_STRINGS,
+            )
+        profile = await run_stage("profile", build_profile, content_hash, current_data)
+        session = await run_stage("store", dataset_store.create, current_data, content_hash, None, profile)
 
         preview = {
+            "dataset_id": session.dataset_id,
             "columns": current_data.columns.tolist(),
-            "data": current_data.head(10).values.tolist(),
+            "data": head.values.tolist(),
             "shape": list(current_data.shape)
         }
 
-        return preview
+        return negotiated_response(request, preview, current_data.head(10), ("columns", "data"))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao processar o arquivo: {str(e)}")
 
-# Rota para obter informações básicas sobre os dados
+# Rota para liberar um dataset que não será mais usado
+@app.delete("/datasets/{dataset_id}")
+async def delete_dataset(dataset_id: str):
+    get_session(dataset_id)
+    dataset_store.delete(dataset_id)
+    return {"message": "Dataset removido", "dataset_id": dataset_id}
+
+# Rota para obter informações básicas sobre os dados. Vêm do perfil calculado no
+# upload; o hash do conteúdo serve de ETag, então repetições respondem 304.
 @app.get("/data-info/")
-async def get_data_info():
-    global current_data
+async def get_data_info(request: Request, dataset_id: str = Query(...)):
+    session = get_session(dataset_id)
+    etag = f'"{session.content_hash}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+
+    # Sessões antigas (sem perfil salvo): calcular uma vez e guardar
+    if session.profile is None:
+        session.profile = await run_in_threadpool(
+            build_profile, session.content_hash, session.current_data, session.current_chunks
+        )
+        await run_in_threadpool(dataset_store.put, session)
+
+    info = session.profile.info()
+    if session.out_of_core:
+        info["out_of_core"] = True
+    return FastJSONResponse(content=info, headers=headers)
+
+# Rota para navegar pelas linhas do dataset: paginação, projeção de colunas,
+# ordenação e filtros ("coluna:operador:valor", repetível). A ordenação usa um
+# índice calculado uma vez por coluna, então cada página custa só a fatia pedida.
+@app.get("/rows/")
+async def get_rows(dataset_id: str = Query(...), source: str = Query("current"),
+                   offset: int = Query(0, ge=0), limit: int = Query(100, ge=1, le=ROWS_MAX_LIMIT),
+                   columns: str = Query(None), sort: str = Query(None), descending: bool = Query(False),
+                   filters: List[str] = Query([], alias="filter"), format: str = Query("json")):
+    session = get_session(dataset_id)
+    if source not in ("current", "processed"):
+        raise HTTPException(status_code=400, detail="Fonte inválida: use 'current' ou 'processed'")
+    if format not in ("json", "arrow"):
+        raise HTTPException(status_code=400, detail="Formato inválido: use 'json' ou 'arrow'")
+
+    if session.out_of_core:
+        data = session.current_chunks if source == "current" else session.processed_chunks
+        all_columns = data.columns if data is not None else []
+    else:
+        data = session.current_data if source == "current" else session.processed_data
+        all_columns = data.columns.tolist() if data is not None else []
+    if data is None:
+        raise HTTPException(status_code=404, detail="Nenhum dado processado disponível")
 
-    if current_data is None:
-        raise HTTPException(status_code=404, detail="Nenhum dado foi carregado")
+    selected = columns.split(",") if columns else all_columns
+    for col in selected + ([sort] if sort else []):
+        if col not in all_columns:
+            raise HTTPException(status_code=400, detail=f"Coluna {col} não encontrada nos dados")
+    try:
+        parsed_filters = [parse_filter(spec, all_columns) for spec in filters]
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-    info = {
-        "shape": current_data.shape,
-        "columns": current_data.columns.tolist(),
-        "dtypes": {col: str(current_data[col].dtype) for col in current_data.columns},
-        "missing_values": current_data.isnull().sum().to_dict(),
-        "numeric_columns": current_data.select_dtypes(include=[np.number]).columns.tolist(),
-        "categorical_columns": current_data.select_dtypes(include=['object']).columns.tolist()
+    try:
+        if session.out_of_core:
+            # Blocos em disco: só paginação e projeção (sem índices de ordenação)
+            if sort or parsed_filters:
+                require_in_memory(session)
+            total = data.n_rows
+            page = await run_in_threadpool(data.slice, offset, limit, selected)
+            row_ids = list(range(offset, offset + len(page)))
+        else:
+            data_key = session.content_hash if source == "current" else session.processed_key
+            positions = await run_in_threadpool(
+                row_index_cache.positions, data_key, data, sort, descending, parsed_filters
+            )
+            if positions is None:
+                total = len(data)
+                rows = np.arange(offset, min(offset + limit, total))
+            else:
+                total = len(positions)
+                rows = positions[offset:offset + limit]
+            page = data.iloc[rows, [data.columns.get_loc(col) for col in selected]]
+            row_ids = rows.tolist()
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if format == "arrow":
+        page = page.assign(_row=row_ids)
+        return Response(
+            content=await run_in_threadpool(arrow_ipc, page),
+            media_type="application/vnd.apache.arrow.stream",
+            headers={"X-Total-Count": str(total), "X-Offset": str(offset)},
+        )
+    return {
+        "columns": selected,
+        "data": columnar_json(page),
+        "row_ids": row_ids,
+        "total": total,
+        "offset": offset,
+        "limit": limit
     }
 
-    return info
-
-# Função auxiliar para gerar gráficos como base64
-def plot_to_base64(fig):
-    buf = io.BytesIO()
-    fig.savefig(buf, format='png', bbox_inches='tight')
-    buf.seek(0)
-    img_str = base64.b64encode(buf.read()).decode('utf-8')
-    buf.close()
-    plt.close(fig)
-    return img_str
-
-# Rota para gerar gráficos EDA
+# Rota para gerar gráficos EDA (um gráfico por coluna, renderizados em paralelo)
 @app.get("/generate-eda/")
-async def generate_eda():
-    global current_data
-    
-    if current_data is None:
-        raise HTTPException(status_code=404, detail="Nenhum dado foi carregado")
-    
-    eda_results = {}
-    
-    # 1. Histogramas para colunas numéricas
-    numeric_cols = current_data.select_dtypes(include=[np.number]).columns.tolist()
-    if numeric_cols:
-        fig, axes = plt.subplots(len(numeric_cols), 1, figsize=(10, 4 * len(numeric_cols)))
-        if len(numeric_cols) == 1:
-            axes = [axes]
-        
-        for i, col in enumerate(numeric_cols):
-            sns.histplot(current_data[col].dropna(), ax=axes[i])
-            axes[i].set_title(f'Distribuição de {col}')
-        
-        eda_results["histograms"] = plot_to_base64(fig)
-    
-    # 2. Matriz de correlação
-    if len(numeric_cols) > 1:
-        fig, ax = plt.subplots(figsize=(10, 8))
-        corr_matrix = current_data[numeric_cols].corr()
-        sns.heatmap(corr_matrix, annot=True, cmap='coolwarm', ax=ax)
-        ax.set_title('Matriz de Correlação')
-        
-        eda_results["correlation_matrix"] = plot_to_base64(fig)
-    
-    # 3. Boxplots para detectar outliers
-    if numeric_cols:
-        fig, axes = plt.subplots(len(numeric_cols), 1, figsize=(10, 4 * len(numeric_cols)))
-        if len(numeric_cols) == 1:
-            axes = [axes]
-        
-        for i, col in enumerate(numeric_cols):
-            sns.boxplot(x=current_data[col].dropna(), ax=axes[i])
-            axes[i].set_title(f'Boxplot de {col}')
-        
-        eda_results["boxplots"] = plot_to_base64(fig)
-    
+async def generate_eda(dataset_id: str = Query(...), stream: bool = Query(False),
+                       format: str = Query("png"), bins: int = Query(30, ge=1, le=500),
+                       correlation_sample: int = Query(None, ge=0)):
+    session = get_session(dataset_id)
+    if correlation_sample is None:
+        correlation_sample = CORRELATION_SAMPLE_ROWS
+
+    # Modo somente dados: histogramas, boxplots e correlação como números
+    if format == "data":
+        if session.out_of_core:
+            return await run_in_threadpool(
+                chunked_eda_data, session.current_chunks, bins, 1.5, EDA_SAMPLE_ROWS,
+                CORRELATION_TOP_K, CORRELATION_MAX_COLUMNS
+            )
+        return await run_in_threadpool(
+            compute_eda_data, session.current_data, bins, 1.5, correlation_sample,
+            CORRELATION_TOP_K, CORRELATION_MAX_COLUMNS
+        )
+    if format != "png":
+        raise HTTPException(status_code=400, detail=f"Formato não suportado: {format}")
+
+    # Out-of-core: gráficos desenhados sobre uma amostra das linhas
+    data = session.current_data
+    if session.out_of_core:
+        data = await run_stage("sample", sample_rows, session.current_chunks, EDA_SAMPLE_ROWS)
+    charts = eda_renderer.render(session.content_hash or session.dataset_id, data, correlation_sample)
+
+    # Modo streaming: uma linha JSON por gráfico, enviada assim que fica pronto
+    if stream:
+        async def ndjson():
+            async for chart_type, col, image in charts:
+                yield json.dumps({"chart": chart_type, "column": col, "image": image}) + "\n"
+        return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+    eda_results = {"histograms": {}, "boxplots": {}}
+    async for chart_type, col, image in charts:
+        if chart_type == "histogram":
+            eda_results["histograms"][col] = image
+        elif chart_type == "boxplot":
+            eda_results["boxplots"][col] = image
+        else:
+            eda_results["correlation_matrix"] = image
+
     return eda_results
 
 # Rota para pré-processar os dados
 @app.post("/preprocess/")
-async def preprocess_data(options: PreprocessingOptions):
-    global current_data, processed_data
-
-    if current_data is None:
-        raise HTTPException(status_code=404, detail="Nenhum dado foi carregado")
+async def preprocess_data(request: Request, options: PreprocessingOptions, dataset_id: str = Query(...)):
+    session = get_session(dataset_id)
+    current_data = session.current_data
 
     try:
-        df = current_data.copy()
-        preprocessing_steps = []
-
-        # 1. Remover colunas especificadas
-        if options.drop_columns:
-            existing_cols = [col for col in options.drop_columns if col in df.columns]
-            df = df.drop(columns=existing_cols)
-            preprocessing_steps.append(f"Removidas colunas: {', '.join(existing_cols)}")
-
-        # 2. Tratar valores ausentes
-        na_count_before = df.isnull().sum().sum()
-
-        if options.fill_na_method == "mean":
-            for col in df.select_dtypes(include=[np.number]).columns:
-                df[col] = df[col].fillna(df[col].mean())
-            preprocessing_steps.append("Valores ausentes preenchidos com a média")
-
-        elif options.fill_na_method == "median":
-            for col in df.select_dtypes(include=[np.number]).columns:
-                df[col] = df[col].fillna(df[col].median())
-            preprocessing_steps.append("Valores ausentes preenchidos com a mediana")
-
-        elif options.fill_na_method == "mode":
-            for col in df.columns:
-                df[col] = df[col].fillna(df[col].mode()[0] if not df[col].mode().empty else None)
-            preprocessing_steps.append("Valores ausentes preenchidos com a moda")
-
-        elif options.fill_na_method == "value" and options.fill_na_value is not None:
-            df = df.fillna(options.fill_na_value)
-            preprocessing_steps.append(f"Valores ausentes preenchidos com {options.fill_na_value}")
-
-        elif options.fill_na_method == "drop":
-            df = df.dropna()
-            preprocessing_steps.append("Linhas com valores ausentes foram removidas")
-
-        na_count_after = df.isnull().sum().sum()
-        preprocessing_steps.append(f"Valores ausentes tratados: {int(na_count_before - na_count_after)}")
-
-        # 3. Remover outliers (IQR)
-        if options.remove_outliers:
-            rows_before = len(df)
-            for col in df.select_dtypes(include=[np.number]).columns:
-                Q1 = df[col].quantile(0.25)
-                Q3 = df[col].quantile(0.75)
-                IQR = Q3 - Q1
-                lower_bound = Q1 - options.outlier_threshold * IQR
-                upper_bound = Q3 + options.outlier_threshold * IQR
-                df = df[(df[col] >= lower_bound) & (df[col] <= upper_bound)]
-            rows_after = len(df)
-            preprocessing_steps.append(f"Outliers removidos: {rows_before - rows_after} linhas")
-
-        # 4. Normalização (comentada)
-        # if options.normalize:
-        #     numeric_cols = df.select_dtypes(include=[np.number]).columns
-        #     if not numeric_cols.empty:
-        #         scaler = StandardScaler()
-        #         df[numeric_cols] = scaler.fit_transform(df[numeric_cols])
-        #
-        #         # Salvar o scaler para uso futuro nas previsões
-        #         scaler_path = os.path.join(MODELS_DIR, "scaler.pkl")
-        #         joblib.dump(scaler, scaler_path)
-        #
-        #         preprocessing_steps.append("Dados numéricos normalizados com StandardScaler")
-
-        # 5. Criar colunas de previsão
-        if "close" in df.columns:
-            df["target_class"] = (df["close"].shift(-1) > df["close"]).astype(int)
-            df["target_close"] = df["close"].shift(-1)
-            df = df.dropna(subset=["target_class", "target_close"])
-            preprocessing_steps.append("Criadas colunas 'target_class' e 'target_close' com base no fechamento futuro")
-
-        # Armazenar os dados processados
-        processed_data = df
+        # Chave do resultado (dataset + opções canônicas), usada também como ID do
+        # pipeline ajustado e no cache de resultados
+        columns = session.current_chunks.columns if session.out_of_core else current_data.columns
+        processed_key = hashlib.sha256(
+            f"{session.content_hash}:{canonical_options(options, columns)}".encode()
+        ).hexdigest()
+        cached = processed_cache.get(processed_key)
+
+        # Out-of-core: estatísticas e transformação em streaming, resultado em blocos no disco
+        if session.out_of_core:
+            if cached is not None and ChunkedDataset.exists(cached[0].path):
+                chunks, preprocessing_steps, pipeline = cached
+            else:
+                chunks, preprocessing_steps, pipeline = await run_in_threadpool(
+                    run_chunked_preprocessing, session.current_chunks, options,
+                    data_cache.chunked_path(processed_key), processed_key, EDA_SAMPLE_ROWS
+                )
+                await run_in_threadpool(pipeline.save, MODELS_DIR)
+                processed_cache.put(processed_key, (chunks, preprocessing_steps, pipeline))
+            pipeline_cache[pipeline.pipeline_id] = pipeline
+            session.processed_chunks = chunks
+            session.processed_key = processed_key
+            session.pipeline_id = pipeline.pipeline_id
+            await run_in_threadpool(dataset_store.put, session)
+            head = chunks.head(10)
+            return negotiated_response(request, {
+                "pipeline_id": pipeline.pipeline_id,
+                "columns": chunks.columns,
+                "data": head.values.tolist(),
+                "shape": chunks.shape,
+                "preprocessing_steps": preprocessing_steps
+            }, head, ("columns", "data"))
+
+        # Combinação de opções já usada neste dataset: resultado do cache, sem recalcular
+        if cached is not None:
+            df, preprocessing_steps, pipeline = cached
+        else:
+            df, preprocessing_steps, pipeline = await run_in_threadpool(
+                run_preprocessing, current_data, options, processed_key
+            )
+            # Salvar o pipeline ajustado ao lado dos modelos, para uso em /transform/
+            await run_stage("save_pipeline", pipeline.save, MODELS_DIR)
+            await run_stage("cache_put", processed_cache.put, processed_key,
+                            (df, preprocessing_steps, pipeline), current_data)
+        pipeline_cache[pipeline.pipeline_id] = pipeline
+
+        # Armazenar os dados processados na sessão (chave do cache: dataset + opções)
+        session.processed_data = df
+        session.processed_key = processed_key
+        session.pipeline_id = pipeline.pipeline_id
+        session.indicator_state = pipeline.indicator_state
+        await run_stage("store", dataset_store.put, session)
 
         # Retornar preview
-        return {
+        head = df.head(10)
+        return negotiated_response(request, {
+            "pipeline_id": pipeline.pipeline_id,
             "columns": df.columns.tolist(),
-            "data": df.head(10).values.tolist(),
+            "data": head.values.tolist(),
             "shape": list(df.shape),
             "preprocessing_steps": preprocessing_steps
-        }
+        }, head, ("columns", "data"))
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro no pré-processamento: {str(e)}")
 
 
+# Rota para acrescentar linhas novas ao final do dataset (ex.: candles do dia).
+# Os dados pré-processados são estendidos só na cauda e, se informado, o modelo
+# é atualizado de forma incremental em vez de retreinado.
+@app.post("/append-rows/")
+async def append_dataset_rows(request: AppendRowsRequest, dataset_id: str = Query(...)):
+    session = get_session(dataset_id)
+    require_in_memory(session)
+
+    missing = [col for col in session.current_data.columns if col not in request.columns]
+    if missing:
+        raise HTTPException(status_code=400, detail=f"Colunas ausentes: {', '.join(missing)}")
+    if not request.data:
+        raise HTTPException(status_code=400, detail="Nenhuma linha informada")
+
+    bundle = None
+    if request.model_filename:
+        if session.processed_data is None:
+            raise HTTPException(status_code=404, detail="Nenhum dado processado disponível")
+        bundle = await run_in_threadpool(load_bundle, MODELS_DIR, request.model_filename)
+        if bundle is None:
+            raise HTTPException(status_code=404, detail=f"Modelo {request.model_filename} não encontrado")
+
+    try:
+        new_rows = pd.DataFrame(request.data, columns=request.columns)
+        current_data = await run_in_threadpool(append_rows, session.current_data, new_rows)
+
+        # Novo hash encadeado: conteúdo anterior + linhas acrescentadas
+        rows_hash = hashlib.sha256(request.model_dump_json(include={"columns", "data"}).encode()).hexdigest()
+        content_hash = hashlib.sha256(f"{session.content_hash}:{rows_hash}".encode()).hexdigest()
+
+        processed_data, new_processed_rows = session.processed_data, 0
+        indicator_state = session.indicator_state
+        if processed_data is not None and session.pipeline_id:
+            pipeline = get_pipeline(session.pipeline_id)
+            processed_data, new_processed_rows, indicator_state = await run_in_threadpool(
+                extend_processed, pipeline, processed_data, current_data, indicator_state
+            )
+
+        model_update = None
+        if bundle is not None and new_processed_rows:
+            columns = bundle.features + [bundle.target]
+            missing = [col for col in columns if col not in processed_data.columns]
+            if missing:
+                raise HTTPException(status_code=400, detail=f"Colunas ausentes: {', '.join(missing)}")
+            window = processed_data.iloc[-max(INCREMENTAL_WINDOW, new_processed_rows):]
+            try:
+                model_update = await run_in_threadpool(
+                    update_model, bundle, window[bundle.features], window[bundle.target],
+                    new_processed_rows, MODELS_DIR, FOREST_UPDATE_TREES
+                )
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+
+        # Perfil estendido só com as linhas novas (já com os dtypes finais)
+        profile = session.profile
+        if profile is not None:
+            tail = current_data.iloc[len(current_data) - len(new_rows):]
+            profile = profile.merge(await run_in_threadpool(DatasetProfile.from_frame, tail))
+            profile.memory = await run_in_threadpool(memory_report, current_data)
+
+        session.current_data = current_data
+        session.content_hash = content_hash
+        session.profile = profile
+        if session.processed_data is not None and session.pipeline_id:
+            session.processed_data = processed_data
+            session.indicator_state = indicator_state
+            session.processed_key = hashlib.sha256(f"{content_hash}:{session.pipeline_id}".encode()).hexdigest()
+        await run_in_threadpool(dataset_store.put, session)
+
+        return {
+            "dataset_id": dataset_id,
+            "appended_rows": len(new_rows),
+            "shape": list(current_data.shape),
+            "processed_shape": list(processed_data.shape) if processed_data is not None else None,
+            "new_processed_rows": new_processed_rows,
+            "model_update": model_update
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao acrescentar linhas: {str(e)}")
+
+
+# Rota para aplicar um pipeline já ajustado a novas linhas (sem recalcular estatísticas)
+@app.post("/transform/")
+async def transform_rows(request: TransformRequest):
+    pipeline = get_pipeline(request.pipeline_id)
+
+    try:
+        df = pd.DataFrame(request.data, columns=request.columns)
+        transformed, kept = pipeline.transform(df)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return {
+        "pipeline_id": pipeline.pipeline_id,
+        "columns": transformed.columns.tolist(),
+        # NaN (ex.: linhas de aquecimento dos indicadores) vira null no JSON
+        "data": transformed.astype(object).where(transformed.notna(), None).values.tolist(),
+        "shape": list(transformed.shape),
+        "kept_rows": np.flatnonzero(kept).tolist()
+    }
+
+
+# Previsões como tabela de uma coluna (formatos binários do negotiated_response)
+def predictions_table(predictions):
+    return pd.DataFrame({"prediction": np.asarray(predictions)})
+
+
+# Treino out-of-core: só modelos com partial_fit, em passagens sobre os blocos
+async def predict_out_of_core(http_request: Request, request: PredictionRequest, session, background, predictions_limit):
+    chunks = session.processed_chunks
+    if chunks is None:
+        raise HTTPException(status_code=404, detail="Nenhum dado processado disponível")
+
+    if not request.target_column:
+        request.target_column = "target_close" if request.model_type in ("regression", "sgd_regression") else "target_class"
+    for col in [request.target_column] + request.feature_columns:
+        if col not in chunks.columns:
+            raise HTTPException(status_code=400, detail=f"Coluna {col} não encontrada nos dados")
+    if request.model_type not in ("sgd_regression", "sgd_classification"):
+        raise HTTPException(
+            status_code=400,
+            detail="No modo out-of-core apenas sgd_regression e sgd_classification podem ser treinados"
+        )
+
+    training_kwargs = dict(
+        dataset_path=chunks.path,
+        model_type=request.model_type,
+        feature_columns=request.feature_columns,
+        target_column=request.target_column,
+        models_dir=MODELS_DIR,
+        predictions_limit=PREDICTIONS_PAGE_SIZE if predictions_limit is None else predictions_limit,
+        params=request.params,
+    )
+    try:
+        if background:
+            job = job_queue.submit({"model_type": request.model_type, "dataset_id": session.dataset_id},
+                                   task=run_chunked_training, **training_kwargs)
+            return FastJSONResponse(status_code=202, content=job)
+        result = await run_in_threadpool(run_chunked_training, **training_kwargs)
+        return negotiated_response(http_request, result, predictions_table(result["predictions"]), ("predictions",))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Erro na previsão: {str(e)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro na previsão: {str(e)}")
+
+
 @app.post("/predict/")
-async def predict(request: PredictionRequest):
-    global processed_data
+async def predict(http_request: Request, request: PredictionRequest, dataset_id: str = Query(...),
+                  background: bool = Query(False), predictions_limit: int = Query(None, ge=0)):
+    session = get_session(dataset_id)
+    if session.out_of_core:
+        return await predict_out_of_core(http_request, request, session, background, predictions_limit)
+    processed_data = session.processed_data
 
     if processed_data is None:
         raise HTTPException(status_code=404, detail="Nenhum dado processado disponível")
@@ -285,194 +783,216 @@ async def predict(request: PredictionRequest):
             if col not in processed_data.columns:
                 raise HTTPException(status_code=400, detail=f"Coluna {col} não encontrada nos dados")
 
-        X = processed_data[request.feature_columns]
-        y = processed_data[request.target_column]
-
-        # Escalar X (features)
-        scaler_X = StandardScaler()
-        X_scaled = scaler_X.fit_transform(X)
-
-        # Escalar y se for regressão
-        if request.model_type == "regression":
-            scaler_y = StandardScaler()
-            y_scaled = scaler_y.fit_transform(y.values.reshape(-1, 1)).flatten()
-        else:
-            y_scaled = y  # para classificadores, usa direto
-
-        model = None
-        model_info = {
-            "type": request.model_type,
-            "features": request.feature_columns,
-            "target": request.target_column
-        }
-
-        from sklearn.model_selection import TimeSeriesSplit
-
-        tscv = TimeSeriesSplit(n_splits=5)
-        folds = []
-        y_preds = []
-        y_tests = []
-
-        if request.model_type == "regression":
-            from sklearn.linear_model import LinearRegression
-            from sklearn.metrics import mean_squared_error, mean_absolute_error, r2_score
-
-            for train_idx, test_idx in tscv.split(X_scaled):
-                X_train, X_test = X_scaled[train_idx], X_scaled[test_idx]
-                y_train, y_test = y_scaled[train_idx], y_scaled[test_idx]
-
-                model = LinearRegression()
-                model.fit(X_train, y_train)
-                y_pred = model.predict(X_test)
-
-                y_preds.extend(y_pred)
-                y_tests.extend(y_test)
-
-                folds.append({
-                    "mse": mean_squared_error(y_test, y_pred),
-                    "rmse": np.sqrt(mean_squared_error(y_test, y_pred)),
-                    "mae": mean_absolute_error(y_test, y_pred),
-                    "r2": r2_score(y_test, y_pred)
-                })
-
-            metrics = {
-                "mse": float(np.mean([f["mse"] for f in folds])),
-                "rmse": float(np.mean([f["rmse"] for f in folds])),
-                "mae": float(np.mean([f["mae"] for f in folds])),
-                "r2": float(np.mean([f["r2"] for f in folds])),
-                "folds": folds
-            }
-
-            model_info["coefficients"] = {
-                feature: float(coef) for feature, coef in zip(request.feature_columns, model.coef_)
-            }
-            model_info["intercept"] = float(model.intercept_)
-
-        elif request.model_type == "classification":
-            from sklearn.linear_model import LogisticRegression
-            from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score
-
-            for train_idx, test_idx in tscv.split(X_scaled):
-                X_train, X_test = X_scaled[train_idx], X_scaled[test_idx]
-                y_train, y_test = y.iloc[train_idx], y.iloc[test_idx]
-
-                model = LogisticRegression(max_iter=1000)
-                model.fit(X_train, y_train)
-                y_pred = model.predict(X_test)
-
-                y_preds.extend(y_pred)
-                y_tests.extend(y_test)
-
-                folds.append({
-                    "accuracy": accuracy_score(y_test, y_pred),
-                    "precision": precision_score(y_test, y_pred, average='weighted'),
-                    "recall": recall_score(y_test, y_pred, average='weighted'),
-                    "f1": f1_score(y_test, y_pred, average='weighted')
-                })
-
-            metrics = {
-                "accuracy": float(np.mean([f["accuracy"] for f in folds])),
-                "precision": float(np.mean([f["precision"] for f in folds])),
-                "recall": float(np.mean([f["recall"] for f in folds])),
-                "f1": float(np.mean([f["f1"] for f in folds])),
-                "folds": folds
-            }
-
-            model_info["classes"] = model.classes_.tolist()
-
-        elif request.model_type == "random_forest":
-            from sklearn.ensemble import RandomForestClassifier
-            from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score
-
-            for train_idx, test_idx in tscv.split(X_scaled):
-                X_train, X_test = X_scaled[train_idx], X_scaled[test_idx]
-                y_train, y_test = y.iloc[train_idx], y.iloc[test_idx]
-
-                model = RandomForestClassifier(n_estimators=100, random_state=42)
-                model.fit(X_train, y_train)
-                y_pred = model.predict(X_test)
-
-                y_preds.extend(y_pred)
-                y_tests.extend(y_test)
-
-                folds.append({
-                    "accuracy": accuracy_score(y_test, y_pred),
-                    "precision": precision_score(y_test, y_pred, average='weighted'),
-                    "recall": recall_score(y_test, y_pred, average='weighted'),
-                    "f1": f1_score(y_test, y_pred, average='weighted')
-                })
-
-            metrics = {
-                "accuracy": float(np.mean([f["accuracy"] for f in folds])),
-                "precision": float(np.mean([f["precision"] for f in folds])),
-                "recall": float(np.mean([f["recall"] for f in folds])),
-                "f1": float(np.mean([f["f1"] for f in folds])),
-                "folds": folds
-            }
-
-            model_info["feature_importance"] = {
-                feature: float(importance) for feature, importance in zip(request.feature_columns, model.feature_importances_)
-            }
-            model_info["classes"] = model.classes_.tolist()
-
-        else:
+        if request.model_type not in MODEL_TYPES:
             raise HTTPException(status_code=400, detail=f"Tipo de modelo não suportado: {request.model_type}")
 
-        # Salvar modelo
-        model_filename = f"{request.model_type}_{pd.Timestamp.now().strftime('%Y%m%d_%H%M%S')}.pkl"
-        model_path = os.path.join(MODELS_DIR, model_filename)
-        joblib.dump(model, model_path)
+        X = processed_data[request.feature_columns]
+        y = processed_data[request.target_column]
+        training_kwargs = dict(
+            X=X,
+            y=y,
+            model_type=request.model_type,
+            feature_columns=request.feature_columns,
+            target_column=request.target_column,
+            models_dir=MODELS_DIR,
+            fold_jobs=TRAINING_FOLD_JOBS,
+            estimator_jobs=TRAINING_ESTIMATOR_JOBS,
+            max_threads=TRAINING_THREADS_PER_SLOT,
+            min_rows_parallel=TRAINING_PARALLEL_MIN_ROWS,
+            predictions_limit=PREDICTIONS_PAGE_SIZE if predictions_limit is None else predictions_limit,
+            params=request.params,
+        )
+
+        # Treino em segundo plano: retorna o ID do job para acompanhar em /jobs/{job_id}
+        if background:
+            job = job_queue.submit({"model_type": request.model_type, "dataset_id": dataset_id}, **training_kwargs)
+            return FastJSONResponse(status_code=202, content=job)
+
+        # Treino síncrono, fora do event loop
+        result = await run_in_threadpool(run_in_training_slot, run_training, **training_kwargs)
+        return negotiated_response(http_request, result, predictions_table(result["predictions"]), ("predictions",))
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro na previsão: {str(e)}")
 
-        # Previsão final
-        all_predictions = model.predict(X_scaled)
-        next_prediction_scaled = all_predictions[-1]
 
-        if request.model_type == "regression":
-            try:
-                next_prediction_real = scaler_y.inverse_transform([[next_prediction_scaled]])[0][0]
-            except:
-                next_prediction_real = float(next_prediction_scaled)
-        else:
-            next_prediction_real = float(next_prediction_scaled)
+# Rota para busca de hiperparâmetros (successive halving sobre o TimeSeriesSplit)
+@app.post("/tune/")
+async def tune(request: TuneRequest, dataset_id: str = Query(...), background: bool = Query(False)):
+    session = get_session(dataset_id)
+    require_in_memory(session)
+    processed_data = session.processed_data
 
-        return {
-            "prediction": float(next_prediction_real),
-            "predictions": all_predictions.tolist(),
-            "metrics": metrics,
-            "model_info": model_info,
-            "model_filename": model_filename
-        }
+    if processed_data is None:
+        raise HTTPException(status_code=404, detail="Nenhum dado processado disponível")
+    if request.model_type not in MODEL_TYPES:
+        raise HTTPException(status_code=400, detail=f"Tipo de modelo não suportado: {request.model_type}")
+    for col in [request.target_column] + request.feature_columns:
+        if col not in processed_data.columns:
+            raise HTTPException(status_code=400, detail=f"Coluna {col} não encontrada nos dados")
+    if request.factor < 2 or request.n_splits < 2:
+        raise HTTPException(status_code=400, detail="factor e n_splits devem ser no mínimo 2")
+
+    tuning_kwargs = dict(
+        X=processed_data[request.feature_columns],
+        y=processed_data[request.target_column],
+        model_type=request.model_type,
+        feature_columns=request.feature_columns,
+        target_column=request.target_column,
+        data_key=session.processed_key,
+        cache_dir=TUNING_CACHE_DIR,
+        param_grid=request.param_grid,
+        n_splits=request.n_splits,
+        factor=request.factor,
+        fold_jobs=TRAINING_FOLD_JOBS,
+        max_threads=TRAINING_THREADS_PER_SLOT,
+        min_rows_parallel=TRAINING_PARALLEL_MIN_ROWS,
+    )
 
+    try:
+        if background:
+            job = job_queue.submit({"model_type": request.model_type, "dataset_id": dataset_id, "task": "tune"},
+                                   task=successive_halving, **tuning_kwargs)
+            return FastJSONResponse(status_code=202, content=job)
+        return await run_in_threadpool(run_in_training_slot, successive_halving, **tuning_kwargs)
+    except ValueError as e:
+        # Hiperparâmetros inválidos ou dados insuficientes para os folds
+        raise HTTPException(status_code=400, detail=f"Erro na busca de hiperparâmetros: {str(e)}")
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Erro na previsão: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Erro na busca de hiperparâmetros: {str(e)}")
+
+
+# Rota para paginar as previsões out-of-fold de um treino (JSON ou .npy binário)
+@app.get("/predictions/{model_filename}")
+async def get_predictions(request: Request, model_filename: str, offset: int = Query(0, ge=0),
+                          limit: int = Query(None, ge=0), format: str = Query("json")):
+    if format not in ("json", "npy"):
+        raise HTTPException(status_code=400, detail="Formato inválido: use 'json' ou 'npy'")
+
+    predictions = load_predictions(MODELS_DIR, model_filename)
+    if predictions is None:
+        raise HTTPException(status_code=404, detail=f"Previsões do modelo {model_filename} não encontradas")
+
+    limit = PREDICTIONS_PAGE_SIZE if limit is None else limit
+    page = predictions[offset:offset + limit]
+
+    if format == "npy":
+        buffer = io.BytesIO()
+        np.save(buffer, np.ascontiguousarray(page))
+        return Response(
+            content=buffer.getvalue(),
+            media_type="application/octet-stream",
+            headers={"X-Total-Count": str(len(predictions))}
+        )
+
+    content = {
+        "model_filename": model_filename,
+        "offset": offset,
+        "total": len(predictions),
+        "predictions": page
+    }
+    return negotiated_response(request, content, predictions_table(page), ("predictions",))
+
+
+# Rotas para acompanhar e cancelar treinos em segundo plano
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = job_queue.status(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job não encontrado")
+    return job
+
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    job = job_queue.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job não encontrado")
+    return job
+
+
+# Rota para previsões rápidas com um modelo já treinado (sem retreinar)
+@app.post("/score/")
+async def score(request: ScoreRequest):
+    bundle = await run_in_threadpool(model_cache.get, request.model_filename)
+    if bundle is None:
+        raise HTTPException(status_code=404, detail=f"Modelo {request.model_filename} não encontrado")
+
+    df = pd.DataFrame(request.data, columns=request.columns)
+    kept_rows = list(range(len(df)))
+    if request.pipeline_id:
+        pipeline = get_pipeline(request.pipeline_id)
+        try:
+            df, kept = pipeline.transform(df)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        kept_rows = np.flatnonzero(kept).tolist()
+
+    missing = [col for col in bundle.features if col not in df.columns]
+    if missing:
+        raise HTTPException(status_code=400, detail=f"Colunas ausentes: {', '.join(missing)}")
+
+    # Linhas ainda no aquecimento dos indicadores técnicos não têm como ser previstas
+    if request.pipeline_id and pipeline.indicators:
+        complete = df[bundle.features].notna().all(axis=1).to_numpy()
+        if not complete.all():
+            df = df[complete]
+            kept_rows = [row for row, ok in zip(kept_rows, complete) if ok]
+
+    try:
+        X = df[bundle.features].astype(float)
+        predictions = bundle.predict(X) if len(X) else np.array([])
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Erro na previsão: {str(e)}")
+
+    return {
+        "model_filename": request.model_filename,
+        "model_type": bundle.model_type,
+        "predictions": predictions.tolist(),
+        "kept_rows": kept_rows
+    }
 
 
 # Rota para obter resultados com previsões para download
 @app.get("/download-results/")
-async def download_results():
-    global processed_data, current_data
-    
+async def download_results(dataset_id: str = Query(...), format: str = Query("csv"), gzip: bool = Query(False)):
+    session = get_session(dataset_id)
+    current_data, processed_data = session.current_data, session.processed_data
+    if session.out_of_core:
+        current_data, processed_data = session.current_chunks, session.processed_chunks
+
     if processed_data is None or current_data is None:
         raise HTTPException(status_code=404, detail="Dados não disponíveis para download")
-    
+    if format not in ("csv", "parquet"):
+        raise HTTPException(status_code=400, detail="Formato inválido: use 'csv' ou 'parquet'")
+
     try:
-        # Criar um DataFrame com os dados originais e processados
-        result_df = current_data.copy()
-        
-        # Adicionar colunas processadas (se tiverem o mesmo índice)
-        if len(processed_data) == len(result_df):
-            for col in processed_data.columns:
-                if col not in result_df.columns:
-                    result_df[f"processed_{col}"] = processed_data[col].values
-                elif col in result_df.columns and not processed_data[col].equals(result_df[col]):
-                    result_df[f"processed_{col}"] = processed_data[col].values
-        
-        # Converter para CSV
-        csv_content = result_df.to_csv(index=False)
-        
-        # Retornar o conteúdo CSV como string
-        return {"csv_content": csv_content}
-    
+        # Arquivo gerado em blocos de linhas e enviado à medida que fica pronto
+        if session.out_of_core:
+            # Out-of-core: os blocos processados são lidos do disco um por vez
+            csv_body = iter_csv_frames(processed_data.iter_chunks(), header=True)
+            parquet_body = iter_parquet_frames(processed_data.iter_chunks())
+        else:
+            # Dados originais e colunas processadas (se tiverem as mesmas linhas), sem copiar
+            columns = result_columns(current_data, processed_data)
+            csv_body = iter_csv(columns, DOWNLOAD_CHUNK_ROWS)
+            parquet_body = iter_parquet(columns, DOWNLOAD_CHUNK_ROWS)
+
+        if format == "parquet":
+            body, media_type, filename = parquet_body, "application/vnd.apache.parquet", "ml_data_app_results.parquet"
+        elif gzip:
+            body, media_type, filename = iter_gzip(csv_body), "application/gzip", "ml_data_app_results.csv.gz"
+        else:
+            body, media_type, filename = csv_body, "text/csv", "ml_data_app_results.csv"
+
+        return StreamingResponse(
+            body,
+            media_type=media_type,
+            headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+        )
+
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao preparar resultados para download: {str(e)}")
 
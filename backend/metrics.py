@@ -0,0 +1,269 @@
+import contextvars
+import os
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+# Limites (segundos) dos buckets dos histogramas de duração
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Etapas da requisição em andamento (ver stage() e MetricsMiddleware)
+_current_stages = contextvars.ContextVar("current_stages", default=None)
+
+
+# Cronometra uma etapa nomeada (ex.: "parse", "fill", "fold_0_fit"): tempo de
+# parede e CPU da thread. Fora de uma requisição (jobs, scripts) não faz nada.
+@contextmanager
+def stage(name):
+    stages = _current_stages.get()
+    if stages is None:
+        yield
+        return
+    wall_start, cpu_start = time.perf_counter(), time.thread_time()
+    try:
+        yield
+    finally:
+        stages.append((name, time.perf_counter() - wall_start, time.thread_time() - cpu_start))
+
+
+# Executa func(*args, **kwargs) dentro de stage(name); para run_in_threadpool,
+# assim a CPU medida é a da thread que faz o trabalho
+def timed_call(name, func, *args, **kwargs):
+    with stage(name):
+        return func(*args, **kwargs)
+
+
+# Coleta as etapas de um trecho numa lista própria. Usado em processos de pool
+# (joblib, EDARenderer), onde o contexto da requisição não existe: a lista volta
+# com o resultado e o processo principal a registra com record_stages().
+@contextmanager
+def collect_stages():
+    stages = []
+    token = _current_stages.set(stages)
+    try:
+        yield stages
+    finally:
+        _current_stages.reset(token)
+
+
+def record_stages(stages):
+    current = _current_stages.get()
+    if current is not None:
+        current.extend(stages)
+
+
+class Histogram:
+    def __init__(self, buckets=DURATION_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.count += 1
+        self.sum += value
+
+
+# Métricas agregadas por rota (o template, ex.: /jobs/{job_id}, não a URL) e
+# por etapa, exportadas no formato texto do Prometheus em /metrics
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = defaultdict(int)            # (método, rota, status) -> total
+        self.durations = defaultdict(Histogram)     # (método, rota) -> tempo de parede
+        self.cpu = defaultdict(float)               # (método, rota) -> CPU do processo
+        self.rss_growth = defaultdict(lambda: [0, 0, 0])        # (método, rota) -> [soma, contagem, máximo]
+        self.tracemalloc_peak = defaultdict(lambda: [0, 0, 0])  # (método, rota) -> [soma, contagem, máximo]
+        self.stage_durations = defaultdict(Histogram)  # (rota, etapa) -> tempo de parede
+        self.stage_cpu = defaultdict(float)            # (rota, etapa) -> CPU
+        self.in_progress = 0
+
+    def start(self):
+        with self._lock:
+            self.in_progress += 1
+
+    def finish(self, method, route, status, wall, cpu, rss_growth, tracemalloc_peak, stages):
+        with self._lock:
+            self.in_progress -= 1
+            key = (method, route)
+            self.requests[(method, route, str(status))] += 1
+            self.durations[key].observe(wall)
+            self.cpu[key] += cpu
+            _add_sample(self.rss_growth[key], rss_growth)
+            if tracemalloc_peak is not None:
+                _add_sample(self.tracemalloc_peak[key], tracemalloc_peak)
+            for name, stage_wall, stage_cpu in stages:
+                self.stage_durations[(route, name)].observe(stage_wall)
+                self.stage_cpu[(route, name)] += stage_cpu
+
+    def render(self):
+        lines = []
+        with self._lock:
+            _counter(lines, "http_requests_total", "Requisições por rota e status",
+                     ("method", "route", "status"), self.requests)
+            _histogram(lines, "http_request_duration_seconds", "Tempo de parede por requisição",
+                       ("method", "route"), self.durations)
+            _counter(lines, "http_request_cpu_seconds_total",
+                     "CPU do processo durante as requisições (aproximado com requisições simultâneas)",
+                     ("method", "route"), self.cpu)
+            _sample_summary(lines, "http_request_rss_growth_bytes",
+                            "Aumento do pico de RSS do processo causado pela requisição",
+                            ("method", "route"), self.rss_growth)
+            if self.tracemalloc_peak:
+                _sample_summary(lines, "http_request_tracemalloc_peak_bytes",
+                                "Pico de memória alocada (tracemalloc) acima do início da requisição",
+                                ("method", "route"), self.tracemalloc_peak)
+            _histogram(lines, "stage_duration_seconds", "Tempo de parede por etapa",
+                       ("route", "stage"), self.stage_durations)
+            _counter(lines, "stage_cpu_seconds_total", "CPU da thread (ou do worker) por etapa",
+                     ("route", "stage"), self.stage_cpu)
+            _gauge(lines, "http_requests_in_progress", "Requisições em andamento", self.in_progress)
+        _gauge(lines, "process_resident_memory_bytes", "RSS atual do processo", current_rss())
+        _gauge(lines, "process_peak_resident_memory_bytes", "Pico de RSS do processo", peak_rss())
+        _gauge(lines, "process_cpu_seconds_total", "CPU total do processo", time.process_time())
+        return "\n".join(lines) + "\n"
+
+
+# Middleware ASGI: mede cada requisição (parede, CPU, memória e etapas) até o
+# fim do corpo da resposta, inclusive respostas em streaming. Com debug_header
+# (ou cabeçalho X-Debug-Timing: 1 na requisição) a resposta traz Server-Timing
+# com o que foi medido até o início da resposta.
+class MetricsMiddleware:
+    def __init__(self, app, registry, debug_header=False, trace_memory=False):
+        self.app = app
+        self.registry = registry
+        self.debug_header = debug_header
+        self.trace_memory = trace_memory
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stages = []
+        token = _current_stages.set(stages)
+        status = 500
+        debug = self.debug_header or (b"x-debug-timing", b"1") in scope.get("headers", [])
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        peak_start = peak_rss()
+        traced_start = None
+        if self.trace_memory:
+            # O pico é global: com requisições simultâneas, o valor é aproximado
+            traced_start = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        self.registry.start()
+
+        async def send_with_metrics(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if debug:
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", server_timing(
+                        time.perf_counter() - wall_start, time.process_time() - cpu_start, stages
+                    ).encode()))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        finally:
+            _current_stages.reset(token)
+            route = scope.get("route")
+            tracemalloc_peak = None
+            if traced_start is not None:
+                tracemalloc_peak = max(tracemalloc.get_traced_memory()[1] - traced_start, 0)
+            self.registry.finish(
+                scope["method"],
+                getattr(route, "path", "unmatched"),
+                status,
+                time.perf_counter() - wall_start,
+                time.process_time() - cpu_start,
+                max(peak_rss() - peak_start, 0),
+                tracemalloc_peak,
+                stages,
+            )
+
+
+# Server-Timing: total, CPU e a soma de cada etapa (em ms)
+def server_timing(wall, cpu, stages):
+    totals = {}
+    for name, stage_wall, _ in stages:
+        totals[name] = totals.get(name, 0.0) + stage_wall
+    entries = [f"total;dur={wall * 1000:.1f}", f"cpu;dur={cpu * 1000:.1f}"]
+    entries += [f"{name};dur={value * 1000:.1f}" for name, value in totals.items()]
+    return ", ".join(entries)
+
+
+# RSS atual (Linux: /proc/self/statm; nos outros sistemas, o pico)
+def current_rss():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return peak_rss()
+
+
+def peak_rss():
+    if resource is None:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss vem em KB no Linux e em bytes no macOS
+    return peak if os.uname().sysname == "Darwin" else peak * 1024
+
+
+def _add_sample(sample, value):
+    sample[0] += value
+    sample[1] += 1
+    sample[2] = max(sample[2], value)
+
+
+def _labels(names, values):
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"') for v in values)
+    return ",".join(f'{name}="{value}"' for name, value in zip(names, escaped))
+
+
+def _counter(lines, name, help_text, label_names, values):
+    lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+    for key, value in sorted(values.items()):
+        lines.append(f"{name}{{{_labels(label_names, key)}}} {value:g}")
+
+
+def _gauge(lines, name, help_text, value):
+    lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge", f"{name} {value:g}"]
+
+
+def _histogram(lines, name, help_text, label_names, histograms):
+    lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+    for key, histogram in sorted(histograms.items()):
+        labels = _labels(label_names, key)
+        for bound, count in zip(histogram.buckets, histogram.counts):
+            lines.append(f'{name}_bucket{{{labels},le="{bound:g}"}} {count}')
+        lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+        lines.append(f"{name}_sum{{{labels}}} {histogram.sum:g}")
+        lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+
+
+# Soma, contagem e máximo de amostras de memória (summary sem quantis + gauge)
+def _sample_summary(lines, name, help_text, label_names, samples):
+    lines += [f"# HELP {name} {help_text}", f"# TYPE {name} summary"]
+    for key, (total, count, _) in sorted(samples.items()):
+        labels = _labels(label_names, key)
+        lines.append(f"{name}_sum{{{labels}}} {total:g}")
+        lines.append(f"{name}_count{{{labels}}} {count}")
+    lines += [f"# HELP {name}_max Maior amostra", f"# TYPE {name}_max gauge"]
+    for key, (_, _, maximum) in sorted(samples.items()):
+        lines.append(f"{name}_max{{{_labels(label_names, key)}}} {maximum:g}")
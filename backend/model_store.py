@@ -0,0 +1,118 @@
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+# Modelo salvo em MODELS_DIR junto com seus scalers e metadados de treino
+class ModelBundle:
+    def __init__(self, model, scaler_X, scaler_y, model_type, features, target):
+        self.model = model
+        self.scaler_X = scaler_X
+        self.scaler_y = scaler_y
+        self.model_type = model_type
+        self.features = features
+        self.target = target
+
+    def predict(self, X):
+        predictions = self.model.predict(self.scaler_X.transform(X))
+        if self.scaler_y is not None:
+            predictions = self.scaler_y.inverse_transform(predictions.reshape(-1, 1)).ravel()
+        return predictions
+
+
+def scaler_filename(model_filename):
+    return f"{os.path.splitext(model_filename)[0]}_scaler.pkl"
+
+
+# Salva o modelo (sem compressão, para permitir mmap na carga) e o arquivo de scalers ao lado
+def save_model(models_dir, model_filename, model, scaler_X, scaler_y, model_type, features, target):
+    import joblib
+
+    joblib.dump(model, os.path.join(models_dir, model_filename))
+    joblib.dump(
+        {
+            "scaler_X": scaler_X,
+            "scaler_y": scaler_y,
+            "model_type": model_type,
+            "features": features,
+            "target": target,
+        },
+        os.path.join(models_dir, scaler_filename(model_filename)),
+    )
+
+
+def predictions_filename(model_filename):
+    return f"{os.path.splitext(model_filename)[0]}_predictions.npy"
+
+
+# Previsões out-of-fold do treino em .npy (carregadas com mmap para paginar sem ler tudo)
+def save_predictions(models_dir, model_filename, predictions):
+    np.save(os.path.join(models_dir, predictions_filename(model_filename)), predictions)
+
+
+def load_predictions(models_dir, model_filename):
+    if os.path.basename(model_filename) != model_filename or not model_filename.endswith(".pkl"):
+        return None
+    path = os.path.join(models_dir, predictions_filename(model_filename))
+    if not os.path.exists(path):
+        return None
+    return np.load(path, mmap_mode="r")
+
+
+# Cache LRU de modelos já desserializados, para servir previsões sem recarregar do disco
+class ModelCache:
+    def __init__(self, models_dir, max_models=16):
+        self.models_dir = models_dir
+        self.max_models = max_models
+        self._bundles = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, model_filename):
+        with self._lock:
+            bundle = self._bundles.get(model_filename)
+            if bundle is not None:
+                self._bundles.move_to_end(model_filename)
+                return bundle
+
+        bundle = self._load(model_filename)
+        if bundle is not None:
+            self.put(model_filename, bundle)
+        return bundle
+
+    def put(self, model_filename, bundle):
+        with self._lock:
+            self._bundles[model_filename] = bundle
+            self._bundles.move_to_end(model_filename)
+            while len(self._bundles) > self.max_models:
+                self._bundles.popitem(last=False)
+
+    def _load(self, model_filename):
+        # mmap_mode: arrays NumPy do modelo (ex.: árvores do RandomForest) são mapeados, não copiados
+        return load_bundle(self.models_dir, model_filename, mmap_mode="r")
+
+
+# Carrega modelo e scalers do disco. Sem mmap_mode o modelo pode ser alterado
+# (ex.: atualização incremental), já que os arrays não ficam somente leitura.
+def load_bundle(models_dir, model_filename, mmap_mode=None):
+    # Apenas nomes de arquivo simples dentro de MODELS_DIR
+    if os.path.basename(model_filename) != model_filename or not model_filename.endswith(".pkl"):
+        return None
+    model_path = os.path.join(models_dir, model_filename)
+    meta_path = os.path.join(models_dir, scaler_filename(model_filename))
+    if not os.path.exists(model_path) or not os.path.exists(meta_path):
+        return None
+
+    import joblib
+
+    model = joblib.load(model_path, mmap_mode=mmap_mode)
+    meta = joblib.load(meta_path)
+    return ModelBundle(
+        model,
+        meta["scaler_X"],
+        meta["scaler_y"],
+        meta["model_type"],
+        meta["features"],
+        meta["target"],
+    )
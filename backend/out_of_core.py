@@ -0,0 +1,506 @@
+import json
+import os
+import shutil
+import uuid
+import warnings
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+from correlation import correlation_result
+from indicators import add_indicators, indicator_columns
+from model_store import predictions_filename, save_model
+from preprocessing import PreprocessingPipeline, _to_python, add_targets, first_complete_row, mode_from_counts
+from training import REGRESSION_TYPES, fold_metrics, make_model, new_model_filename
+
+
+# Modo out-of-core: datasets maiores que a memória ficam em disco como blocos
+# Arrow IPC (um arquivo por bloco de linhas) e cada operação é uma passagem em
+# streaming sobre os blocos, com no máximo um bloco em memória por vez.
+class ChunkedDataset:
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+
+    @property
+    def n_rows(self):
+        return self.meta["n_rows"]
+
+    @property
+    def columns(self):
+        return self.meta["columns"]
+
+    @property
+    def dtypes(self):
+        return self.meta["dtypes"]
+
+    @property
+    def shape(self):
+        return [self.n_rows, len(self.columns)]
+
+    def iter_chunks(self, columns=None):
+        for i in range(self.meta["n_chunks"]):
+            table = feather.read_table(_chunk_path(self.path, i), columns=columns, memory_map=True)
+            yield table.to_pandas()
+
+    # Linhas [offset, offset + limit) lidas só dos blocos necessários (memory-map)
+    def slice(self, offset, limit, columns=None):
+        parts = []
+        for i in range(self.meta["n_chunks"]):
+            table = feather.read_table(_chunk_path(self.path, i), columns=columns, memory_map=True)
+            if offset >= table.num_rows:
+                offset -= table.num_rows
+                continue
+            part = table.slice(offset, limit)
+            parts.append(part)
+            limit -= part.num_rows
+            offset = 0
+            if limit <= 0:
+                break
+        if not parts:
+            return pd.DataFrame(columns=columns or self.columns)
+        # Cada bloco tem o próprio dicionário nas colunas categóricas (e pode ter
+        # tipos diferentes, ex.: inteiros com ausentes só em alguns blocos)
+        schema = _common_schema([part.schema for part in parts])
+        table = pa.concat_tables([part.cast(schema) for part in parts]).unify_dictionaries()
+        return table.to_pandas()
+
+    def head(self, n=10):
+        for chunk in self.iter_chunks():
+            return chunk.head(n)
+        return pd.DataFrame(columns=self.columns)
+
+    @staticmethod
+    def exists(path):
+        return os.path.exists(os.path.join(path, "meta.json"))
+
+    # Grava os blocos em um diretório temporário e renomeia no final, para que
+    # nenhum leitor veja um dataset incompleto. Os tipos registrados vêm do
+    # schema unificado de todos os blocos (ex.: inteiros com ausentes só nos
+    # blocos seguintes viram float64, como na leitura inteira).
+    @classmethod
+    def write(cls, path, chunks):
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        os.makedirs(tmp_path)
+        meta = {"n_rows": 0, "n_chunks": 0, "columns": None, "dtypes": None}
+        schema = None
+        try:
+            for chunk in chunks:
+                if meta["columns"] is None:
+                    meta["columns"] = chunk.columns.tolist()
+                    meta["dtypes"] = {col: str(chunk[col].dtype) for col in chunk.columns}
+                if chunk.empty:
+                    continue
+                table = pa.Table.from_pandas(chunk.reset_index(drop=True))
+                feather.write_feather(table, _chunk_path(tmp_path, meta["n_chunks"]), compression="uncompressed")
+                schema = table.schema if schema is None else _common_schema([schema, table.schema])
+                meta["n_rows"] += len(chunk)
+                meta["n_chunks"] += 1
+            if meta["columns"] is None:
+                raise ValueError("Arquivo CSV vazio")
+            if schema is not None:
+                dtypes = schema.empty_table().to_pandas().dtypes
+                meta["dtypes"] = {col: str(dtypes[col]) for col in meta["columns"]}
+            with open(os.path.join(tmp_path, "meta.json"), "w") as f:
+                json.dump(meta, f)
+            if os.path.exists(path):
+                shutil.rmtree(path, ignore_errors=True)
+            os.replace(tmp_path, path)
+        finally:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+        return cls(path)
+
+
+def _chunk_path(path, i):
+    return os.path.join(path, f"part-{i:05d}.arrow")
+
+
+# Schema comum aos blocos, com promoção dos tipos (ex.: int64 -> double). Se uma
+# coluna for categórica em alguns blocos e texto em outros, as categóricas
+# passam a texto.
+def _common_schema(schemas):
+    try:
+        return pa.unify_schemas(schemas, promote_options="permissive")
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        decoded = [
+            pa.schema(
+                [field.with_type(field.type.value_type) if pa.types.is_dictionary(field.type) else field
+                 for field in schema],
+                metadata=schema.metadata,
+            )
+            for schema in schemas
+        ]
+        return pa.unify_schemas(decoded, promote_options="permissive")
+
+
+def _numeric_columns(ds, columns=None):
+    columns = ds.columns if columns is None else columns
+    return [col for col in columns if _is_numeric(ds.dtypes[col])]
+
+
+def _is_numeric(dtype):
+    if dtype in ("category", "object", "bool"):
+        return False
+    try:
+        return pd.api.types.is_numeric_dtype(np.dtype(dtype))
+    except TypeError:
+        return False
+
+
+# Amostra de linhas (Bernoulli com probabilidade fixa, reprodutível) de todos os blocos
+def sample_rows(ds, n_rows, columns=None, seed=0):
+    rng = np.random.default_rng(seed)
+    fraction = min(1.0, n_rows / max(ds.n_rows, 1))
+    parts = []
+    for chunk in ds.iter_chunks(columns):
+        if fraction < 1.0:
+            chunk = chunk[rng.random(len(chunk)) < fraction]
+        parts.append(chunk)
+    return pd.concat(parts, ignore_index=True) if parts else ds.head(0)
+
+
+# Mesmo formato de compute_eda_data, em duas passagens: (1) mínimo, máximo e
+# uma amostra para os quartis (aproximados); (2) histogramas, bigodes, outliers
+# e somas para a correlação, com os limites já conhecidos (exatos).
+def chunked_eda_data(ds, bins=30, whisker=1.5, sample_size=200_000,
+                     correlation_top_k=20, correlation_max_columns=100):
+    cols = _numeric_columns(ds)
+    if not cols:
+        return {"format": "data", "histograms": {}, "boxplots": {}}
+    n_cols = len(cols)
+
+    mins = np.full(n_cols, np.inf)
+    maxs = np.full(n_cols, -np.inf)
+    counts = np.zeros(n_cols, dtype=np.int64)
+    rng = np.random.default_rng(0)
+    fraction = min(1.0, sample_size / max(ds.n_rows, 1))
+    sample = []
+
+    for chunk in ds.iter_chunks(cols):
+        arr = chunk.to_numpy(dtype=np.float64, na_value=np.nan)
+        valid = ~np.isnan(arr)
+        counts += valid.sum(axis=0)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", category=RuntimeWarning)
+            mins = np.fmin(mins, np.nanmin(arr, axis=0))
+            maxs = np.fmax(maxs, np.nanmax(arr, axis=0))
+        sample.append(arr[rng.random(len(arr)) < fraction])
+
+    keep = counts > 0
+    cols = [col for col, k in zip(cols, keep) if k]
+    if not cols:
+        return {"format": "data", "histograms": {}, "boxplots": {}}
+    mins, maxs = mins[keep], maxs[keep]
+    sample = np.concatenate(sample)[:, keep]
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        q1, median, q3 = np.nanquantile(sample, [0.25, 0.5, 0.75], axis=0)
+    n_cols = len(cols)
+
+    span = np.where(maxs > mins, maxs - mins, 1.0)
+    iqr = q3 - q1
+    lower, upper = q1 - whisker * iqr, q3 + whisker * iqr
+    hist = np.zeros((n_cols, bins), dtype=np.int64)
+    whisker_low = np.full(n_cols, np.inf)
+    whisker_high = np.full(n_cols, -np.inf)
+    outliers = np.zeros(n_cols, dtype=np.int64)
+    sums = np.zeros(n_cols)
+    gram = np.zeros((n_cols, n_cols))
+    n_complete = 0
+
+    for chunk in ds.iter_chunks(cols):
+        arr = chunk.to_numpy(dtype=np.float64, na_value=np.nan)
+        valid = ~np.isnan(arr)
+        bin_idx = np.clip(np.floor((arr - mins) / span * bins), 0, bins - 1)
+        flat_idx = (bin_idx + np.arange(n_cols) * bins)[valid].astype(np.int64)
+        hist += np.bincount(flat_idx, minlength=n_cols * bins).reshape(n_cols, bins)
+        inside = valid & (arr >= lower) & (arr <= upper)
+        whisker_low = np.fmin(whisker_low, np.where(inside, arr, np.inf).min(axis=0))
+        whisker_high = np.fmax(whisker_high, np.where(inside, arr, -np.inf).max(axis=0))
+        outliers += (valid & ~inside).sum(axis=0)
+        # Correlação sobre as linhas completas: somas e produto X^T X acumulados
+        complete = arr[valid.all(axis=1)]
+        n_complete += len(complete)
+        sums += complete.sum(axis=0)
+        gram += complete.T @ complete
+
+    edges = mins[:, None] + span[:, None] * np.linspace(0, 1, bins + 1)
+    histograms = {}
+    boxplots = {}
+    for i, col in enumerate(cols):
+        histograms[col] = {"counts": hist[i].tolist(), "edges": edges[i].tolist()}
+        boxplots[col] = {
+            "min": float(mins[i]),
+            "q1": float(q1[i]),
+            "median": float(median[i]),
+            "q3": float(q3[i]),
+            "max": float(maxs[i]),
+            "whisker_low": float(whisker_low[i]) if np.isfinite(whisker_low[i]) else None,
+            "whisker_high": float(whisker_high[i]) if np.isfinite(whisker_high[i]) else None,
+            "outliers": int(outliers[i]),
+        }
+
+    result = {
+        "format": "data",
+        "histograms": histograms,
+        "boxplots": boxplots,
+        "approximate_quantiles": True,
+        "sample_rows": int(len(sample)),
+    }
+
+    if n_cols > 1 and n_complete > 1:
+        cov = (gram - np.outer(sums, sums) / n_complete) / (n_complete - 1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            std = np.sqrt(np.diag(cov))
+            corr = cov / np.outer(std, std)
+        result.update(correlation_result(
+            corr, cols, n_complete, top_k=correlation_top_k, max_matrix_columns=correlation_max_columns
+        ))
+
+    return result
+
+
+# Pré-processamento em streaming. Uma passagem calcula as estatísticas
+# (médias exatas, moda exata nas colunas com até mode_max_distinct valores
+# distintos, medianas, limites IQR e moda das demais a partir de uma amostra);
+# a segunda aplica o pipeline ajustado bloco a bloco, continua os indicadores
+# de um bloco para o outro e carrega a última linha para calcular o alvo do
+# bloco seguinte. Grava o resultado em out_path como outro ChunkedDataset.
+def run_chunked_preprocessing(ds, options, out_path, pipeline_id=None, sample_size=200_000,
+                              mode_max_distinct=10_000):
+    preprocessing_steps = []
+    pipeline = PreprocessingPipeline(pipeline_id)
+
+    columns = list(ds.columns)
+    if options.drop_columns:
+        existing_cols = [col for col in options.drop_columns if col in columns]
+        columns = [col for col in columns if col not in existing_cols]
+        preprocessing_steps.append(f"Removidas colunas: {', '.join(existing_cols)}")
+    numeric_cols = _numeric_columns(ds, columns)
+
+    pipeline.input_columns = columns
+    pipeline.numeric_columns = numeric_cols
+    pipeline.fill_na_method = options.fill_na_method
+
+    # 1. Passagem de estatísticas
+    na_counts = pd.Series(0, index=columns, dtype=np.int64)
+    sums = pd.Series(0.0, index=numeric_cols)
+    value_counts = {col: pd.Series(dtype=np.int64) for col in columns} if options.fill_na_method == "mode" else None
+    for chunk in ds.iter_chunks(columns):
+        na_counts += chunk.isnull().sum()
+        if numeric_cols:
+            sums += chunk[numeric_cols].sum()
+        if value_counts:
+            for col in list(value_counts):
+                counts = value_counts[col].add(chunk[col].value_counts(), fill_value=0)
+                # Alta cardinalidade (ex.: floats contínuos): a contagem cresceria com o
+                # número de linhas; a coluna passa a usar a moda da amostra
+                if len(counts) > mode_max_distinct:
+                    del value_counts[col]
+                else:
+                    value_counts[col] = counts
+    sample = sample_rows(ds, sample_size, columns)
+    valid_counts = ds.n_rows - na_counts
+
+    stats = {}
+    if options.fill_na_method == "mean":
+        stats = (sums / valid_counts[numeric_cols]).to_dict()
+        preprocessing_steps.append("Valores ausentes preenchidos com a média")
+    elif options.fill_na_method == "median":
+        stats = sample[numeric_cols].median().to_dict() if numeric_cols else {}
+        preprocessing_steps.append("Valores ausentes preenchidos com a mediana (aproximada por amostra)")
+    elif options.fill_na_method == "mode":
+        for col in columns:
+            if col in value_counts:
+                value = mode_from_counts(value_counts[col])
+                if value is not None:
+                    stats[col] = value
+            else:
+                modes = sample[col].mode()
+                if len(modes):
+                    stats[col] = modes.iloc[0]
+        sampled = [col for col in columns if col not in value_counts]
+        if sampled:
+            preprocessing_steps.append(
+                f"Valores ausentes preenchidos com a moda (aproximada por amostra em: {', '.join(sampled)})"
+            )
+        else:
+            preprocessing_steps.append("Valores ausentes preenchidos com a moda")
+    elif options.fill_na_method == "value" and options.fill_na_value is not None:
+        stats = {col: options.fill_na_value for col in columns}
+        preprocessing_steps.append(f"Valores ausentes preenchidos com {options.fill_na_value}")
+    elif options.fill_na_method == "drop":
+        preprocessing_steps.append("Linhas com valores ausentes foram removidas")
+
+    pipeline.fill_values = {col: _to_python(value) for col, value in stats.items() if not pd.isna(value)}
+    na_count_before = int(na_counts.sum())
+    na_count_after = 0
+    if options.fill_na_method != "drop":
+        na_count_after = int(sum(n for col, n in na_counts.items() if n and col not in pipeline.fill_values))
+    preprocessing_steps.append(f"Valores ausentes tratados: {na_count_before - na_count_after}")
+
+    # 2. Limites de outliers (IQR) a partir da amostra já preenchida
+    if options.remove_outliers and numeric_cols:
+        filled, _ = pipeline.transform(sample, indicators=False)
+        quantiles = filled[numeric_cols].quantile([0.25, 0.75])
+        q1, q3 = quantiles.iloc[0], quantiles.iloc[1]
+        iqr = q3 - q1
+        pipeline.lower_bounds = {col: float(v) for col, v in (q1 - options.outlier_threshold * iqr).items()}
+        pipeline.upper_bounds = {col: float(v) for col, v in (q3 + options.outlier_threshold * iqr).items()}
+    del sample
+
+    pipeline.indicators = list(getattr(options, "indicators", []) or [])
+    counters = {"rows_in": 0, "rows_filtered": 0, "warmup": 0}
+
+    # 3. Passagem de transformação
+    def processed_chunks():
+        state = None
+        warmed = not pipeline.indicators
+        carry = None
+        for chunk in ds.iter_chunks(columns):
+            counters["rows_in"] += len(chunk)
+            out, _ = pipeline.transform(chunk, indicators=False)
+            counters["rows_filtered"] += len(out)
+            out = out.reset_index(drop=True)
+            if pipeline.indicators:
+                out, state = add_indicators(out, pipeline.indicators, state)
+                if not warmed:
+                    start = first_complete_row(out, indicator_columns(pipeline.indicators))
+                    counters["warmup"] += start
+                    out = out.iloc[start:]
+                    warmed = len(out) > 0
+            if "close" in out.columns:
+                if carry is not None:
+                    out = pd.concat([carry, out], ignore_index=True)
+                if out.empty:
+                    continue
+                carry = out.iloc[-1:]
+                out = add_targets(out.copy())
+            yield out
+
+    result = ChunkedDataset.write(out_path, processed_chunks())
+
+    if options.remove_outliers and numeric_cols:
+        preprocessing_steps.append(
+            f"Linhas removidas por valores ausentes ou outliers: {counters['rows_in'] - counters['rows_filtered']} "
+            "(limites IQR estimados por amostra)"
+        )
+    if pipeline.indicators:
+        preprocessing_steps.append(
+            f"Indicadores técnicos calculados: {', '.join(pipeline.indicators)} "
+            f"({counters['warmup']} linhas iniciais de aquecimento removidas)"
+        )
+    if "close" in columns:
+        preprocessing_steps.append("Criadas colunas 'target_class' e 'target_close' com base no fechamento futuro")
+
+    return result, preprocessing_steps, pipeline
+
+
+# Treino em streaming para modelos com partial_fit (SGD). Uma passagem ajusta os
+# scalers (partial_fit) e a segunda faz validação progressiva: cada bloco é
+# primeiro previsto pelo modelo treinado nos blocos anteriores (métricas e
+# previsões out-of-sample) e só depois usado no partial_fit.
+def run_chunked_training(dataset_path, model_type, feature_columns, target_column, models_dir,
+                         progress=None, predictions_limit=None, params=None):
+    from sklearn.preprocessing import StandardScaler
+
+    ds = ChunkedDataset(dataset_path)
+    model = make_model(model_type, params=params)
+    if not hasattr(model, "partial_fit"):
+        raise ValueError(
+            f"Modelo {model_type} não suporta treino out-of-core; use sgd_regression ou sgd_classification"
+        )
+    if ds.meta["n_chunks"] < 2:
+        raise ValueError("São necessários ao menos dois blocos de dados para a validação progressiva")
+    is_regression = model_type in REGRESSION_TYPES
+    columns = feature_columns + [target_column]
+
+    # 1. Scalers e classes
+    scaler_X = StandardScaler()
+    scaler_y = StandardScaler() if is_regression else None
+    classes = set()
+    for chunk in ds.iter_chunks(columns):
+        scaler_X.partial_fit(chunk[feature_columns])
+        y = chunk[target_column].to_numpy()
+        if is_regression:
+            scaler_y.partial_fit(y.reshape(-1, 1))
+        else:
+            classes.update(np.unique(y).tolist())
+    classes = np.array(sorted(classes)) if not is_regression else None
+
+    # 2. Validação progressiva e treino
+    model_filename = new_model_filename(model_type)
+    n_chunks = ds.meta["n_chunks"]
+    predictions = None
+    start = offset = 0
+    folds = []
+    last_X = None
+    for i, chunk in enumerate(ds.iter_chunks(columns)):
+        X = scaler_X.transform(chunk[feature_columns])
+        y = chunk[target_column].to_numpy()
+        if is_regression:
+            y = scaler_y.transform(y.reshape(-1, 1)).ravel()
+
+        if i == 0:
+            start = len(chunk)
+            predictions = np.lib.format.open_memmap(
+                os.path.join(models_dir, predictions_filename(model_filename)),
+                mode="w+", dtype=np.float64, shape=(max(ds.n_rows - start, 0),),
+            )
+        else:
+            y_pred = model.predict(X)
+            folds.append(fold_metrics(model_type, y, y_pred))
+            if is_regression:
+                y_pred = scaler_y.inverse_transform(y_pred.reshape(-1, 1)).ravel()
+            predictions[offset:offset + len(y_pred)] = y_pred
+            offset += len(y_pred)
+
+        if is_regression:
+            model.partial_fit(X, y)
+        else:
+            model.partial_fit(X, y, classes=classes)
+        last_X = X[-1:]
+        if progress is not None:
+            progress(i + 1, n_chunks, folds[-1] if folds else {})
+
+    metrics = {name: float(np.mean([f[name] for f in folds])) for name in folds[0]}
+    metrics["folds"] = folds
+    model_info = {
+        "type": model_type,
+        "features": feature_columns,
+        "target": target_column,
+        "params": params or {},
+        "evaluation": "prequential",
+    }
+    if is_regression:
+        model_info["coefficients"] = {
+            feature: float(coef) for feature, coef in zip(feature_columns, model.coef_)
+        }
+        model_info["intercept"] = float(np.ravel(model.intercept_)[0])
+    else:
+        model_info["classes"] = model.classes_.tolist()
+
+    save_model(models_dir, model_filename, model, scaler_X, scaler_y, model_type, feature_columns, target_column)
+    predictions.flush()
+
+    # Previsão do modelo final para a última linha
+    next_prediction = model.predict(last_X)
+    if is_regression:
+        next_prediction = scaler_y.inverse_transform(next_prediction.reshape(-1, 1)).ravel()
+    page = predictions if predictions_limit is None else predictions[:predictions_limit]
+
+    return {
+        "prediction": float(next_prediction[0]),
+        "predictions": np.asarray(page).tolist(),
+        "predictions_info": {
+            "start_row": start,
+            "total": len(predictions),
+            "returned": len(page)
+        },
+        "metrics": metrics,
+        "model_info": model_info,
+        "model_filename": model_filename
+    }
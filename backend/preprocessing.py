@@ -0,0 +1,438 @@
+import json
+import os
+import threading
+import weakref
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from indicators import add_indicators, indicator_columns
+from ingest import unshared_memory
+from metrics import stage
+
+
+# Pipeline de pré-processamento ajustado: guarda as estatísticas calculadas no
+# /preprocess/ (valores de preenchimento e limites de outliers) para reaplicá-las
+# em novos dados sem recalcular nada.
+class PreprocessingPipeline:
+    def __init__(self, pipeline_id=None):
+        self.pipeline_id = pipeline_id
+        self.input_columns = []
+        self.numeric_columns = []
+        self.fill_na_method = None
+        self.fill_values = {}
+        self.lower_bounds = {}
+        self.upper_bounds = {}
+        # Indicadores técnicos (ex.: "sma_20", "rsi_14") e o estado deles ao fim dos
+        # dados usados no ajuste, de onde o /append-rows/ continua o cálculo
+        self.indicators = []
+        self.indicator_state = None
+
+    # Aplica o pipeline a novas linhas. Retorna o DataFrame transformado e a
+    # máscara das linhas mantidas (linhas com NaN no modo 'drop' ou outliers saem).
+    # Os indicadores são calculados do zero sobre as linhas recebidas, a menos que
+    # indicators=False (o /append-rows/ os continua a partir do estado salvo).
+    def transform(self, df, indicators=True):
+        missing = [col for col in self.input_columns if col not in df.columns]
+        if missing:
+            raise ValueError(f"Colunas ausentes: {', '.join(missing)}")
+
+        data = {}
+        for col in self.input_columns:
+            series = df[col]
+            if col in self.numeric_columns and series.dtype == object:
+                series = pd.to_numeric(series, errors="coerce")
+            if col in self.fill_values:
+                value = self.fill_values[col]
+                # Categorias de cada bloco (out-of-core) ou de novas linhas podem não
+                # incluir o valor de preenchimento
+                if isinstance(series.dtype, pd.CategoricalDtype) and value not in series.cat.categories:
+                    series = series.cat.add_categories([value])
+                series = series.fillna(value)
+            data[col] = series
+        out = pd.DataFrame(data, index=df.index, copy=False)
+
+        mask = np.ones(len(out), dtype=bool)
+        if self.fill_na_method == "drop":
+            mask &= out.notna().all(axis=1).to_numpy()
+        if self.lower_bounds:
+            mask &= bounds_mask(out, self.lower_bounds, self.upper_bounds)
+
+        if not mask.all():
+            out = out.take(np.flatnonzero(mask))
+        if indicators and self.indicators:
+            out, _ = add_indicators(out, self.indicators)
+        return out, mask
+
+    def to_dict(self):
+        return {
+            "pipeline_id": self.pipeline_id,
+            "input_columns": self.input_columns,
+            "fill_na_method": self.fill_na_method,
+            "fill_values": self.fill_values,
+            "lower_bounds": self.lower_bounds,
+            "upper_bounds": self.upper_bounds,
+            "indicators": self.indicators,
+        }
+
+    # Persistência ao lado dos modelos em MODELS_DIR
+    def save(self, models_dir):
+        import joblib
+
+        joblib.dump(self, pipeline_path(models_dir, self.pipeline_id))
+
+    @staticmethod
+    def load(models_dir, pipeline_id):
+        path = pipeline_path(models_dir, pipeline_id)
+        if not os.path.exists(path):
+            return None
+        import joblib
+
+        return joblib.load(path)
+
+
+def pipeline_path(models_dir, pipeline_id):
+    # IDs são hashes hexadecimais; qualquer outro valor é rejeitado
+    if not pipeline_id or not all(c in "0123456789abcdef" for c in pipeline_id):
+        raise KeyError(pipeline_id)
+    return os.path.join(models_dir, f"pipeline_{pipeline_id}.pkl")
+
+
+# Opções em forma canônica, para a chave do resultado: só o que altera o
+# resultado entra (fill_na_value só com "value", outlier_threshold só com
+# remove_outliers, drop_columns sem ordem e só as existentes; normalize não é
+# usado pelo pipeline). A ordem dos indicadores define a ordem das colunas e fica.
+def canonical_options(options, columns):
+    return json.dumps({
+        "drop_columns": sorted(set(options.drop_columns) & set(columns)),
+        "fill_na_method": options.fill_na_method,
+        "fill_na_value": options.fill_na_value if options.fill_na_method == "value" else None,
+        "remove_outliers": options.remove_outliers,
+        "outlier_threshold": options.outlier_threshold if options.remove_outliers else None,
+        "indicators": list(options.indicators),
+    }, sort_keys=True)
+
+
+# Resultados do /preprocess/ (dados, passos e pipeline) por chave (hash do
+# dataset + opções canônicas), em LRU limitado por bytes: voltar a uma
+# combinação de opções já usada não recalcula nada. As colunas que o
+# pré-processamento não altera são as do DataFrame original (sem cópia), então
+# só os bytes próprios de cada resultado contam para o limite enquanto o
+# original estiver em memória no DatasetStore; quando ele sai de lá,
+# release_base() passa a contar o resultado inteiro. Resultados out-of-core
+# (blocos em disco) não ocupam memória.
+class ProcessedCache:
+    def __init__(self, max_bytes=512 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._sizes = {}
+        # DataFrame original de cada resultado (referência fraca, só para identificá-lo)
+        self._bases = {}
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            result = self._entries.get(key)
+            if result is not None:
+                self._entries.move_to_end(key)
+            return result
+
+    def put(self, key, result, base=None):
+        df = result[0]
+        # Tamanho calculado fora do lock (memory_usage(deep=True) pode ser lento)
+        size = unshared_memory(df, base) if isinstance(df, pd.DataFrame) else 0
+        with self._lock:
+            if key in self._entries:
+                self._discard(key)
+            self._entries[key] = result
+            self._sizes[key] = size
+            self._total_bytes += size
+            if size and base is not None:
+                self._bases[key] = weakref.ref(base)
+            self._evict()
+        # Originais já coletados sem passar por release_base também deixam de dividir colunas
+        self._recharge(lambda ref: ref() is None)
+
+    # O DataFrame original saiu da memória do DatasetStore: as colunas que os
+    # resultados derivados dele compartilhavam agora só existem no cache
+    def release_base(self, base):
+        self._recharge(lambda ref: ref() is base or ref() is None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+            self._bases.clear()
+            self._total_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "results": len(self._entries),
+                "memory_bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+    # Funções auxiliares (_discard e _evict são chamadas com o lock adquirido)
+    def _discard(self, key):
+        del self._entries[key]
+        self._bases.pop(key, None)
+        self._total_bytes -= self._sizes.pop(key)
+
+    def _evict(self):
+        # Sempre manter ao menos o resultado mais recente
+        while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+            self._discard(next(iter(self._entries)))
+
+    # Passa a contar inteiros os resultados cujo original satisfaz released(ref)
+    def _recharge(self, released):
+        with self._lock:
+            entries = [(key, ref, self._entries[key][0]) for key, ref in self._bases.items() if released(ref)]
+        if not entries:
+            return
+        sizes = [(key, ref, unshared_memory(df)) for key, ref, df in entries]
+        with self._lock:
+            for key, ref, size in sizes:
+                # Resultado substituído ou despejado enquanto o tamanho era calculado
+                if self._bases.get(key) is not ref:
+                    continue
+                del self._bases[key]
+                self._total_bytes += size - self._sizes[key]
+                self._sizes[key] = size
+            self._evict()
+
+
+# Motor de pré-processamento vetorizado.
+# As estatísticas de todas as colunas são calculadas de uma vez, colunas sem
+# valores ausentes são reaproveitadas sem cópia e a remoção de linhas (NaN e
+# outliers) é feita com uma única máscara combinada. Retorna também o pipeline
+# ajustado, que reaplica as mesmas estatísticas em novos dados.
+def run_preprocessing(current_data, options, pipeline_id=None):
+    preprocessing_steps = []
+    pipeline = PreprocessingPipeline(pipeline_id)
+
+    # 1. Remover colunas especificadas (apenas seleção, sem copiar os dados)
+    columns = list(current_data.columns)
+    if options.drop_columns:
+        existing_cols = [col for col in options.drop_columns if col in columns]
+        columns = [col for col in columns if col not in existing_cols]
+        preprocessing_steps.append(f"Removidas colunas: {', '.join(existing_cols)}")
+
+    # 2. Tratar valores ausentes (estatísticas calculadas sobre o bloco original, sem cópia)
+    with stage("fill"):
+        na_counts = current_data.isnull().sum()[columns]
+        na_count_before = int(na_counts.sum())
+        na_cols = na_counts.index[na_counts > 0]
+        numeric_cols = numeric_columns(current_data, columns)
+        row_mask = None
+
+        pipeline.input_columns = columns
+        pipeline.numeric_columns = numeric_cols.tolist()
+        pipeline.fill_na_method = options.fill_na_method
+
+        # Estatísticas de todas as colunas (o pipeline precisa delas para dados novos)
+        stats = {}
+        if options.fill_na_method == "mean":
+            if len(numeric_cols):
+                stats = current_data.mean(numeric_only=True)[numeric_cols].to_dict()
+            preprocessing_steps.append("Valores ausentes preenchidos com a média")
+
+        elif options.fill_na_method == "median":
+            if len(numeric_cols):
+                stats = current_data.median(numeric_only=True)[numeric_cols].to_dict()
+            preprocessing_steps.append("Valores ausentes preenchidos com a mediana")
+
+        elif options.fill_na_method == "mode":
+            # Só a primeira moda de cada coluna (DataFrame.mode() montaria a tabela
+            # com todas, do tamanho do número de valores distintos)
+            for col in columns:
+                value = mode_from_counts(current_data[col].value_counts())
+                if value is not None:
+                    stats[col] = value
+            preprocessing_steps.append("Valores ausentes preenchidos com a moda")
+
+        elif options.fill_na_method == "value" and options.fill_na_value is not None:
+            stats = {col: options.fill_na_value for col in columns}
+            preprocessing_steps.append(f"Valores ausentes preenchidos com {options.fill_na_value}")
+
+        elif options.fill_na_method == "drop":
+            row_mask = current_data[list(na_cols)].notna().all(axis=1).to_numpy() if len(na_cols) else None
+            preprocessing_steps.append("Linhas com valores ausentes foram removidas")
+
+        # Colunas cujo valor de preenchimento é NaN (ex.: coluna toda vazia) continuam com NaN
+        pipeline.fill_values = {col: _to_python(value) for col, value in stats.items() if not pd.isna(value)}
+        fill_values = {col: pipeline.fill_values[col] for col in na_cols if col in pipeline.fill_values}
+        df = _fill_columns(current_data, columns, fill_values)
+
+        na_count_after = 0
+        if options.fill_na_method != "drop":
+            na_count_after = int(sum(na_counts[col] for col in na_cols if col not in fill_values))
+        preprocessing_steps.append(f"Valores ausentes tratados: {na_count_before - na_count_after}")
+
+    # 3. Remover outliers (IQR): limites de todas as colunas calculados sobre os mesmos dados
+    with stage("outlier_filter"):
+        if options.remove_outliers:
+            rows_before = len(df) if row_mask is None else int(row_mask.sum())
+            lower_bound, upper_bound = outlier_bounds(df, numeric_cols, options.outlier_threshold, row_mask)
+            pipeline.lower_bounds = {col: float(v) for col, v in lower_bound.items()}
+            pipeline.upper_bounds = {col: float(v) for col, v in upper_bound.items()}
+            outlier_mask = bounds_mask(df, pipeline.lower_bounds, pipeline.upper_bounds)
+            row_mask = outlier_mask if row_mask is None else row_mask & outlier_mask
+            rows_after = int(row_mask.sum())
+            preprocessing_steps.append(f"Outliers removidos: {rows_before - rows_after} linhas")
+
+        # Aplicar a máscara combinada de uma só vez (única cópia das linhas)
+        if row_mask is not None and not row_mask.all():
+            df = df.take(np.flatnonzero(row_mask))
+
+    # 4. Indicadores técnicos, calculados sobre as linhas já filtradas. O estado
+    # guardado é o da última linha que terá alvo, de onde o /append-rows/ continua.
+    if options.indicators:
+        with stage("indicators"):
+            pipeline.indicators = list(options.indicators)
+            df, pipeline.indicator_state = add_indicators(df, pipeline.indicators, until=last_target_row(df))
+            # Linhas iniciais sem janela completa (aquecimento) saem
+            warmup = first_complete_row(df, indicator_columns(pipeline.indicators))
+            if warmup:
+                df = df.iloc[warmup:]
+            preprocessing_steps.append(
+                f"Indicadores técnicos calculados: {', '.join(pipeline.indicators)} "
+                f"({warmup} linhas iniciais de aquecimento removidas)"
+            )
+
+    # 5. Criar colunas de previsão
+    if "close" in df.columns:
+        with stage("targets"):
+            df = add_targets(df)
+            preprocessing_steps.append("Criadas colunas 'target_class' e 'target_close' com base no fechamento futuro")
+
+    return df, preprocessing_steps, pipeline
+
+
+# Alvos a partir do fechamento seguinte; linhas sem próximo fechamento saem
+def add_targets(df):
+    df["target_class"] = (df["close"].shift(-1) > df["close"]).astype(int)
+    df["target_close"] = df["close"].shift(-1)
+    # Normalmente só a última linha fica sem alvo: fatiar evita copiar o DataFrame
+    keep = df["target_close"].notna().to_numpy()
+    if len(keep) and keep[:-1].all():
+        return df.iloc[:-1] if not keep[-1] else df
+    return df[keep]
+
+
+# Quantidade de linhas que terão alvo (add_targets descarta as do fim sem próximo fechamento)
+def last_target_row(df):
+    if "close" not in df.columns:
+        return len(df)
+    has_next = df["close"].shift(-1).notna().to_numpy()
+    return int(np.flatnonzero(has_next)[-1]) + 1 if has_next.any() else 0
+
+
+# Posição da primeira linha sem valores ausentes nas colunas informadas
+def first_complete_row(df, columns):
+    complete = df[columns].notna().all(axis=1).to_numpy()
+    return int(np.argmax(complete)) if complete.any() else len(df)
+
+
+# Estende os dados pré-processados com linhas acrescentadas ao final do dataset.
+# O pipeline ajustado é reaplicado só à cauda (linhas após a última já processada,
+# incluindo a que tinha ficado sem alvo); indicadores continuam do estado
+# recebido e os alvos são recalculados apenas nela. Retorna os dados estendidos,
+# quantas linhas processadas foram acrescentadas e o novo estado dos indicadores.
+def extend_processed(pipeline, processed_data, current_data, indicator_state=None):
+    start = 0
+    if len(processed_data):
+        start = current_data.index.get_loc(processed_data.index[-1]) + 1
+
+    tail, _ = pipeline.transform(current_data.iloc[start:], indicators=False)
+    if pipeline.indicators:
+        tail, indicator_state = add_indicators(
+            tail, pipeline.indicators, indicator_state, until=last_target_row(tail)
+        )
+    if "target_close" in processed_data.columns and "close" in tail.columns:
+        tail = add_targets(tail.copy())
+    tail = tail[[col for col in processed_data.columns if col in tail.columns]]
+
+    if tail.empty:
+        return processed_data, 0, indicator_state
+    return pd.concat([processed_data, tail]), len(tail), indicator_state
+
+
+# Limites [Q1 - k*IQR, Q3 + k*IQR] de todas as colunas numéricas em uma única chamada
+def outlier_bounds(df, numeric_cols, threshold, base_mask=None):
+    source = df[numeric_cols] if base_mask is None else df.loc[base_mask, numeric_cols]
+    quantiles = source.quantile([0.25, 0.75])
+    del source
+    q1, q3 = quantiles.iloc[0], quantiles.iloc[1]
+    iqr = q3 - q1
+    return q1 - threshold * iqr, q3 + threshold * iqr
+
+
+# Máscara das linhas dentro dos limites em todas as colunas.
+# Linhas com NaN em alguma dessas colunas também ficam de fora (como na comparação direta).
+def bounds_mask(df, lower_bounds, upper_bounds):
+    mask = np.ones(len(df), dtype=bool)
+    for col, lower in lower_bounds.items():
+        values = df[col].to_numpy()
+        mask &= (values >= lower) & (values <= upper_bounds[col])
+    return mask
+
+
+# Colunas numéricas (equivalente a select_dtypes(include=[np.number]), que copiaria os dados)
+def numeric_columns(df, columns=None):
+    columns = df.columns if columns is None else columns
+    return pd.Index([
+        col for col in columns
+        if pd.api.types.is_numeric_dtype(df[col].dtype) and not pd.api.types.is_bool_dtype(df[col].dtype)
+    ])
+
+
+# Moda a partir das contagens de valores (value_counts ou contagens somadas
+# bloco a bloco). Empates: o menor valor, como em DataFrame.mode(). None se a
+# coluna não tiver valores.
+def mode_from_counts(counts):
+    counts = counts[counts > 0]
+    if not len(counts):
+        return None
+    top = counts.index[counts.to_numpy() == counts.max()]
+    if len(top) == 1:
+        return top[0]
+    try:
+        return top.min()
+    except TypeError:
+        pass
+    try:
+        # Categorias não ordenadas: a ordem das categorias
+        return top.sort_values()[0]
+    except TypeError:
+        # Valores de tipos não comparáveis entre si (colunas object mistas)
+        return top[0]
+
+
+# Monta o DataFrame com as colunas selecionadas, preenchendo apenas as que têm
+# valores ausentes; as demais são reaproveitadas sem cópia
+def _fill_columns(df, columns, fill_values):
+    data = {}
+    for col in columns:
+        series = df[col]
+        if col in fill_values:
+            value = fill_values[col]
+            # Colunas categóricas só aceitam valores que já estejam entre as categorias
+            if isinstance(series.dtype, pd.CategoricalDtype) and value not in series.cat.categories:
+                series = series.cat.add_categories([value])
+            if isinstance(series.dtype, np.dtype) and series.dtype.kind == "f":
+                # Floats NumPy: cópia + atribuição mascarada (mais rápido que Series.fillna)
+                values = series.to_numpy(copy=True)
+                values[np.isnan(values)] = value
+                series = pd.Series(values, index=series.index, name=col)
+            else:
+                series = series.fillna(value)
+        data[col] = series
+    return pd.DataFrame(data, index=df.index, copy=False)
+
+
+def _to_python(value):
+    # Escalares NumPy viram tipos Python (serializáveis em JSON)
+    return value.item() if isinstance(value, np.generic) else value
@@ -0,0 +1,186 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+
+# Operadores aceitos nos filtros "coluna:operador:valor" do /rows/
+FILTER_OPERATORS = ("eq", "ne", "lt", "le", "gt", "ge", "in", "contains", "isnull", "notnull")
+
+
+# Índices de ordenação por coluna e posições já filtradas/ordenadas, em LRU
+# limitado por bytes. A chave inclui o hash do DataFrame (content_hash ou
+# processed_key), então um append gera entradas novas e as antigas saem pelo LRU.
+# Com o índice pronto, cada página custa só a fatia [offset, offset + limit).
+class RowIndexCache:
+    def __init__(self, max_bytes=256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            positions = self._entries.get(key)
+            if positions is not None:
+                self._entries.move_to_end(key)
+            return positions
+
+    def put(self, key, positions):
+        with self._lock:
+            if key in self._entries:
+                self._total_bytes -= self._entries.pop(key).nbytes
+            self._entries[key] = positions
+            self._total_bytes += positions.nbytes
+            while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self._total_bytes -= evicted.nbytes
+
+    # Ordem das linhas por uma coluna (nulos sempre no fim). A ordem crescente é
+    # calculada uma vez; a decrescente é derivada dela.
+    def sort_order(self, data_key, series, descending=False):
+        key = (data_key, "sort", series.name, descending)
+        order = self.get(key)
+        if order is None:
+            ascending = self.get((data_key, "sort", series.name, False))
+            if ascending is None:
+                ascending = sort_index(series)
+                self.put((data_key, "sort", series.name, False), ascending)
+            order = ascending
+            if descending:
+                order = descending_index(series, ascending)
+                self.put(key, order)
+        return order
+
+    # Posições das linhas que passam nos filtros, na ordem pedida (None = todas,
+    # na ordem original)
+    def positions(self, data_key, df, sort=None, descending=False, filters=()):
+        if sort is None and not filters:
+            return None
+        key = (data_key, "rows", sort, descending, tuple(filters))
+        positions = self.get(key)
+        if positions is None:
+            mask = None
+            for column, op, value in filters:
+                condition = filter_mask(df[column], op, value)
+                mask = condition if mask is None else mask & condition
+            if sort is not None:
+                positions = self.sort_order(data_key, df[sort], descending)
+                if mask is not None:
+                    positions = positions[mask[positions]]
+            else:
+                positions = np.flatnonzero(mask).astype(_index_dtype(len(df)))
+            self.put(key, positions)
+        return positions
+
+
+# Ordenação estável com nulos no fim. Categorias são ordenadas pelo valor (as
+# vindas da leitura em blocos estão na ordem em que apareceram)
+def sort_index(series):
+    series = series.reset_index(drop=True)
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        series = series.cat.set_categories(series.cat.categories.sort_values())
+    order = series.sort_values(kind="stable", na_position="last").index.to_numpy()
+    return order.astype(_index_dtype(len(series)))
+
+
+# Ordem decrescente a partir da crescente: os grupos de valores iguais são
+# invertidos, mas dentro de cada grupo a ordem original é mantida (estável)
+def descending_index(series, ascending):
+    n_valid = int(series.notna().sum())
+    if n_valid == 0:
+        return ascending
+    valid = ascending[:n_valid]
+    values = series.iloc[valid]
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        values = values.cat.codes
+    values = values.to_numpy()
+    group = np.concatenate([[0], np.cumsum(values[1:] != values[:-1])])
+    order = valid[np.argsort(group[-1] - group, kind="stable")]
+    return np.concatenate([order, ascending[n_valid:]])
+
+
+def _index_dtype(n_rows):
+    return np.int32 if n_rows < 2 ** 31 else np.int64
+
+
+# "close:gt:100", "ticker:in:PETR4|VALE3", "volume:isnull"
+def parse_filter(spec, columns):
+    column, _, rest = spec.partition(":")
+    op, _, value = rest.partition(":")
+    if column not in columns:
+        raise ValueError(f"Coluna {column} não encontrada nos dados")
+    if op not in FILTER_OPERATORS:
+        raise ValueError(f"Operador de filtro inválido: {op}")
+    if op not in ("isnull", "notnull") and not value:
+        raise ValueError(f"Filtro sem valor: {spec}")
+    return column, op, value
+
+
+def filter_mask(series, op, value):
+    if op == "isnull":
+        return series.isna().to_numpy()
+    if op == "notnull":
+        return series.notna().to_numpy()
+
+    # Categorias: a condição é avaliada uma vez por categoria e expandida pelos códigos
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        categories = pd.Series(series.cat.categories.astype(str))
+        category_mask = np.append(filter_mask(categories, op, value), False)
+        return category_mask[series.cat.codes.to_numpy()]
+
+    if op == "in":
+        values = [_coerce(series, v) for v in value.split("|")]
+        return series.isin(values).to_numpy()
+    if op == "contains":
+        return series.astype("string").str.contains(value, regex=False).fillna(False).to_numpy(dtype=bool)
+
+    value = _coerce(series, value)
+    compare = {
+        "eq": series.__eq__, "ne": series.__ne__, "lt": series.__lt__,
+        "le": series.__le__, "gt": series.__gt__, "ge": series.__ge__,
+    }[op]
+    return compare(value).fillna(False).to_numpy(dtype=bool)
+
+
+def _coerce(series, value):
+    dtype = series.dtype
+    try:
+        if pd.api.types.is_bool_dtype(dtype):
+            return value.lower() in ("true", "1")
+        if pd.api.types.is_numeric_dtype(dtype):
+            return float(value)
+        if pd.api.types.is_datetime64_any_dtype(dtype):
+            return pd.Timestamp(value)
+    except ValueError:
+        raise ValueError(f"Valor inválido para a coluna {series.name}: {value}")
+    return value
+
+
+# Página em formato colunar: uma lista de valores por coluna (menor que uma
+# lista de linhas e direto para o JSON, com nulos como null)
+def columnar_json(page):
+    data = {}
+    for col in page.columns:
+        series = page[col]
+        if pd.api.types.is_datetime64_any_dtype(series.dtype):
+            values = pd.Series(np.datetime_as_string(series.to_numpy(), unit="s"), index=series.index)
+        else:
+            values = series.astype(object)
+        data[col] = values.where(series.notna(), None).tolist()
+    return data
+
+
+# Página como stream Arrow IPC (tipos preservados, sem conversão para JSON);
+# metadata ({chave: bytes}) é acrescentado aos metadados do schema
+def arrow_ipc(page, metadata=None):
+    import pyarrow as pa
+
+    table = pa.Table.from_pandas(page, preserve_index=False)
+    if metadata:
+        table = table.replace_schema_metadata({**(table.schema.metadata or {}), **metadata})
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
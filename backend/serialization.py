@@ -0,0 +1,94 @@
+import datetime
+import importlib.util
+
+import numpy as np
+import orjson
+import pandas as pd
+from fastapi.responses import JSONResponse, Response
+
+from rows import arrow_ipc, columnar_json
+
+
+JSON_MEDIA_TYPE = "application/json"
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+MSGPACK_MEDIA_TYPES = (MSGPACK_MEDIA_TYPE, "application/x-msgpack", "application/vnd.msgpack")
+
+# MessagePack é opcional: sem o pacote, o formato não é oferecido na negociação
+MSGPACK_AVAILABLE = importlib.util.find_spec("msgpack") is not None
+
+
+# JSON com orjson: arrays e escalares do numpy serializados direto, NaN/NaT
+# como null (o json padrão recusa NaN) e datas em ISO 8601
+def dumps_json(content):
+    return orjson.dumps(content, default=_builtin, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+
+
+# Resposta padrão da API (FastAPI(default_response_class=...))
+class FastJSONResponse(JSONResponse):
+    def render(self, content):
+        return dumps_json(content)
+
+
+# Formato da resposta a partir do cabeçalho Accept (maior q primeiro; JSON se
+# nada do que foi pedido estiver disponível)
+def negotiate(accept):
+    options = []
+    for position, item in enumerate((accept or "").split(",")):
+        media_type, *params = [part.strip() for part in item.split(";")]
+        quality = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        if quality > 0:
+            options.append((-quality, position, media_type.lower()))
+
+    for _, _, media_type in sorted(options):
+        if media_type == ARROW_MEDIA_TYPE:
+            return ARROW_MEDIA_TYPE
+        if media_type in MSGPACK_MEDIA_TYPES and MSGPACK_AVAILABLE:
+            return MSGPACK_MEDIA_TYPE
+        if media_type in (JSON_MEDIA_TYPE, "application/*", "*/*"):
+            return JSON_MEDIA_TYPE
+    return JSON_MEDIA_TYPE
+
+
+# Resposta com conteúdo negociado para endpoints que devolvem uma tabela
+# (prévia de linhas, previsões). content é o corpo JSON de sempre; nos formatos
+# binários as chaves table_keys saem do corpo e a tabela vai em colunas:
+#  - Arrow IPC: a tabela com tipos preservados e o resto do corpo, em JSON,
+#    nos metadados do schema (chave "meta")
+#  - MessagePack: o resto do corpo mais "columns" e "data" ({coluna: valores})
+def negotiated_response(request, content, table, table_keys, status_code=200):
+    media_type = negotiate(request.headers.get("accept"))
+    headers = {"Vary": "Accept"}
+    if media_type == JSON_MEDIA_TYPE:
+        return FastJSONResponse(content, status_code=status_code, headers=headers)
+
+    meta = {key: value for key, value in content.items() if key not in table_keys}
+    if media_type == ARROW_MEDIA_TYPE:
+        body = arrow_ipc(table, metadata={"meta": dumps_json(meta)})
+    else:
+        import msgpack
+
+        body = msgpack.packb(
+            {**meta, "columns": [str(col) for col in table.columns], "data": columnar_json(table)},
+            default=_builtin,
+        )
+    return Response(body, status_code=status_code, media_type=media_type, headers=headers)
+
+
+# Conversão de tipos que o orjson/msgpack não serializam sozinhos
+def _builtin(value):
+    if value is pd.NaT or value is pd.NA:
+        return None
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Tipo não serializável: {type(value).__name__}")
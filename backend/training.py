@@ -0,0 +1,256 @@
+import os
+import uuid
+
+import numpy as np
+import pandas as pd
+
+from metrics import collect_stages, record_stages, stage
+from model_store import save_model, save_predictions
+
+
+MODEL_TYPES = ("regression", "classification", "random_forest", "sgd_regression", "sgd_classification")
+REGRESSION_TYPES = ("regression", "sgd_regression")
+
+
+# Levantada pelo callback de progresso para interromper um treino cancelado
+class TrainingCancelled(Exception):
+    pass
+
+
+# Cria o estimador para o tipo de modelo (imports do sklearn só quando necessário),
+# com hiperparâmetros opcionais (ex.: os encontrados pelo /tune/)
+def make_model(model_type, n_jobs=1, params=None):
+    model = _base_model(model_type, n_jobs)
+    if params:
+        model.set_params(**params)
+    return model
+
+
+def _base_model(model_type, n_jobs):
+    if model_type == "regression":
+        from sklearn.linear_model import LinearRegression
+        return LinearRegression()
+    if model_type == "classification":
+        from sklearn.linear_model import LogisticRegression
+        return LogisticRegression(max_iter=1000)
+    if model_type == "random_forest":
+        from sklearn.ensemble import RandomForestClassifier
+        return RandomForestClassifier(n_estimators=100, random_state=42, n_jobs=n_jobs)
+    # Modelos SGD aceitam partial_fit: podem ser atualizados com novas linhas sem retreino
+    if model_type == "sgd_regression":
+        from sklearn.linear_model import SGDRegressor
+        return SGDRegressor(random_state=42)
+    if model_type == "sgd_classification":
+        from sklearn.linear_model import SGDClassifier
+        return SGDClassifier(loss="log_loss", random_state=42)
+    raise ValueError(f"Tipo de modelo não suportado: {model_type}")
+
+
+def fold_metrics(model_type, y_test, y_pred):
+    if model_type in REGRESSION_TYPES:
+        from sklearn.metrics import mean_squared_error, mean_absolute_error, r2_score
+
+        mse = mean_squared_error(y_test, y_pred)
+        return {
+            "mse": float(mse),
+            "rmse": float(np.sqrt(mse)),
+            "mae": float(mean_absolute_error(y_test, y_pred)),
+            "r2": float(r2_score(y_test, y_pred))
+        }
+
+    from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score
+
+    return {
+        "accuracy": float(accuracy_score(y_test, y_pred)),
+        "precision": float(precision_score(y_test, y_pred, average='weighted')),
+        "recall": float(recall_score(y_test, y_pred, average='weighted')),
+        "f1": float(f1_score(y_test, y_pred, average='weighted'))
+    }
+
+
+# Divide o orçamento de threads entre folds em paralelo, n_jobs do estimador e
+# BLAS/OpenMP dentro de cada worker, para que fold_jobs x estimator_jobs x
+# threads internas nunca passe de max_threads.
+def plan_parallelism(n_splits, n_rows, fold_jobs=1, estimator_jobs=1,
+                     max_threads=None, min_rows_parallel=0):
+    max_threads = max(1, max_threads or os.cpu_count() or 1)
+    # Datasets pequenos: o custo de subir processos supera o ganho
+    if n_rows < min_rows_parallel:
+        fold_jobs = 1
+    fold_jobs = max(1, min(fold_jobs, n_splits, max_threads))
+    estimator_jobs = max(1, min(estimator_jobs, max_threads // fold_jobs))
+    inner_threads = max(1, max_threads // (fold_jobs * estimator_jobs))
+    return fold_jobs, estimator_jobs, inner_threads
+
+
+# Ajusta e avalia um fold (executado nos workers do joblib). Os scalers são
+# ajustados só com as linhas de treino do fold, sem vazar dados futuros. Retorna
+# as previsões do bloco de teste já na escala original do alvo e as etapas
+# medidas no worker (ver metrics.collect_stages).
+def fit_fold(fold, model_type, X, y, train_idx, test_idx, estimator_jobs, params=None):
+    with collect_stages() as stages:
+        result = _fit_fold(fold, model_type, X, y, train_idx, test_idx, estimator_jobs, params)
+    return result + (stages,)
+
+
+def _fit_fold(fold, model_type, X, y, train_idx, test_idx, estimator_jobs, params=None):
+    from sklearn.preprocessing import StandardScaler
+
+    scaler_X = StandardScaler()
+    X_train = scaler_X.fit_transform(X.iloc[train_idx])
+    X_test = scaler_X.transform(X.iloc[test_idx])
+
+    # Escalar y se for regressão; classificadores usam o alvo direto
+    scaler_y = None
+    y_train, y_test = y[train_idx], y[test_idx]
+    if model_type in REGRESSION_TYPES:
+        scaler_y = StandardScaler()
+        y_train = scaler_y.fit_transform(y_train.reshape(-1, 1)).ravel()
+        y_test = scaler_y.transform(y_test.reshape(-1, 1)).ravel()
+
+    model = make_model(model_type, n_jobs=estimator_jobs, params=params)
+    with stage(f"fold_{fold}_fit"):
+        model.fit(X_train, y_train)
+    with stage(f"fold_{fold}_predict"):
+        y_pred = model.predict(X_test)
+    metrics = fold_metrics(model_type, y_test, y_pred)
+
+    if scaler_y is not None:
+        y_pred = scaler_y.inverse_transform(y_pred.reshape(-1, 1)).ravel()
+    return fold, metrics, model, scaler_X, scaler_y, y_pred
+
+
+# Treino com validação cruzada temporal (TimeSeriesSplit) e salvamento do modelo.
+# Os folds são ajustados em paralelo (joblib/loky) conforme plan_parallelism.
+# progress(folds_concluidos, n_folds, metricas) é chamado a cada fold concluído.
+# As previsões retornadas são as out-of-fold do próprio CV (a partir da primeira
+# linha de teste), sem novo predict sobre todo o dataset; a lista completa fica
+# salva ao lado do modelo e a resposta traz só as primeiras predictions_limit.
+def run_training(X, y, model_type, feature_columns, target_column, models_dir,
+                 n_splits=5, progress=None, fold_jobs=1, estimator_jobs=1,
+                 max_threads=None, min_rows_parallel=0, predictions_limit=None, params=None):
+    from joblib import Parallel, delayed, parallel_config
+    from sklearn.model_selection import TimeSeriesSplit
+
+    y = np.asarray(y)
+    model_info = {
+        "type": model_type,
+        "features": feature_columns,
+        "target": target_column,
+        "params": params or {}
+    }
+
+    tscv = TimeSeriesSplit(n_splits=n_splits)
+    fold_jobs, estimator_jobs, inner_threads = plan_parallelism(
+        n_splits, len(X), fold_jobs, estimator_jobs, max_threads, min_rows_parallel
+    )
+    model_info["parallelism"] = {
+        "fold_jobs": fold_jobs,
+        "estimator_jobs": estimator_jobs,
+        "inner_threads": inner_threads
+    }
+
+    splits = list(tscv.split(X))
+    fold_results = {}
+    tasks = (
+        delayed(fit_fold)(fold, model_type, X, y, train_idx, test_idx, estimator_jobs, params)
+        for fold, (train_idx, test_idx) in enumerate(splits)
+    )
+    with parallel_config(backend="loky", inner_max_num_threads=inner_threads):
+        results = Parallel(n_jobs=fold_jobs, return_as="generator_unordered")(tasks)
+        for fold, *fold_result, stages in results:
+            fold_results[fold] = fold_result
+            record_stages(stages)
+            if progress is not None:
+                progress(len(fold_results), n_splits, fold_result[0])
+
+    folds = [fold_results[fold][0] for fold in range(n_splits)]
+    # Modelo final: o do último fold (maior janela de treino), com os scalers do fold
+    _, model, scaler_X, scaler_y, _ = fold_results[n_splits - 1]
+
+    # Previsões out-of-fold: os blocos de teste cobrem as linhas [start, n) em ordem
+    start = int(splits[0][1][0])
+    predictions = np.concatenate([fold_results[fold][4] for fold in range(n_splits)])
+
+    metrics = {
+        name: float(np.mean([f[name] for f in folds])) for name in folds[0]
+    }
+    metrics["folds"] = folds
+
+    if model_type in REGRESSION_TYPES:
+        model_info["coefficients"] = {
+            feature: float(coef) for feature, coef in zip(feature_columns, model.coef_)
+        }
+        model_info["intercept"] = float(np.ravel(model.intercept_)[0])
+    elif model_type == "random_forest":
+        model_info["feature_importance"] = {
+            feature: float(importance) for feature, importance in zip(feature_columns, model.feature_importances_)
+        }
+        model_info["classes"] = model.classes_.tolist()
+    else:
+        model_info["classes"] = model.classes_.tolist()
+
+    # Salvar modelo, scalers e previsões out-of-fold (usados depois pelo /score/ e /predictions/)
+    model_filename = new_model_filename(model_type)
+    with stage("save_model"):
+        save_model(models_dir, model_filename, model, scaler_X, scaler_y, model_type, feature_columns, target_column)
+        save_predictions(models_dir, model_filename, predictions)
+
+    # A última linha está no teste do último fold: é a previsão do modelo final para ela
+    next_prediction = predictions[-1]
+    page = predictions if predictions_limit is None else predictions[:predictions_limit]
+
+    return {
+        "prediction": float(next_prediction),
+        "predictions": page.tolist(),
+        "predictions_info": {
+            "start_row": start,
+            "total": len(predictions),
+            "returned": len(page)
+        },
+        "metrics": metrics,
+        "model_info": model_info,
+        "model_filename": model_filename
+    }
+
+
+# Nome do arquivo de um modelo novo
+# (sufixo aleatório: treinos em paralelo no mesmo segundo não sobrescrevem o arquivo)
+def new_model_filename(model_type):
+    return f"{model_type}_{pd.Timestamp.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}.pkl"
+
+
+# Atualização incremental de um modelo salvo, sem retreino completo. X e y são as
+# linhas mais recentes; as últimas new_rows delas são as novas. Modelos com
+# partial_fit (SGD) aprendem só com as novas linhas; florestas ganham
+# forest_trees árvores (warm_start) ajustadas sobre toda a janela recebida.
+# Os scalers do treino original são mantidos, pois o modelo depende dessa escala.
+# O modelo atualizado é salvo em um arquivo novo (o original continua servindo).
+def update_model(bundle, X, y, new_rows, models_dir, forest_trees=10):
+    model = bundle.model
+    X_scaled = bundle.scaler_X.transform(X)
+    y = np.asarray(y)
+    if bundle.scaler_y is not None:
+        y = bundle.scaler_y.transform(y.reshape(-1, 1)).ravel()
+
+    if hasattr(model, "partial_fit"):
+        model.partial_fit(X_scaled[-new_rows:], y[-new_rows:])
+        method, n_rows = "partial_fit", new_rows
+    elif hasattr(model, "estimators_") and "warm_start" in model.get_params():
+        # Árvores novas só podem ser combinadas com as antigas se virem as mesmas classes
+        if not np.array_equal(np.unique(y), model.classes_):
+            raise ValueError("A janela de linhas recentes não contém todas as classes do modelo")
+        model.set_params(warm_start=True, n_estimators=len(model.estimators_) + forest_trees)
+        model.fit(X_scaled, y)
+        method, n_rows = "warm_start", len(y)
+    else:
+        raise ValueError(f"Modelo {bundle.model_type} não suporta atualização incremental")
+
+    model_filename = new_model_filename(bundle.model_type)
+    save_model(models_dir, model_filename, model, bundle.scaler_X, bundle.scaler_y,
+               bundle.model_type, bundle.features, bundle.target)
+    return {
+        "model_filename": model_filename,
+        "method": method,
+        "rows_used": int(n_rows)
+    }
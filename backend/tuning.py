@@ -0,0 +1,156 @@
+import hashlib
+import json
+import math
+import os
+import uuid
+
+import numpy as np
+
+from training import REGRESSION_TYPES, fit_fold, make_model, plan_parallelism
+
+
+# Espaços de busca padrão de cada tipo de modelo (o /tune/ aceita outro param_grid)
+DEFAULT_PARAM_GRIDS = {
+    "regression": {"fit_intercept": [True, False]},
+    "classification": {"C": [0.01, 0.1, 1.0, 10.0, 100.0]},
+    "random_forest": {
+        "n_estimators": [50, 100, 200],
+        "max_depth": [None, 5, 10],
+        "min_samples_leaf": [1, 5],
+    },
+    "sgd_regression": {"alpha": [1e-5, 1e-4, 1e-3, 1e-2], "penalty": ["l2", "l1", "elasticnet"]},
+    "sgd_classification": {"alpha": [1e-5, 1e-4, 1e-3, 1e-2], "penalty": ["l2", "l1", "elasticnet"]},
+}
+
+
+# Resultados de folds já avaliados, um arquivo JSON por chave. A chave inclui o
+# dataset processado (hash do conteúdo + opções do pipeline) e os hiperparâmetros,
+# então buscas repetidas ou sobrepostas nunca reajustam a mesma configuração.
+class FoldResultCache:
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def get(self, key):
+        path = os.path.join(self.cache_dir, f"{key}.json")
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return json.load(f)
+
+    def put(self, key, metrics):
+        path = os.path.join(self.cache_dir, f"{key}.json")
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(metrics, f)
+        os.replace(tmp_path, path)
+
+
+def fold_key(data_key, model_type, feature_columns, target_column, params, n_rows, n_splits, fold):
+    payload = json.dumps(
+        [data_key, model_type, feature_columns, target_column, params, n_rows, n_splits, fold],
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+# Métrica usada para ranquear as configurações (maior é melhor)
+def score_metrics(model_type, metrics):
+    if model_type in REGRESSION_TYPES:
+        return -metrics["mse"]
+    return metrics["accuracy"]
+
+
+# Executado nos workers do joblib: só as métricas voltam (o modelo ajustado não é copiado)
+def evaluate_fold(task, model_type, X, y, train_idx, test_idx, params):
+    _, metrics, *_ = fit_fold(task, model_type, X, y, train_idx, test_idx, 1, params)
+    return task, metrics
+
+
+# Busca de hiperparâmetros por successive halving sobre o TimeSeriesSplit.
+# O recurso é o número de linhas: cada rodada avalia os candidatos restantes nas
+# linhas mais recentes e mantém só o melhor 1/factor, multiplicando as linhas por
+# factor até chegar ao dataset inteiro. progress(tarefas_concluidas, total, metricas)
+# é chamado a cada fold avaliado.
+def successive_halving(X, y, model_type, feature_columns, target_column, data_key, cache_dir,
+                       param_grid=None, n_splits=5, factor=3, progress=None,
+                       fold_jobs=1, max_threads=None, min_rows_parallel=0):
+    from joblib import Parallel, delayed, parallel_config
+    from sklearn.model_selection import ParameterGrid, TimeSeriesSplit
+
+    candidates = list(ParameterGrid(param_grid or DEFAULT_PARAM_GRIDS[model_type]))
+    for params in candidates:
+        make_model(model_type, params=params)  # parâmetros inválidos falham antes do treino
+
+    cache = FoldResultCache(cache_dir)
+    y = np.asarray(y)
+    n_rows = len(X)
+    n_rounds = 1 + int(math.floor(math.log(len(candidates), factor))) if len(candidates) > 1 else 1
+    # Linhas da primeira rodada: o bastante para n_splits folds com alguma amostra de treino
+    min_rows = max((n_splits + 1) * 2, n_rows // factor ** (n_rounds - 1))
+    total_tasks = sum(
+        math.ceil(len(candidates) / factor ** r) * n_splits for r in range(n_rounds)
+    )
+    fold_jobs, _, inner_threads = plan_parallelism(
+        n_splits, n_rows, fold_jobs, 1, max_threads, min_rows_parallel
+    )
+
+    rounds = []
+    done = 0
+    evaluated = cached = 0
+    for round_index in range(n_rounds):
+        rows = n_rows if round_index == n_rounds - 1 else min(n_rows, min_rows * factor ** round_index)
+        X_round, y_round = X.iloc[-rows:], y[-rows:]
+        splits = list(TimeSeriesSplit(n_splits=n_splits).split(X_round))
+
+        # Folds já em cache não são reajustados
+        results = {}
+        pending = []
+        for c, params in enumerate(candidates):
+            for fold, (train_idx, test_idx) in enumerate(splits):
+                key = fold_key(data_key, model_type, feature_columns, target_column,
+                               params, rows, n_splits, fold)
+                metrics = cache.get(key)
+                if metrics is not None:
+                    results[(c, fold)] = metrics
+                    cached += 1
+                else:
+                    pending.append(((c, fold), key, train_idx, test_idx))
+
+        keys = {task: key for task, key, _, _ in pending}
+        tasks = (
+            delayed(evaluate_fold)(task, model_type, X_round, y_round, train_idx, test_idx, candidates[task[0]])
+            for task, _, train_idx, test_idx in pending
+        )
+        with parallel_config(backend="loky", inner_max_num_threads=inner_threads):
+            for task, metrics in Parallel(n_jobs=fold_jobs, return_as="generator_unordered")(tasks):
+                cache.put(keys[task], metrics)
+                results[task] = metrics
+                evaluated += 1
+                done += 1
+                if progress is not None:
+                    progress(done, total_tasks, metrics)
+        done += len(candidates) * n_splits - len(pending)
+
+        scored = []
+        for c, params in enumerate(candidates):
+            folds = [results[(c, fold)] for fold in range(n_splits)]
+            metrics = {name: float(np.mean([f[name] for f in folds])) for name in folds[0]}
+            scored.append({"params": params, "score": score_metrics(model_type, metrics), "metrics": metrics})
+        scored.sort(key=lambda item: item["score"], reverse=True)
+        rounds.append({"rows": rows, "candidates": scored})
+
+        n_keep = max(1, math.ceil(len(candidates) / factor))
+        candidates = [item["params"] for item in scored[:n_keep]]
+
+    best = rounds[-1]["candidates"][0]
+    return {
+        "best_params": best["params"],
+        "best_score": best["score"],
+        "best_metrics": best["metrics"],
+        "scoring": "neg_mse" if model_type in REGRESSION_TYPES else "accuracy",
+        "rounds": rounds,
+        "evaluated_folds": evaluated,
+        "cached_folds": cached
+    }
@@ -109,9 +109,8 @@ function App() {
     try {
       const response = await api.downloadResults();
       
-      // Criar um blob com o conteúdo CSV
-      const blob = new Blob([response.data.csv_content], { type: 'text/csv' });
-      const url = window.URL.createObjectURL(blob);
+      // A resposta já é o arquivo CSV (Blob)
+      const url = window.URL.createObjectURL(response.data);
       
       // Criar um link para download e clicar nele automaticamente
       const a = document.createElement('a');
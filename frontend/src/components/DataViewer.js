@@ -1,9 +1,33 @@
-import React, { useState } from 'react';
+import React, { useEffect, useState } from 'react';
+import { getRows } from '../services/api';
 
 // Componente para visualização dos dados carregados
 const DataViewer = ({ originalData, fetchEDAGraphs, setActiveStep }) => {
   const [currentPage, setCurrentPage] = useState(0);
   const [rowsPerPage, setRowsPerPage] = useState(10);
+  const [sort, setSort] = useState({ column: null, descending: false });
+  const [page, setPage] = useState(null);
+
+  // Página atual buscada no servidor (ordenação e paginação feitas no backend)
+  useEffect(() => {
+    if (!originalData || !originalData.columns) return;
+    let cancelled = false;
+    getRows({
+      offset: currentPage * rowsPerPage,
+      limit: rowsPerPage,
+      sort: sort.column,
+      descending: sort.descending,
+    })
+      .then((response) => {
+        if (!cancelled) setPage(response.data);
+      })
+      .catch(() => {
+        if (!cancelled) setPage(null);
+      });
+    return () => {
+      cancelled = true;
+    };
+  }, [originalData, currentPage, rowsPerPage, sort]);
   
   // Verificar se há dados para exibir
   if (!originalData || !originalData.columns || !originalData.data) {
@@ -23,9 +47,22 @@ const DataViewer = ({ originalData, fetchEDAGraphs, setActiveStep }) => {
   // Calcular o número total de páginas
   const totalPages = Math.ceil(originalData.shape[0] / rowsPerPage);
   
-  // Obter os dados para a página atual
+  // Obter os dados para a página atual (sem resposta do servidor, usa a prévia do upload)
   const startIndex = currentPage * rowsPerPage;
   const endIndex = Math.min(startIndex + rowsPerPage, originalData.shape[0]);
+  const rows = page
+    ? page.row_ids.map((_, rowIndex) => page.columns.map((column) => page.data[column][rowIndex]))
+    : originalData.data.slice(0, rowsPerPage);
+
+  // Clique no cabeçalho: ordena pela coluna (crescente, decrescente, sem ordenação)
+  const handleSort = (column) => {
+    setSort((previous) => {
+      if (previous.column !== column) return { column, descending: false };
+      if (!previous.descending) return { column, descending: true };
+      return { column: null, descending: false };
+    });
+    setCurrentPage(0);
+  };
   
   // Função para navegar entre as páginas
   const handlePageChange = (newPage) => {
@@ -67,15 +104,17 @@ const DataViewer = ({ originalData, fetchEDAGraphs, setActiveStep }) => {
               {originalData.columns.map((column, index) => (
                 <th 
                   key={index}
-                  className="px-6 py-3 text-left text-xs font-medium text-gray-500 uppercase tracking-wider"
+                  onClick={() => handleSort(column)}
+                  className="px-6 py-3 text-left text-xs font-medium text-gray-500 uppercase tracking-wider cursor-pointer select-none"
                 >
                   {column}
+                  {sort.column === column && (sort.descending ? ' ▼' : ' ▲')}
                 </th>
               ))}
             </tr>
           </thead>
           <tbody className="bg-white divide-y divide-gray-200">
-            {originalData.data.slice(0, rowsPerPage).map((row, rowIndex) => (
+            {rows.map((row, rowIndex) => (
               <tr key={rowIndex} className={rowIndex % 2 === 0 ? 'bg-white' : 'bg-gray-50'}>
                 {row.map((cell, cellIndex) => (
                   <td 
@@ -32,12 +32,15 @@ const EDAGraphs = ({ edaGraphs, setActiveStep }) => {
         {edaGraphs.histograms && (
           <div className="bg-white p-4 rounded-lg shadow">
             <h4 className="text-lg font-medium mb-3">Distribuição das Variáveis</h4>
-            <div className="flex justify-center">
-              <img 
-                src={`data:image/png;base64,${edaGraphs.histograms}`} 
-                alt="Histogramas" 
-                className="max-w-full h-auto"
-              />
+            <div className="flex flex-col items-center space-y-4">
+              {Object.entries(edaGraphs.histograms).map(([column, image]) => (
+                <img 
+                  key={column}
+                  src={`data:image/png;base64,${image}`} 
+                  alt={`Histograma de ${column}`} 
+                  className="max-w-full h-auto"
+                />
+              ))}
             </div>
             <p className="mt-2 text-sm text-gray-600">
               Os histogramas mostram a distribuição de frequência de cada variável numérica, 
@@ -69,12 +72,15 @@ const EDAGraphs = ({ edaGraphs, setActiveStep }) => {
         {edaGraphs.boxplots && (
           <div className="bg-white p-4 rounded-lg shadow">
             <h4 className="text-lg font-medium mb-3">Boxplots (Detecção de Outliers)</h4>
-            <div className="flex justify-center">
-              <img 
-                src={`data:image/png;base64,${edaGraphs.boxplots}`} 
-                alt="Boxplots" 
-                className="max-w-full h-auto"
-              />
+            <div className="flex flex-col items-center space-y-4">
+              {Object.entries(edaGraphs.boxplots).map(([column, image]) => (
+                <img 
+                  key={column}
+                  src={`data:image/png;base64,${image}`} 
+                  alt={`Boxplot de ${column}`} 
+                  className="max-w-full h-auto"
+                />
+              ))}
             </div>
             <p className="mt-2 text-sm text-gray-600">
               Os boxplots mostram a mediana, quartis e outliers de cada variável. 
@@ -11,6 +11,11 @@ const apiClient = axios.create({
   },
 });
 
+// ID do dataset retornado pelo upload, enviado em todas as chamadas seguintes
+let currentDatasetId = null;
+
+const withDataset = () => ({ params: { dataset_id: currentDatasetId } });
+
 // Funções para interagir com a API do backend
 
 /**
@@ -22,11 +27,13 @@ export const uploadCSV = async (file) => {
   const formData = new FormData();
   formData.append('file', file);
   
-  return apiClient.post('/upload-csv/', formData, {
+  const response = await apiClient.post('/upload-csv/', formData, {
     headers: {
       'Content-Type': 'multipart/form-data',
     },
   });
+  currentDatasetId = response.data.dataset_id;
+  return response;
 };
 
 /**
@@ -34,15 +41,31 @@ export const uploadCSV = async (file) => {
  * @returns {Promise} - Promise com a resposta do servidor
  */
 export const getDataInfo = async () => {
-  return apiClient.get('/data-info/');
+  return apiClient.get('/data-info/', withDataset());
+};
+
+/**
+ * Obtém uma página de linhas do dataset (colunar), com ordenação e filtros no servidor
+ * @param {Object} options - offset, limit, sort, descending, columns (lista), filters (ex.: ['close:gt:100']), source ('current' ou 'processed')
+ * @returns {Promise} - Promise com a resposta do servidor
+ */
+export const getRows = async ({ offset = 0, limit = 100, sort, descending = false, columns, filters = [], source = 'current' } = {}) => {
+  const params = new URLSearchParams({ dataset_id: currentDatasetId, offset, limit, descending, source });
+  if (sort) params.append('sort', sort);
+  if (columns && columns.length) params.append('columns', columns.join(','));
+  filters.forEach((filter) => params.append('filter', filter));
+  return apiClient.get('/rows/', { params });
 };
 
 /**
  * Gera gráficos de análise exploratória de dados (EDA)
- * @returns {Promise} - Promise com a resposta do servidor contendo os gráficos em base64
+ * @param {string} format - 'png' (gráficos em base64) ou 'data' (histogramas, boxplots e correlação em JSON)
+ * @returns {Promise} - Promise com a resposta do servidor
  */
-export const generateEDA = async () => {
-  return apiClient.get('/generate-eda/');
+export const generateEDA = async (format = 'png') => {
+  return apiClient.get('/generate-eda/', {
+    params: { dataset_id: currentDatasetId, format },
+  });
 };
 
 /**
@@ -51,7 +74,7 @@ export const generateEDA = async () => {
  * @returns {Promise} - Promise com a resposta do servidor
  */
 export const preprocessData = async (options) => {
-  return apiClient.post('/preprocess/', options);
+  return apiClient.post('/preprocess/', options, withDataset());
 };
 
 /**
@@ -60,20 +83,25 @@ export const preprocessData = async (options) => {
  * @returns {Promise} - Promise com a resposta do servidor
  */
 export const trainAndPredict = async (modelOptions) => {
-  return apiClient.post('/predict/', modelOptions);
+  return apiClient.post('/predict/', modelOptions, withDataset());
 };
 
 /**
  * Obtém os resultados para download
- * @returns {Promise} - Promise com a resposta do servidor contendo o CSV
+ * @param {string} format - 'csv' ou 'parquet'
+ * @returns {Promise} - Promise com a resposta do servidor contendo o arquivo (Blob)
  */
-export const downloadResults = async () => {
-  return apiClient.get('/download-results/');
+export const downloadResults = async (format = 'csv') => {
+  return apiClient.get('/download-results/', {
+    params: { dataset_id: currentDatasetId, format },
+    responseType: 'blob',
+  });
 };
 
 export default {
   uploadCSV,
   getDataInfo,
+  getRows,
   generateEDA,
   preprocessData,
   trainAndPredict,